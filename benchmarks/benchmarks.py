@@ -0,0 +1,367 @@
+"""Benchmarks for asv (airspeed velocity)
+
+Run with e.g. ``asv run`` (all commits on the branch) or
+``asv run --python=same --quick`` (current environment only).
+Results are stored as JSON in ``.asv/results``; compare two revisions with
+``asv compare REV1 REV2``.
+
+The data is generated by `pyvodb.synthetic`.
+"""
+
+import os
+import sys
+import datetime
+import tarfile
+import tempfile
+import tracemalloc
+import subprocess
+
+from click.testing import CliRunner
+
+from pyvodb import tables
+from pyvodb import synthetic
+from pyvodb import snapshot
+from pyvodb import tiered
+from pyvodb import api
+from pyvodb import listing
+from pyvodb import queries
+from sqlalchemy.orm import joinedload, selectinload
+
+from pyvodb.load import get_db, load_yaml_file, dict_from_directory
+from pyvodb.calendar import get_calendar
+from pyvodb.dumpers import json_dump
+from pyvodb.cli import cli
+from pyvodb.cli import cliutil
+
+# Dataset sizes, as arguments to synthetic.generate()
+SIZES = {
+    'small': dict(cities=3, series_per_city=1, events_per_series=50),
+    'large': dict(cities=20, series_per_city=2, events_per_series=100,
+                  speakers=2000, links_per_talk=4),
+}
+
+_directories = {}
+
+
+def data_directory(size):
+    """Generate the dataset of the given size (once per process)"""
+    try:
+        return _directories[size]
+    except KeyError:
+        directory = tempfile.mkdtemp(prefix='pyvodb-bench-{}-'.format(size))
+        synthetic.generate(directory, **SIZES[size])
+        _directories[size] = directory
+        return directory
+
+
+def archive_file(size):
+    """Build an archive of 90% of the events of a dataset (once per process)
+
+    See `pyvodb.tiered`.
+    """
+    key = size, 'archive'
+    try:
+        return _directories[key]
+    except KeyError:
+        directory = data_directory(size)
+        db = get_db(directory)
+        dates = sorted(date for date, in db.query(tables.Event.date))
+        filename = os.path.join(tempfile.mkdtemp(), 'archive.sqlite')
+        tiered.build_archive(db, directory, filename,
+                             dates[len(dates) * 9 // 10])
+        _directories[key] = filename
+        return filename
+
+
+def packed_file(size):
+    """Pack a dataset as .tar.gz (once per process)
+
+    See `pyvodb.packload`.
+    """
+    key = size, 'packed'
+    try:
+        return _directories[key]
+    except KeyError:
+        filename = os.path.join(tempfile.mkdtemp(), 'data.tar.gz')
+        with tarfile.open(filename, 'w:gz') as tar:
+            tar.add(data_directory(size), '.')
+        _directories[key] = filename
+        return filename
+
+
+class Load:
+    params = list(SIZES)
+    param_names = ['size']
+    timeout = 300
+
+    def setup(self, size):
+        self.directory = data_directory(size)
+
+    def time_load_from_directory(self, size):
+        get_db(self.directory)
+
+    def time_dict_from_directory(self, size):
+        metadata = load_yaml_file(os.path.join(self.directory, 'meta.yaml'))
+        dict_from_directory('.', self.directory,
+                            ignored_files=metadata['ignored_files'])
+
+    def time_load_with_archive(self, size):
+        get_db(self.directory, archive=archive_file(size))
+
+    def time_load_from_packed(self, size):
+        get_db(packed_file(size))
+
+    def peakmem_load_from_directory(self, size):
+        get_db(self.directory)
+
+    def track_load_peak_memory(self, size):
+        """Peak Python memory (tracemalloc) while loading"""
+        tracemalloc.start()
+        try:
+            db = get_db(self.directory)
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return peak
+    track_load_peak_memory.unit = 'bytes'
+
+    def track_load_retained_memory(self, size):
+        """Python memory (tracemalloc) still held after loading"""
+        return _traced_size(lambda: get_db(self.directory))
+    track_load_retained_memory.unit = 'bytes'
+
+
+class Queries:
+    params = list(SIZES)
+    param_names = ['size']
+    timeout = 300
+
+    def setup(self, size):
+        self.db = get_db(data_directory(size))
+        self.city_slug = 'city-001'
+        self.last_date = self.db.query(tables.Event.date).order_by(
+            tables.Event.date.desc()).first()[0]
+        self.now = self.last_date - datetime.timedelta(days=365)
+        self.event_date = self.db.query(tables.Event.date).filter(
+            tables.Event.city_slug == self.city_slug,
+            tables.Event.date <= self.now,
+        ).order_by(tables.Event.date.desc()).first()[0]
+
+    def time_get_event_by_date(self, size):
+        cliutil.get_event(self.db, self.city_slug,
+                          self.event_date.strftime('%Y-%m-%d'), self.now)
+
+    def time_get_event_relative(self, size):
+        cliutil.get_event(self.db, self.city_slug, 'p10', self.now)
+
+    def time_get_city(self, size):
+        cliutil.get_city(self.db, self.city_slug)
+
+    def time_get_calendar(self, size):
+        get_calendar(self.db, self.now.year, self.now.month)
+
+    def time_get_calendar_year_with_series(self, size):
+        get_calendar(self.db, self.now.year, 1, num_months=12,
+                     series_slugs=['city-001-series-00'])
+
+
+class PreparedQueries:
+    """Per-call latency of common lookups: ORM Query built on each call
+    (as the code did before `pyvodb.queries`) vs. prebuilt statements"""
+    params = list(SIZES)
+    param_names = ['size']
+    timeout = 300
+
+    def setup(self, size):
+        self.db = get_db(data_directory(size))
+        event = self.db.query(tables.Event).filter(
+            tables.Event.city_slug == 'city-001').first()
+        self.city_slug = event.city_slug
+        self.series_slug = event.series_slug
+        self.date = event.date
+        self.start = self.date.replace(day=1)
+        self.end = self.start + datetime.timedelta(days=92)
+
+    def time_event_by_city_date_query(self, size):
+        self.db.query(tables.Event).filter(
+            tables.Event.city_slug == self.city_slug,
+            tables.Event.date == self.date,
+        ).all()
+
+    def time_event_by_city_date_prepared(self, size):
+        queries.events_by_city_date(self.db, self.city_slug, self.date)
+
+    def time_events_in_range_query(self, size):
+        self.db.query(tables.Event).filter(
+            tables.Event.date >= self.start,
+            tables.Event.date < self.end,
+        ).all()
+
+    def time_events_in_range_prepared(self, size):
+        queries.events_in_range(self.db, self.start, self.end)
+
+    def time_latest_event_query(self, size):
+        self.db.query(tables.Event).filter(
+            tables.Event.series_slug == self.series_slug,
+        ).order_by(tables.Event.date.desc()).limit(1).one()
+
+    def time_latest_event_prepared(self, size):
+        queries.latest_event(self.db, self.series_slug)
+
+
+class Listing:
+    """Getting a deep page of all events: keyset cursor vs. OFFSET"""
+    params = list(SIZES)
+    param_names = ['size']
+    timeout = 300
+    page_size = 20
+
+    def setup(self, size):
+        self.db = get_db(data_directory(size))
+        self.offset = self.db.query(tables.Event).count() * 9 // 10
+        [self.cursor_event] = self.db.query(tables.Event).order_by(
+            tables.Event.date, tables.Event.start_time, tables.Event.id,
+        ).offset(self.offset - 1).limit(1)
+        self.cursor = listing._encode_cursor(
+            None, None, False, False, listing._key(self.cursor_event))
+
+    def time_deep_page_keyset(self, size):
+        listing.list_events(self.db, self.cursor, limit=self.page_size)
+
+    def time_deep_page_offset(self, size):
+        self.db.query(tables.Event).order_by(
+            tables.Event.date, tables.Event.start_time, tables.Event.id,
+        ).offset(self.offset).limit(self.page_size + 1).all()
+
+
+class Export:
+    params = list(SIZES)
+    param_names = ['size']
+    timeout = 300
+
+    def setup(self, size):
+        self.db = get_db(data_directory(size))
+
+    def time_as_dict_all(self, size):
+        self.db.expire_all()
+        for event in self.db.query(tables.Event):
+            event.as_dict()
+
+    def time_json_dump_all(self, size):
+        self.db.expire_all()
+        json_dump(list(self.db.query(tables.Event)))
+
+    def time_build_api(self, size):
+        api.build_api(self.db, tempfile.mkdtemp(prefix='pyvodb-bench-api-'))
+
+
+class RebuildAPI:
+    params = list(SIZES)
+    param_names = ['size']
+    timeout = 300
+
+    def setup(self, size):
+        self.db = get_db(data_directory(size))
+        self.outdir = tempfile.mkdtemp(prefix='pyvodb-bench-api-')
+        api.build_api(self.db, self.outdir)
+
+    def time_rebuild_api_unchanged(self, size):
+        api.build_api(self.db, self.outdir)
+
+
+def _walk(events):
+    """Read the attributes and relationships typically used by exporters"""
+    for event in events:
+        event.title
+        event.city.name
+        if event.venue:
+            event.venue.name
+        for talk in event.talks:
+            talk.title
+            for speaker in talk.speakers:
+                speaker.name
+            for link in talk.links:
+                link.url
+
+
+def _orm_events(db):
+    """All events with their relationships, loaded eagerly through the ORM"""
+    query = db.query(tables.Event).options(
+        joinedload(tables.Event.city),
+        joinedload(tables.Event.venue),
+        selectinload(tables.Event.links),
+        selectinload(tables.Event.talks).selectinload(tables.Talk.links),
+        selectinload(tables.Event.talks)
+            .selectinload(tables.Talk.talk_speakers)
+            .joinedload(tables.TalkSpeaker.speaker),
+    )
+    return query.all()
+
+
+def _traced_size(func):
+    """Memory (in bytes) allocated by func() and still held by its result"""
+    tracemalloc.start()
+    try:
+        result = func()
+        size, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return size
+
+
+class Snapshot:
+    """The read-only snapshot (pyvodb.snapshot) compared with the ORM"""
+    params = list(SIZES)
+    param_names = ['size']
+    timeout = 300
+
+    def setup(self, size):
+        self.db = get_db(data_directory(size))
+        self.snapshot = snapshot.from_db(self.db)
+
+    def time_build_snapshot(self, size):
+        snapshot.from_db(self.db)
+
+    def time_walk_orm(self, size):
+        self.db.expire_all()
+        _walk(_orm_events(self.db))
+
+    def time_walk_snapshot(self, size):
+        _walk(self.snapshot.events)
+
+    def time_as_dict_snapshot(self, size):
+        for event in self.snapshot.events:
+            event.as_dict()
+
+    def track_memory_orm(self, size):
+        self.db.expunge_all()
+        return _traced_size(lambda: _orm_events(self.db))
+    track_memory_orm.unit = 'bytes'
+
+    def track_memory_snapshot(self, size):
+        return _traced_size(lambda: snapshot.from_db(self.db))
+    track_memory_snapshot.unit = 'bytes'
+
+
+class Cli:
+    timeout = 300
+
+    def setup(self):
+        self.directory = data_directory('small')
+        self.env = dict(os.environ, PYVO_DATA=self.directory)
+
+    def time_startup_help(self):
+        subprocess.check_call([sys.executable, '-m', 'pyvodb', '--help'],
+                              stdout=subprocess.DEVNULL, env=self.env)
+
+    def time_show(self):
+        subprocess.check_call(
+            [sys.executable, '-m', 'pyvodb', 'show', 'city-000', 'p1'],
+            stdout=subprocess.DEVNULL, stdin=subprocess.DEVNULL,
+            env=self.env)
+
+    def time_calendar_in_process(self):
+        result = CliRunner().invoke(cli, ['--data', self.directory,
+                                          'calendar', '-y'], obj={})
+        assert result.exit_code == 0, result.output
@@ -0,0 +1,170 @@
+"""Asyncio interface to the database
+
+The SQLAlchemy Session returned by `get_db` is synchronous: using it from
+a coroutine blocks the event loop. AsyncDB runs all database work in a
+worker thread instead, and exposes common queries as coroutines::
+
+    db = await AsyncDB.open(directory)
+    event = await db.get_event('brno', datetime.date(2013, 5, 30))
+    await db.close()
+
+Any number of coroutines can be awaited concurrently; the queries are
+queued and run one at a time (an in-memory SQLite database can only be
+used from the thread that created it, so the data is loaded in the worker
+thread too).
+
+The results are plain data (dicts, lists, dates), never ORM objects,
+because those may lazy-load data through the Session when used.
+Use `run` to do other work with the Session in the worker thread.
+"""
+
+import asyncio
+import functools
+import collections
+import concurrent.futures
+
+from sqlalchemy.orm import joinedload, selectinload
+
+from . import tables
+from .load import get_db
+from .calendar import get_calendar
+
+
+class AsyncDB:
+    """Runs database operations in a worker thread
+
+    Don't create instances directly; use `AsyncDB.open`.
+    """
+    def __init__(self, executor, db):
+        self._executor = executor
+        self._db = db
+
+    @classmethod
+    async def open(cls, directory, **kwargs):
+        """Load the data (in a worker thread) and return an AsyncDB
+
+        The arguments are the same as for `pyvodb.load.get_db`.
+        """
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        loop = asyncio.get_event_loop()
+        try:
+            db = await loop.run_in_executor(
+                executor, functools.partial(get_db, directory, **kwargs))
+        except BaseException:
+            executor.shutdown(wait=False)
+            raise
+        return cls(executor, db)
+
+    async def close(self):
+        """Close the Session and stop the worker thread"""
+        if self._executor is None:
+            return
+        await self.run(lambda db: db.close())
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def run(self, func, *args, **kwargs):
+        """Call ``func(db, *args, **kwargs)`` in the worker thread
+
+        `db` is the Session. Don't return ORM objects from `func`.
+        """
+        if self._executor is None:
+            raise ValueError('AsyncDB is closed')
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            functools.partial(func, self._db, *args, **kwargs))
+
+    async def get_event(self, city_slug, date):
+        """Get the event in a city on a date, as dict (see Event.as_dict)
+
+        Returns None if there's no such event.
+        """
+        return await self.run(_get_event, city_slug, date)
+
+    async def get_calendar(self, year, month, num_months=3,
+                           series_slugs=None):
+        """Get a calendar, like `pyvodb.calendar.get_calendar`
+
+        Events in the result are dicts (see Event.as_dict), and planned
+        occurrences (``next_occurences``) are series slugs.
+        """
+        return await self.run(_get_calendar, year, month, num_months,
+                              series_slugs)
+
+    async def series_occurrences(self, series_slug, n=None, since=None):
+        """Get a list of the next planned dates of a series
+
+        See `pyvodb.tables.Series.next_occurrences`; `n` should be given
+        unless the series has an end date. Returns None if there's no such
+        series.
+        """
+        return await self.run(_series_occurrences, series_slug, n, since)
+
+    async def export(self, city_slug=None, series_slug=None):
+        """Get a list of events as dicts (see Event.as_dict)
+
+        The events can be filtered by city and series.
+        They are in chronological order.
+        """
+        return await self.run(_export, city_slug, series_slug)
+
+
+def _event_query(db):
+    query = db.query(tables.Event)
+    return query.options(
+        joinedload(tables.Event.city),
+        joinedload(tables.Event.venue),
+        selectinload(tables.Event.links),
+        selectinload(tables.Event.talks).selectinload(tables.Talk.links),
+        selectinload(tables.Event.talks)
+            .selectinload(tables.Talk.talk_speakers)
+            .joinedload(tables.TalkSpeaker.speaker),
+    )
+
+
+def _get_event(db, city_slug, date):
+    query = _event_query(db)
+    query = query.filter(tables.Event.city_slug == city_slug)
+    query = query.filter(tables.Event.date == date)
+    event = query.order_by(tables.Event.start_time).first()
+    if event is None:
+        return None
+    return event.as_dict()
+
+
+def _get_calendar(db, year, month, num_months, series_slugs):
+    calendar = get_calendar(db, year, month, num_months=num_months,
+                            series_slugs=series_slugs)
+    result = collections.OrderedDict()
+    for key, weeks in calendar.items():
+        result[key] = [
+            [dict(day,
+                  events=[e.as_dict() for e in day['events']],
+                  next_occurences=[s.slug for s in day['next_occurences']])
+             for day in week]
+            for week in weeks]
+    return result
+
+
+def _series_occurrences(db, series_slug, n, since):
+    series = db.query(tables.Series).get(series_slug)
+    if series is None:
+        return None
+    return list(series.next_occurrences(n=n, since=since))
+
+
+def _export(db, city_slug, series_slug):
+    query = _event_query(db)
+    if city_slug is not None:
+        query = query.filter(tables.Event.city_slug == city_slug)
+    if series_slug is not None:
+        query = query.filter(tables.Event.series_slug == series_slug)
+    query = query.order_by(tables.Event.date, tables.Event.start_time)
+    return [event.as_dict() for event in query]
@@ -0,0 +1,230 @@
+"""A static JSON API: one document per event, series and city
+
+`build_api` writes these files under an output directory:
+
+* ``index.json``: lists of cities and series, with paths to their documents
+* ``events/index.json``: summaries of all events, oldest first
+* ``events/<series>/<YYYY-MM-DD>.json``: an event (see `event_document`)
+* ``cities/<slug>.json``: a city, its venues, and summaries of its events
+* ``series/<slug>.json``: a series and summaries of its events
+* ``manifest.json``: SHA-1 hashes of all the above files
+
+All data is read from the database in one pass, into a `pyvodb.snapshot`
+(which has all relationships resolved, and is much faster to build and walk
+than ORM objects). The documents are then serialized (in the calling
+thread: JSON encoding holds the GIL) and written by a pool of worker
+threads. A file is only written if its hash differs from the one in the
+manifest of the previous build (or if it's missing), and files of removed
+entities are deleted, so after a small change to the data only a few files
+are touched.
+"""
+
+import os
+import json
+import hashlib
+import datetime
+import collections
+import concurrent.futures
+
+from pyvodb import geo
+from pyvodb import snapshot
+from pyvodb.dumpers import JsonEncoder, json_dump
+
+MANIFEST_FILENAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+# Documents are written without indentation, which lets the json module
+# use its (much faster) C encoder
+_encoder = JsonEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+def event_path(event):
+    return 'events/{}/{}.json'.format(event.series_slug, event.date)
+
+
+def city_path(city):
+    return 'cities/{}.json'.format(city.slug)
+
+
+def series_path(series):
+    return 'series/{}.json'.format(series.slug)
+
+
+def event_document(event):
+    """The document for an event: `Event.as_dict` with series and title"""
+    result = collections.OrderedDict()
+    result['series'] = event.series_slug
+    result['title'] = event.title
+    result.update(event.as_dict())
+    return result
+
+
+def event_summary(event):
+    """Short info about an event, for listings"""
+    result = collections.OrderedDict()
+    result['path'] = event_path(event)
+    result['city'] = event.city_slug
+    result['series'] = event.series_slug
+    result['start'] = datetime.datetime.combine(event.date, event.start_time)
+    result['title'] = event.title
+    for name in 'city_name', 'venue_name', 'talk_count', 'has_video':
+        result[name] = getattr(event, name)
+    return result
+
+
+def venue_info(venue):
+    result = collections.OrderedDict()
+    for name in 'slug', 'name', 'address':
+        result[name] = getattr(venue, name)
+    result['latitude'] = geo.format_coordinate(venue.latitude)
+    result['longitude'] = geo.format_coordinate(venue.longitude)
+    result['notes'] = venue.notes
+    return result
+
+
+def get_documents(snap):
+    """Get all documents of the API, as a dict mapping paths to data
+
+    :param snap: A `pyvodb.snapshot.Snapshot` of the data
+
+    The values are plain data, suitable for `json_dump`.
+    Raises ValueError if two events would have the same path.
+    """
+    cities = sorted(snap.cities.values(), key=lambda c: c.slug)
+    series_list = sorted(snap.series.values(), key=lambda s: s.slug)
+
+    documents = collections.OrderedDict()
+    summaries = []
+    city_events = {city.slug: [] for city in cities}
+    series_events = {series.slug: [] for series in series_list}
+    sources = {}
+    for event in snap.events:
+        path = event_path(event)
+        if path in documents:
+            raise ValueError('Meetups {} and {} would both be written to {}'
+                             .format(sources[path], event._source, path))
+        sources[path] = event._source
+        documents[path] = event_document(event)
+        summary = event_summary(event)
+        summaries.append(summary)
+        city_events[event.city_slug].append(summary)
+        series_events[event.series_slug].append(summary)
+
+    documents['events/index.json'] = summaries
+
+    for city in cities:
+        document = collections.OrderedDict()
+        document['slug'] = city.slug
+        document['name'] = city.name
+        document['latitude'] = geo.format_coordinate(city.latitude)
+        document['longitude'] = geo.format_coordinate(city.longitude)
+        document['venues'] = [venue_info(v) for v in
+                              sorted(city.venues, key=lambda v: v.slug)]
+        document['events'] = city_events[city.slug][::-1]
+        documents[city_path(city)] = document
+
+    for series in series_list:
+        document = collections.OrderedDict()
+        document['slug'] = series.slug
+        document['name'] = series.name
+        document['home_city'] = series.home_city_slug
+        for name in ('description_cs', 'description_en',
+                     'recurrence_description_cs',
+                     'recurrence_description_en'):
+            document[name] = getattr(series, name)
+        document['events'] = series_events[series.slug][::-1]
+        documents[series_path(series)] = document
+
+    index = collections.OrderedDict()
+    index['events'] = 'events/index.json'
+    index['cities'] = [
+        collections.OrderedDict([
+            ('slug', city.slug), ('name', city.name),
+            ('path', city_path(city)),
+            ('event_count', len(city_events[city.slug])),
+        ])
+        for city in cities]
+    index['series'] = [
+        collections.OrderedDict([
+            ('slug', series.slug), ('name', series.name),
+            ('path', series_path(series)),
+            ('event_count', len(series_events[series.slug])),
+        ])
+        for series in series_list]
+    documents['index.json'] = index
+    return documents
+
+
+def read_manifest(directory):
+    """Get the file hashes recorded by the last build in `directory`
+
+    Returns a dict mapping paths to hashes; it's empty if there was no build.
+    """
+    try:
+        with open(os.path.join(directory, MANIFEST_FILENAME),
+                  encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return {}
+    if manifest.get('version') != MANIFEST_VERSION:
+        return {}
+    return manifest['files']
+
+
+def _write(filename, content):
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, 'wb') as f:
+        f.write(content)
+
+
+def build_api(db, directory, jobs=4):
+    """Write the JSON API into `directory`; see the module docstring
+
+    :param jobs: Number of worker threads for writing files
+
+    Returns a dict mapping statuses ('created', 'updated', 'removed',
+    'unchanged') to lists of paths.
+    """
+    old_hashes = read_manifest(directory)
+    documents = get_documents(snapshot.from_db(db))
+
+    report = collections.OrderedDict(
+        (status, []) for status in ('created', 'updated', 'removed',
+                                    'unchanged'))
+    new_hashes = collections.OrderedDict()
+    with concurrent.futures.ThreadPoolExecutor(max(jobs, 1)) as executor:
+        futures = []
+        for path, data in documents.items():
+            # Serialization holds the GIL, so it's done here; only the
+            # writes are worth offloading
+            content = _encoder.encode(data).encode('utf-8') + b'\n'
+            new_hash = new_hashes[path] = hashlib.sha1(content).hexdigest()
+            filename = os.path.join(directory, *path.split('/'))
+            old_hash = old_hashes.get(path)
+            if old_hash == new_hash and os.path.exists(filename):
+                report['unchanged'].append(path)
+                continue
+            elif old_hash is None or old_hash == new_hash:
+                report['created'].append(path)
+            else:
+                report['updated'].append(path)
+            futures.append(executor.submit(_write, filename, content))
+        for future in futures:
+            future.result()
+
+    for path in sorted(old_hashes.keys() - new_hashes.keys()):
+        try:
+            os.unlink(os.path.join(directory, *path.split('/')))
+        except FileNotFoundError:
+            pass
+        report['removed'].append(path)
+
+    manifest = collections.OrderedDict([
+        ('version', MANIFEST_VERSION),
+        ('files', collections.OrderedDict(sorted(new_hashes.items()))),
+    ])
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, MANIFEST_FILENAME), 'w',
+              encoding='utf-8') as f:
+        f.write(json_dump(manifest) + '\n')
+    return report
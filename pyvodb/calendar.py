@@ -6,6 +6,7 @@ from dateutil.relativedelta import relativedelta
 from dateutil import tz
 
 from pyvodb import tables
+from pyvodb import queries
 
 DAY = datetime.timedelta(days=1)
 WEEK = DAY * 7
@@ -32,23 +33,22 @@ def get_calendar(db, first_year=None, first_month=None, num_months=3,
     start = datetime.date(year=first_year, month=first_month, day=1)
     end = start + relativedelta(months=num_months)
 
-    query = db.query(tables.Event)
-    query = query.filter(tables.Event.date >= start)
-    query = query.filter(tables.Event.date < end)
-    if series_slugs is not None:
-        query = query.filter(tables.Event.series_slug.in_(series_slugs))
     events = collections.defaultdict(list)
     next_occurences = collections.defaultdict(list)
-    for event in query:
+    for event in queries.events_in_range(db, start, end,
+                                         series_slugs=series_slugs):
         events[event.date].append(event)
 
     if series_slugs is not None:
-        query = db.query(tables.Series)
         for series_slug in series_slugs:
-            series = query.get(series_slug)
+            series = db.get(tables.Series, series_slug)
             if not series:
                 continue
-            next_occurrences = series.next_occurrences()
+            last_planned_event = queries.latest_event(db, series_slug)
+            if last_planned_event is None:
+                continue
+            next_occurrences = tables.next_occurrences(series,
+                                                       last_planned_event)
             zero_time = datetime.time(tzinfo=CET)
             start_date = datetime.datetime.combine(start, zero_time)
             end_date = datetime.datetime.combine(end+relativedelta(days=1),
@@ -1,6 +1,17 @@
+from . import api
+from . import archive
+from . import batch
 from . import calendar
+from . import complete
+from . import diff
+from . import ics
+from . import near
+from . import search
 from . import show
 from . import videometadata
+from . import videos
 from .top import cli, main
 
-__all__ = ['cli', 'main', 'calendar', 'show', 'videometadata']
+__all__ = ['cli', 'main', 'api', 'archive', 'batch', 'calendar', 'complete',
+           'diff', 'ics', 'near', 'search', 'show', 'videometadata',
+           'videos']
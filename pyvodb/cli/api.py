@@ -0,0 +1,36 @@
+import click
+
+from pyvodb import api
+
+from pyvodb.cli.top import cli
+from pyvodb.cli import cliutil
+
+
+@cli.command('build-api')
+@click.option('-j', '--jobs', type=int, default=4,
+              help='Number of files to write in parallel (default: 4).')
+@click.argument('outdir', type=click.Path(file_okay=False))
+@click.pass_context
+def build_api(ctx, jobs, outdir):
+    """Write a static JSON API for all meetups, series and cities.
+
+    Writes one document per meetup, series and city, and index listings.
+    Files that didn't change since the previous build (according to
+    OUTDIR/manifest.json) are not rewritten, and files of meetups that
+    were removed are deleted.
+
+    Prints a report of changed files, followed by a summary.
+    """
+    db = ctx.obj['db']
+    try:
+        report = api.build_api(db, outdir, jobs=jobs)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    cliutil.handle_raw_output(ctx, report)
+
+    for status in 'created', 'updated', 'removed':
+        for path in report[status]:
+            print('{}: {}'.format(status, path))
+    print(', '.join('{} {}'.format(len(paths), status)
+                    for status, paths in report.items()))
@@ -0,0 +1,34 @@
+import datetime
+
+import click
+
+from pyvodb import tiered
+
+from pyvodb.cli.top import cli
+from pyvodb.cli import cliutil
+
+
+@cli.command('build-archive')
+@click.option('--before', callback=cliutil.parse_day,
+              help='Archive meetups before this date (YYYY-MM-DD). '
+                   'Default: January 1 of the previous year.')
+@click.argument('filename', type=click.Path(dir_okay=False))
+@click.pass_context
+def build_archive(ctx, before, filename):
+    """Compile past meetups into an archive file.
+
+    Meetups in the archive are not parsed from the data directory when
+    the data is loaded with `--archive FILENAME` (or PYVO_ARCHIVE), which
+    makes loading faster. If an archived file (or a file of the city or
+    venue of an archived meetup) changes, the archive must be rebuilt.
+    """
+    db = ctx.obj['db']
+    if before is None:
+        before = datetime.date(ctx.obj['now'].year - 1, 1, 1)
+    try:
+        count = tiered.build_archive(db, ctx.obj['datadir'], filename,
+                                     before)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    print('Archived {} meetups before {} in {}'.format(
+        count, before, filename))
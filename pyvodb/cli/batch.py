@@ -0,0 +1,82 @@
+import io
+import sys
+import shlex
+import collections
+import contextlib
+
+import click
+
+from pyvodb.dumpers import JsonEncoder
+
+from pyvodb.cli.top import cli
+
+_encoder = JsonEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+@cli.command()
+@click.argument('file', type=click.File('r', encoding='utf-8'), default='-')
+@click.pass_context
+def batch(ctx, file):
+    """Run many commands, loading the data only once.
+
+    Reads commands from FILE (default: standard input), one per line, in
+    the same syntax as on the command line (without the leading "pyvo"),
+    for example:
+
+    \b
+        show brno 2015-02-26
+        calendar 2015-02
+
+    Empty lines and lines starting with "#" are skipped.
+
+    For each command, writes one line of JSON with the "command" and one of:
+
+    \b
+        - "result": the data the command outputs with --json
+        - "output": the text output, for commands without JSON output
+        - "error": an error message
+    """
+    if 'raw_output' in ctx.obj:
+        raise click.UsageError('batch cannot be nested')
+    for line in file:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        result = run_command(ctx, line)
+        print(_encoder.encode(result))
+        sys.stdout.flush()
+
+
+def run_command(ctx, line):
+    """Run a command line with the loaded database; return a result record
+    """
+    result = collections.OrderedDict()
+    result['command'] = line
+    results = []
+    obj = {'db': ctx.obj['db'], 'raw_output': results.append}
+    output = io.StringIO()
+    error = None
+    try:
+        args = ['--data', ctx.obj['datadir'], *shlex.split(line)]
+        with contextlib.redirect_stdout(output):
+            cli.main(args=args, prog_name='pyvo', obj=obj,
+                     standalone_mode=False)
+    except SystemExit as e:
+        if isinstance(e.code, str):
+            error = e.code
+        elif e.code:
+            error = 'Exit status {}'.format(e.code)
+    except click.ClickException as e:
+        error = e.format_message()
+    except click.Abort:
+        error = 'Aborted'
+    except Exception as e:
+        error = '{}: {}'.format(type(e).__name__, e)
+
+    if error is not None:
+        result['error'] = error
+    elif results:
+        [result['result']] = results
+    else:
+        result['output'] = output.getvalue()
+    return result
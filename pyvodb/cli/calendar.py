@@ -92,7 +92,7 @@ def render_calendar(term, calendar, today=None, agenda=False):
                             if count > 1:
                                 representation = '**'
                             else:
-                                representation = day['events'][0].city.slug[:2]
+                                representation = day['events'][0].city_slug[:2]
                             color = term.bold_red
                         else:
                             representation = str(day['day'].day)
@@ -117,7 +117,7 @@ def render_calendar(term, calendar, today=None, agenda=False):
                                 print('{}:'.format(MONTH_NAMES[month]))
                                 need_nl = False
                             date = event.date
-                            city = event.city.slug
+                            city = event.city_slug
                             if len(day['events']) > 2:
                                 date = term.bold_red(str(date))
                             else:
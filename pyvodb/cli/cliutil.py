@@ -1,14 +1,25 @@
+import sys
 import datetime
 
 import click
-from sqlalchemy.orm.exc import NoResultFound, MultipleResultsFound
+from dateutil.relativedelta import relativedelta
 
-from pyvodb import tables
+from pyvodb import prefix
+from pyvodb import listing
+from pyvodb import queries
 from pyvodb.dumpers import yaml_dump, json_dump
 
 
 def handle_raw_output(ctx, data):
-    """If a raw output format is set, dump data and exit"""
+    """If a raw output format is set, dump data and exit
+
+    In `pyvo batch`, the data is passed to ``ctx.obj['raw_output']``
+    instead of being dumped.
+    """
+    if 'raw_output' in ctx.obj:
+        ctx.obj['raw_output'](data)
+        # (not the builtin exit(), which closes stdin that batch reads from)
+        sys.exit(0)
     if ctx.obj['format'] == 'json':
         print(json_dump(data))
         exit(0)
@@ -48,56 +59,60 @@ def parse_date(date):
         return {}
 
 
-def get_city(db, slug):
+def parse_day(ctx, param, value):
+    """Click callback for options that take a YYYY-MM-DD date"""
+    if value is None:
+        return None
     try:
-        query = db.query(tables.City)
-        return query.filter(tables.City.slug.startswith(slug)).one()
-    except NoResultFound:
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise click.BadParameter('must be a date in YYYY-MM-DD format')
+
+
+def get_city(db, slug):
+    match, city = queries.city_by_prefix(db, slug)
+    if match.status == prefix.NONE:
         raise click.UsageError('No such city: %s' % slug)
-    except MultipleResultsFound:
+    elif match.status == prefix.AMBIGUOUS:
         raise click.UsageError('City is not unique: %s' % slug)
+    return city
 
 
 def get_event(db, city_slug, date, now):
     city = get_city(db, city_slug)
 
-    query = db.query(tables.Event)
-    query = query.filter(tables.Event.city == city)
     dateinfo = parse_date(date)
-    if 'now' in dateinfo:
-        query = query.filter(tables.Event.date >= now)
-        query = query.order_by(tables.Event.date)
-        raise_on_many = False
-    elif 'relative' in dateinfo:
+    if 'now' in dateinfo or 'relative' in dateinfo:
+        # The N-th upcoming (or past, for negative N) meetup
         rel = dateinfo['relative']
-        if rel >= 0:
-            query = query.filter(tables.Event.date >= now)
-            query = query.order_by(tables.Event.date)
-        else:
-            query = query.filter(tables.Event.date < now)
-            query = query.order_by(tables.Event.date.desc())
-        query = query.offset(abs(rel) - 1)
-        raise_on_many = False
-    elif 'date_based' in dateinfo:
-        query = query.filter(tables.Event.year == dateinfo.get('year', now.year))
-        if 'month' in dateinfo:
-            query = query.filter(tables.Event.month == dateinfo['month'])
-        if 'day' in dateinfo:
-            query = query.filter(tables.Event.day == dateinfo['day'])
-        raise_on_many = True
-    else:
-        raise click.UsageError('Unknown date format')
-
-    if raise_on_many:
-        try:
-            event = query.one()
-        except NoResultFound:
-            raise SystemExit('No such meetup')
-        except MultipleResultsFound:
-            raise SystemExit('Multiple meetups match')
-    else:
-        event = query.first()
+        event = listing.nth_event(db, max(abs(rel), 1), city_slug=city.slug,
+                                  newest_first=rel < 0, start=now)
         if event is None:
             raise SystemExit('No such meetup')
+        return event
+
+    if 'date_based' not in dateinfo:
+        raise click.UsageError('Unknown date format')
+    year = dateinfo.get('year', now.year)
+    try:
+        if 'day' in dateinfo:
+            events = queries.events_by_city_date(
+                db, city.slug,
+                datetime.date(year, dateinfo['month'], dateinfo['day']))
+        else:
+            start = datetime.date(year, dateinfo.get('month', 1), 1)
+            if 'month' in dateinfo:
+                end = start + relativedelta(months=1)
+            else:
+                end = start + relativedelta(years=1)
+            events = queries.events_in_range(db, start, end,
+                                             city_slug=city.slug)
+    except ValueError:
+        # Invalid date
+        events = []
 
-    return event
+    if not events:
+        raise SystemExit('No such meetup')
+    if len(events) > 1:
+        raise SystemExit('Multiple meetups match')
+    return events[0]
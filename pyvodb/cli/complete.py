@@ -0,0 +1,25 @@
+import click
+
+from pyvodb import prefix
+
+from pyvodb.cli.top import cli
+
+
+@cli.command()
+@click.argument('kind', type=click.Choice(sorted(prefix.INDEXED_TABLES)))
+@click.argument('text', default='')
+@click.pass_context
+def complete(ctx, kind, text):
+    """List slugs for shell completion.
+
+    Prints slugs of cities, series or speakers whose slug or name starts
+    with TEXT, one per line.
+
+    \b
+    For example, to complete city names for `pyvo show` in Bash:
+        _pyvo_city() { COMPREPLY=($(pyvo complete city "$2")); }
+        complete -F _pyvo_city pyvo
+    """
+    db = ctx.obj['db']
+    for slug in prefix.get_index(db, kind).complete(text):
+        print(slug)
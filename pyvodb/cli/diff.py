@@ -0,0 +1,33 @@
+import click
+
+from pyvodb import diff as datadiff
+
+from pyvodb.cli.top import cli
+from pyvodb.cli import cliutil
+
+
+@cli.command(needs_db=False)
+@click.argument('old')
+@click.argument('new', required=False)
+@click.pass_context
+def diff(ctx, old, new):
+    """Show changes between two versions of the data.
+
+    OLD and NEW are git revisions of the data directory, or paths to other
+    data directories. If NEW is not given, the data directory itself is
+    used.
+
+    Lists added (+), removed (-) and changed (~) cities, venues, series,
+    meetups and talks, and speakers who gained or lost talks.
+    Only files that changed are parsed.
+    """
+    datadir = ctx.obj['datadir']
+    try:
+        changes = datadiff.compare(datadiff.get_source(datadir, old),
+                                   datadiff.get_source(datadir, new))
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    cliutil.handle_raw_output(ctx, changes)
+
+    print(datadiff.format_changes(changes))
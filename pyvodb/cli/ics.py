@@ -0,0 +1,63 @@
+import collections
+
+import click
+
+from pyvodb import tables
+from pyvodb import ics as ics_export
+
+from pyvodb.cli.top import cli
+from pyvodb.cli import cliutil
+
+
+@cli.command()
+@click.option('-c', '--city', help='Only include events in this city.')
+@click.option('-s', '--series', help='Only include events of this series.')
+@click.option('-p', '--projected', type=int, default=0,
+              help='Number of tentative future occurrences to include '
+                   'for each series with a recurrence rule.')
+@click.option('-o', '--outdir', type=click.Path(file_okay=False),
+              help='Write feeds for all cities and series, and the global '
+                   'feed, into this directory.')
+@click.pass_context
+def ics(ctx, city, series, projected, outdir):
+    """Export meetups as an iCalendar feed.
+
+    By default, the global feed is written to standard output.
+    With --outdir, feeds that didn't change are not rewritten, and
+    a summary is printed (with -v, preceded by the changed files).
+    """
+    db = ctx.obj['db']
+
+    if outdir:
+        if city or series:
+            raise click.UsageError(
+                '--outdir cannot be combined with --city or --series')
+        statuses = ics_export.write_all_feeds(db, outdir, projected,
+                                              now=ctx.obj['now'])
+        counts = collections.Counter(statuses.values())
+        if ctx.obj['verbose']:
+            for path, status in statuses.items():
+                if status != 'unchanged':
+                    print('{}: {}'.format(status, path))
+        print(', '.join('{} {}'.format(counts[status], status)
+                        for status in ('created', 'updated', 'unchanged')))
+        return
+
+    name = 'Pyvo'
+    city_slug = series_slug = None
+    if city:
+        city_obj = cliutil.get_city(db, city)
+        city_slug = city_obj.slug
+        name = city_obj.name
+    if series:
+        series_obj = db.query(tables.Series).get(series)
+        if series_obj is None:
+            raise click.UsageError('No such series: %s' % series)
+        series_slug = series_obj.slug
+        name = series_obj.name
+
+    lines = ics_export.generate_feed(db, name, city_slug=city_slug,
+                                     series_slug=series_slug,
+                                     projected=projected, now=ctx.obj['now'])
+    for line in lines:
+        print(line, end='\r\n')
@@ -0,0 +1,51 @@
+import click
+
+from pyvodb import geo
+
+from pyvodb.cli.top import cli
+from pyvodb.cli import cliutil
+
+
+@cli.command()
+@click.option('-r', '--radius', type=float, default=10,
+              help='Search radius in kilometers (default: 10).')
+@click.option('--past/--no-past', default=False,
+              help='Also list past meetups.')
+@click.argument('latitude', type=float)
+@click.argument('longitude', type=float)
+@click.pass_context
+def near(ctx, latitude, longitude, radius, past):
+    """Show venues near a location, and their upcoming meetups.
+
+    LATITUDE and LONGITUDE are in degrees (north and east).
+    Use "--" before negative numbers, e.g. `pyvo near -- -33.86 151.21`.
+    """
+    db = ctx.obj['db']
+    term = ctx.obj['term']
+    today = ctx.obj['now'].date()
+
+    since = None if past else today
+    nearby = geo.nearby_events(db, latitude, longitude, radius, since=since)
+
+    cliutil.handle_raw_output(ctx, [
+        {
+            'city': n.venue.city_slug,
+            'venue': n.venue.slug,
+            'name': n.venue.name,
+            'distance_km': round(n.distance, 3),
+            'events': events,
+        }
+        for n, events in nearby.items()
+    ])
+
+    if not nearby:
+        print('No venues within {} km'.format(radius))
+    for n, events in nearby.items():
+        venue = n.venue
+        print('{} ({}), {:.1f} km'.format(
+            term.bold(venue.name), venue.city.name, n.distance))
+        if venue.address:
+            print('  {}'.format(venue.short_address))
+        for event in events:
+            print('  {} {}'.format(term.bold_red(str(event.date)),
+                                   event.title))
@@ -0,0 +1,59 @@
+import click
+from sqlalchemy.exc import OperationalError
+
+from pyvodb import search as fulltext
+
+from pyvodb.cli.top import cli
+from pyvodb.cli import cliutil
+
+
+@cli.command()
+@click.option('-n', '--limit', type=int, default=20,
+              help='Maximum number of results (default: 20).')
+@click.option('--raw', is_flag=True,
+              help='Use the FTS5 query syntax (e.g. OR, NEAR, prefix*).')
+@click.argument('query', nargs=-1, required=True)
+@click.pass_context
+def search(ctx, query, limit, raw):
+    """Search talks and meetups.
+
+    Talk titles, descriptions and speaker names, and meetup names, topics
+    and descriptions are searched. The best matches are shown first.
+    """
+    db = ctx.obj['db']
+    term = ctx.obj['term']
+
+    fulltext.ensure_index(db)
+    try:
+        results = fulltext.search(db, ' '.join(query), limit=limit, raw=raw,
+                                  highlight=('\0', '\1'))
+    except OperationalError as e:
+        if not raw:
+            raise
+        # FTS5 reports syntax errors of the query this way
+        raise click.ClickException(
+            'Invalid search syntax: {}'.format(e.orig))
+
+    cliutil.handle_raw_output(ctx, [
+        {
+            'event': result.event.as_dict(),
+            'talk': result.talk.index if result.talk else None,
+            'snippet': result.snippet.replace('\0', '').replace('\1', ''),
+        }
+        for result in results
+    ])
+
+    for result in results:
+        event = result.event
+        print('{} {} {}'.format(
+            term.bold_red(event.city.slug), event.date, event.title))
+        if result.talk:
+            talk = result.talk
+            speakers = ', '.join(s.name for s in talk.speakers)
+            if speakers:
+                print('  {}: {}'.format(speakers, term.bold(talk.title)))
+            else:
+                print('  {}'.format(term.bold(talk.title)))
+        snippet = ' '.join(result.snippet.split())
+        snippet = snippet.replace('\0', term.bold).replace('\1', term.normal)
+        print('    {}'.format(snippet))
@@ -1,7 +1,10 @@
+import os
 import textwrap
 
 import click
 
+from pyvodb import geo
+
 from pyvodb.cli.top import cli
 from pyvodb.cli import cliutil
 from pyvodb.calendar import MONTH_NAMES, DAY_NAMES
@@ -60,8 +63,11 @@ def render_event(term, event, today, verbose=False):
     if event.venue.address:
         print(', {}'.format(event.venue.city.name), end='')
     print()
-    print('  {v.latitude} N, {v.longitude} E'.format(v=event.venue))
-    print('  http://mapy.cz/zakladni?x={v.longitude}&y={v.latitude}&z=17'.format(v=event.venue))
+    latitude = geo.format_coordinate(event.venue.latitude)
+    longitude = geo.format_coordinate(event.venue.longitude)
+    print('  {} N, {} E'.format(latitude, longitude))
+    print('  http://mapy.cz/zakladni?x={}&y={}&z=17'.format(
+        longitude, latitude))
     print()
     if event.talks:
         print('Talks:')
@@ -91,7 +97,10 @@ def render_event(term, event, today, verbose=False):
 
     if verbose and event._source:
         print()
-        print('entry loaded from {}'.format(event._source))
+        source = event._source
+        if event._root:
+            source = os.path.normpath(os.path.join(event._root, source))
+        print('entry loaded from {}'.format(source))
 
 
 def render_event_title(term, event):
@@ -1,12 +1,15 @@
 import logging
 import datetime
 import os
+import sys
 import shlex
+import cProfile
 
 import click
 import blessings
 
-from pyvodb.load import get_db
+from pyvodb.load import get_db, LoadProfile
+from pyvodb.instrumentation import QueryCounter
 
 
 CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
@@ -39,13 +42,34 @@ class AliasedGroup(click.Group):
 
 
 class Command(click.Command):
-    """Keep original names of commands, even if aliased"""
+    """Keep original names of commands, even if aliased
+
+    Commands created with ``needs_db=False`` don't use ``ctx.obj['db']``,
+    so the data isn't loaded for them.
+    """
+    def __init__(self, *args, needs_db=True, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.needs_db = needs_db
+
     def make_context(self, cmd_name, *args, **kwargs):
         return super().make_context(self.name, *args, **kwargs)
 
 
 @click.group(context_settings=CONTEXT_SETTINGS, cls=AliasedGroup)
-@click.option('--data', help="Data directory", default='.', envvar='PYVO_DATA')
+@click.option('--data', default='.', envvar='PYVO_DATA',
+              help="Data directory (or a .tar.gz, .tar.zst or .zip of it)")
+@click.option('--overlay', multiple=True, envvar='PYVO_OVERLAY',
+              type=click.Path(file_okay=False, exists=True),
+              help="Data directory to overlay on the data directory: its "
+                   "files take precedence. May be given several times; "
+                   "later overlays take precedence over earlier ones")
+@click.option('--rev', default=None, envvar='PYVO_REV',
+              help="Load the data from this git revision of the data "
+                   "directory, rather than from the files on disk")
+@click.option('--archive', type=click.Path(dir_okay=False), default=None,
+              envvar='PYVO_ARCHIVE',
+              help="Take past meetups from this archive (made by "
+                   "build-archive) rather than from the data directory")
 @click.option('--color/--no-color', default=None,
               help="Enable or disable color output (Default is to only use color for terminals)")
 @click.option('--yaml', 'format', flag_value='yaml', help="Export raw data as JSON")
@@ -53,17 +77,47 @@ class Command(click.Command):
 @click.option('--editor', envvar=['PYVO_EDITOR', 'VISUAL', 'EDITOR'],
               help="Your preferred editor (preferably console-based)")
 @click.option('-v/-q', '--verbose/--quiet', help="Spew lots of information")
+@click.option('--profile', is_flag=True,
+              help="Print how long the phases of loading the data took")
+@click.option('--profile-file', type=click.Path(dir_okay=False),
+              help="Profile the whole command with cProfile, and save the "
+                   "stats to this file (use the pstats module to view it)")
+@click.option('--sql-stats', is_flag=True,
+              help="Print a summary of SQL statements executed by the command")
+@click.option('--slow-sql', type=float, default=None, metavar='SECONDS',
+              help="Log SQL statements that take longer than this")
 @click.pass_context
-def cli(ctx, data, verbose, color, format, editor):
+def cli(ctx, data, overlay, rev, archive, verbose, color, format, editor,
+        profile, profile_file, sql_stats, slow_sql):
     """Query a meetup database.
     """
+    if profile_file:
+        start_cprofile(ctx, profile_file)
     ctx.obj['verbose'] = verbose
     if verbose:
         logging.basicConfig(level=logging.INFO)
         logging.getLogger('sqlalchemy.engine').setLevel(logging.INFO)
     ctx.obj['datadir'] = os.path.abspath(data)
-    if 'db' not in ctx.obj:
-        ctx.obj['db'] = get_db(data)
+    if overlay and rev is not None:
+        raise click.UsageError('--overlay cannot be used with --rev')
+    if overlay and archive is not None:
+        raise click.UsageError('--overlay cannot be used with --archive')
+    if 'db' not in ctx.obj and needs_db(ctx):
+        if profile:
+            load_profile = LoadProfile()
+            ctx.call_on_close(lambda: print_load_profile(load_profile))
+        else:
+            load_profile = None
+        try:
+            ctx.obj['db'] = get_db([data, *overlay] if overlay else data,
+                                   profile=load_profile, rev=rev,
+                                   archive=archive)
+        except ValueError as e:
+            # Bad data or options: StaleArchiveError, packload.PackError,
+            # gitload.GitError, ...
+            raise click.ClickException(str(e))
+    if (sql_stats or slow_sql is not None) and 'db' in ctx.obj:
+        start_query_counter(ctx, ctx.obj['db'], slow_sql, sql_stats)
     if color is None:
         ctx.obj['term'] = blessings.Terminal()
     elif color is True:
@@ -77,4 +131,43 @@ def cli(ctx, data, verbose, color, format, editor):
     else:
         ctx.obj['now'] = datetime.datetime.now()
     ctx.obj['format'] = format
-    ctx.obj['editor'] = shlex.split(editor)
+    # (shlex.split(None) would read standard input)
+    ctx.obj['editor'] = shlex.split(editor) if editor else []
+
+
+def needs_db(ctx):
+    """Return true if the invoked subcommand needs the database"""
+    if ctx.invoked_subcommand is None:
+        return True
+    command = ctx.command.get_command(ctx, ctx.invoked_subcommand)
+    return getattr(command, 'needs_db', True)
+
+
+def start_cprofile(ctx, filename):
+    profiler = cProfile.Profile()
+
+    def finish():
+        profiler.disable()
+        profiler.dump_stats(filename)
+
+    ctx.call_on_close(finish)
+    profiler.enable()
+
+
+def print_load_profile(load_profile):
+    print(file=sys.stderr)
+    print('Data loading profile:', file=sys.stderr)
+    print(load_profile.format(), file=sys.stderr)
+
+
+def start_query_counter(ctx, db, slow_threshold, print_summary):
+    counter = QueryCounter(slow_threshold=slow_threshold)
+    counter.attach(db.get_bind())
+
+    def finish():
+        counter.detach()
+        if print_summary:
+            print(file=sys.stderr)
+            print(counter.format_summary(), file=sys.stderr)
+
+    ctx.call_on_close(finish)
@@ -1,23 +1,55 @@
 import os.path
+import concurrent.futures
 from collections import OrderedDict
 import click
 
 from slugify import slugify
+from sqlalchemy.orm import joinedload, selectinload
+from pyvodb import tables
 from pyvodb.cli.top import cli
 from pyvodb.cli import cliutil
-from pyvodb.dumpers import yaml_dump
+from pyvodb.dumpers import yaml_dump, write_if_changed
 
 
 def cfgdump(path, config):
     """Create output directory path and output there the config.yaml file."""
     dump = yaml_dump(config)
-    if not os.path.exists(path):
-        os.makedirs(path)
-    with open(os.path.join(path, 'config.yaml'), 'w') as outf:
-        outf.write(dump)
+    write_if_changed(os.path.join(path, 'config.yaml'), dump)
     print(dump)
 
 
+def event_configs(event):
+    """Yield (directory, config) for an event and each of its talks
+
+    The directories are relative to the output path.
+    """
+    evdir = "{}-{}".format(event.city.name, event.slug)
+
+    config = OrderedDict()
+    config['speaker'] = ''
+    config['title'] = ''
+    config['lightning'] = True
+    config['speaker_only'] = False
+    config['widescreen'] = False
+    config['speaker_vid'] = "*.MTS"
+    config['screen_vid'] = "*.ts"
+    config['event'] = event.name
+    if event.number:
+        config['event'] += " #{}".format(event.number)
+    config['date'] = event.date.strftime("%Y-%m-%d")
+    config['url'] = "https://pyvo.cz/{}/{}/".format(event.series_slug,
+                                                    event.slug)
+
+    yield evdir, OrderedDict(config)
+
+    for talknum, talk in enumerate(event.talks, start=1):
+        config['speaker'] = ', '.join(s.name for s in talk.speakers)
+        config['title'] = talk.title
+        config['lightning'] = talk.is_lightning
+        talkdir = "{:02d}-{}".format(talknum, slugify(talk.title))
+        yield os.path.join(evdir, talkdir), OrderedDict(config)
+
+
 @cli.command()
 @click.argument('city')
 @click.argument('date')
@@ -34,6 +66,9 @@ def videometadata(ctx, city, date, outpath):
         - YYYY-MM or YY-MM (e.g. 2015-08)
         - MM (e.g. 08): the given month in the current year
         - pN (e.g. p1): show the N-th last meetup
+
+    Files that already have the right content are not rewritten.
+    See also `videobatch` for generating metadata for many meetups.
     """
     db = ctx.obj['db']
     today = ctx.obj['now'].date()
@@ -43,31 +78,79 @@ def videometadata(ctx, city, date, outpath):
     data = event.as_dict()
     cliutil.handle_raw_output(ctx, data)
 
-    evdir = "{}-{}".format(event.city.name, event.slug)
+    for directory, config in event_configs(event):
+        print(os.path.basename(directory))
+        cfgdump(os.path.join(outpath, directory), config)
 
-    config = OrderedDict()
-    config['speaker'] = ''
-    config['title'] = ''
-    config['lightning'] = True
-    config['speaker_only'] = False
-    config['widescreen'] = False
-    config['speaker_vid'] = "*.MTS"
-    config['screen_vid'] = "*.ts"
-    config['event'] = event.name
-    if event.number:
-        config['event'] += " #{}".format(event.number)
-    config['date'] = event.date.strftime("%Y-%m-%d")
-    config['url'] = "https://pyvo.cz/{}/{}/".format(event.series_slug,
-                                                    event.slug)
 
-    print(evdir)
-    cfgdump(os.path.join(outpath, evdir), config)
-
-    if event.talks:
-        for talknum, talk in enumerate(event.talks, start=1):
-            config['speaker'] = ', '.join(s.name for s in talk.speakers)
-            config['title'] = talk.title
-            config['lightning'] = talk.is_lightning
-            talkdir = "{:02d}-{}".format(talknum, slugify(talk.title))
-            print(talkdir)
-            cfgdump(os.path.join(outpath, evdir, talkdir), config)
+@cli.command()
+@click.option('-c', '--city', help='Only meetups in this city.')
+@click.option('-s', '--series', help='Only meetups of this series.')
+@click.option('--since', callback=cliutil.parse_day,
+              help='Only meetups on or after this date (YYYY-MM-DD).')
+@click.option('--until', callback=cliutil.parse_day,
+              help='Only meetups on or before this date (YYYY-MM-DD).')
+@click.option('-j', '--jobs', type=int, default=4,
+              help='Number of files to write in parallel (default: 4).')
+@click.argument('outpath', default=".")
+@click.pass_context
+def videobatch(ctx, city, series, since, until, jobs, outpath):
+    """Generate metadata for video records of many meetups.
+
+    Writes the same files as `videometadata`, for all meetups that match
+    the given options. Files that already have the right content are not
+    rewritten.
+
+    Prints a report of created and updated files, followed by a summary.
+    """
+    db = ctx.obj['db']
+
+    query = db.query(tables.Event)
+    query = query.options(
+        joinedload(tables.Event.city),
+        selectinload(tables.Event.talks)
+            .selectinload(tables.Talk.talk_speakers)
+            .joinedload(tables.TalkSpeaker.speaker),
+    )
+    if city:
+        query = query.filter(tables.Event.city == cliutil.get_city(db, city))
+    if series:
+        query = query.filter(tables.Event.series_slug == series)
+    if since:
+        query = query.filter(tables.Event.date >= since)
+    if until:
+        query = query.filter(tables.Event.date <= until)
+    query = query.order_by(tables.Event.date, tables.Event.start_time)
+
+    filenames = []
+    configs = []
+    sources = {}
+    for event in query:
+        for directory, config in event_configs(event):
+            filename = os.path.join(outpath, directory, 'config.yaml')
+            if filename in sources:
+                raise click.ClickException(
+                    'Meetups {} and {} would both be written to {}'.format(
+                        sources[filename], event._source, filename))
+            sources[filename] = event._source
+            filenames.append(filename)
+            configs.append(config)
+
+    def write(filename, config):
+        return write_if_changed(filename, yaml_dump(config))
+
+    with concurrent.futures.ThreadPoolExecutor(max(jobs, 1)) as executor:
+        statuses = list(executor.map(write, filenames, configs))
+
+    report = OrderedDict(
+        (status, []) for status in ('created', 'updated', 'unchanged'))
+    for filename, status in zip(filenames, statuses):
+        report[status].append(filename)
+
+    cliutil.handle_raw_output(ctx, report)
+
+    for status in 'created', 'updated':
+        for filename in report[status]:
+            print('{}: {}'.format(status, filename))
+    print(', '.join('{} {}'.format(len(names), status)
+                    for status, names in report.items()))
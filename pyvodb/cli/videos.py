@@ -0,0 +1,69 @@
+import click
+from sqlalchemy.orm import contains_eager
+
+from pyvodb import tables
+
+from pyvodb.cli.top import cli
+from pyvodb.cli import cliutil
+
+YOUTUBE_URL = 'https://www.youtube.com/watch?v={}'
+
+
+@cli.command()
+@click.option('-c', '--city', help='Only talks in this city.')
+@click.option('-s', '--series', help='Only talks of this series.')
+@click.pass_context
+def videos(ctx, city, series):
+    """List talks that have a video recording on YouTube.
+
+    Talks are listed chronologically.
+    """
+    db = ctx.obj['db']
+    term = ctx.obj['term']
+
+    query = db.query(tables.TalkLink)
+    query = query.join(tables.TalkLink.talk).join(tables.Talk.event)
+    talk_option = contains_eager(tables.TalkLink.talk)
+    query = query.options(
+        talk_option.contains_eager(tables.Talk.event),
+        talk_option.selectinload(tables.Talk.talk_speakers)
+            .joinedload(tables.TalkSpeaker.speaker),
+    )
+    query = query.filter(tables.TalkLink.youtube_id != None)
+    if city:
+        query = query.filter(
+            tables.Event.city_slug == cliutil.get_city(db, city).slug)
+    if series:
+        query = query.filter(tables.Event.series_slug == series)
+    query = query.order_by(tables.Event.date, tables.Event.start_time,
+                           tables.Talk.index, tables.TalkLink.index)
+
+    # A talk may link to its video more than once; use the first link
+    links = []
+    seen_talks = set()
+    for link in query:
+        if link.talk_id not in seen_talks:
+            seen_talks.add(link.talk_id)
+            links.append(link)
+
+    cliutil.handle_raw_output(ctx, [
+        {
+            'city': link.talk.event.city_slug,
+            'series': link.talk.event.series_slug,
+            'date': link.talk.event.date,
+            'title': link.talk.title,
+            'speakers': [s.name for s in link.talk.speakers],
+            'youtube_id': link.youtube_id,
+        }
+        for link in links
+    ])
+
+    for link in links:
+        talk = link.talk
+        speakers = ', '.join(s.name for s in talk.speakers)
+        if speakers:
+            speakers += ': '
+        print('{} {} {}{}'.format(
+            talk.event.date, term.bold_red(talk.event.city_slug.ljust(7)),
+            speakers, term.bold(talk.title)))
+        print('    {}'.format(YOUTUBE_URL.format(link.youtube_id)))
@@ -0,0 +1,236 @@
+"""Differences between two versions of the data
+
+Each version is a *source*: a data directory on disk (DirectorySource),
+or a git revision of one (GitSource).
+Files that changed are found by comparing git blob IDs, which are hashes
+of the files' content. Only those files are parsed and compared, so the
+time taken depends on the size of the change rather than of the whole data.
+When both versions are revisions in the same repository, git itself lists
+the changed files; for directories, all files are hashed (but not parsed).
+
+The result of `compare` is a dict, suitable for JSON output::
+
+    {
+        'files': [changed paths],
+        'cities': {'added': [keys], 'removed': [keys],
+                   'changed': {key: [changed fields]}},
+        'venues': ..., 'series': ..., 'events': ..., 'talks': ...,
+        'speakers': {name: {'added_talks': [talk keys],
+                            'removed_talks': [talk keys]}},
+    }
+
+Keys are ``city``, ``city/venue``, ``series``, ``series/YYYY-MM-DD``
+(events) and ``series/YYYY-MM-DD #N: Talk title`` (talks, where N is the
+position of the talk in the event, starting at 1). A talk that was retitled
+or moved is listed as removed and added.
+Speakers are only compared within the changed events: a speaker is listed
+if they gained or lost talks there.
+"""
+
+import os
+import collections
+
+from . import gitload
+from .load import DEFAULT_IGNORED_FILES, data_file_paths, load_yaml_file
+from .load import list_data_files
+from .load import make_full_datetime, parse_git_files
+
+KINDS = ('cities', 'venues', 'series', 'events', 'talks')
+
+
+class DirectorySource:
+    """A data directory on disk"""
+    def __init__(self, directory):
+        self.directory = directory
+        self.metadata = load_yaml_file(os.path.join(directory, 'meta.yaml'))
+
+    def __str__(self):
+        return self.directory
+
+    def select(self, paths):
+        return data_file_paths(paths, self._ignored_files())
+
+    def _ignored_files(self):
+        return self.metadata.get('ignored_files', DEFAULT_IGNORED_FILES)
+
+    def file_hashes(self):
+        """Get a dict mapping paths of all data files to their blob IDs"""
+        result = {}
+        for path in list_data_files(self.directory, self._ignored_files()):
+            with open(os.path.join(self.directory, path), 'rb') as f:
+                result[path] = gitload.blob_id(f.read())
+        return result
+
+    def parse(self, files):
+        """Parse files given as a dict mapping paths to blob IDs
+
+        Returns a list of ``(path, info)`` pairs.
+        """
+        return [(path, load_yaml_file(os.path.join(self.directory, path)))
+                for path in files]
+
+
+class GitSource:
+    """A git revision of a data directory"""
+    def __init__(self, directory, rev, blob_cache=None):
+        self.directory = directory
+        self.rev = rev
+        self.blob_cache = blob_cache
+        blob_ids = gitload.list_files(directory, rev, ['meta.yaml'])
+        if 'meta.yaml' not in blob_ids:
+            raise ValueError('No meta.yaml in {} at {}'.format(directory, rev))
+        [(_, self.metadata)] = self.parse(blob_ids)
+
+    def __str__(self):
+        return self.rev
+
+    def select(self, paths):
+        return data_file_paths(
+            paths, self.metadata.get('ignored_files', DEFAULT_IGNORED_FILES))
+
+    def file_hashes(self):
+        """Get a dict mapping paths of all data files to their blob IDs"""
+        blob_ids = gitload.list_files(self.directory, self.rev)
+        return {path: blob_ids[path] for path in self.select(blob_ids)}
+
+    def parse(self, files):
+        """Parse files given as a dict mapping paths to blob IDs
+
+        Returns a list of ``(path, info)`` pairs.
+        """
+        with gitload.BlobReader(self.directory) as reader:
+            return parse_git_files(reader, files, self.rev,
+                                   blob_cache=self.blob_cache)
+
+
+def get_source(datadir, spec):
+    """Get a source for a command-line argument
+
+    `spec` is a path to a data directory, or a git revision of `datadir`.
+    If `spec` is None, the `datadir` itself is used.
+    """
+    if spec is None:
+        return DirectorySource(datadir)
+    if os.path.isdir(spec):
+        return DirectorySource(spec)
+    return GitSource(datadir, spec)
+
+
+def changed_files(old, new):
+    """Find data files that differ between two sources
+
+    Returns two dicts (for `old` and `new`) mapping the paths of changed
+    files to their blob IDs. Files that are only in one of the sources
+    are only in one of the dicts.
+    """
+    if (isinstance(old, GitSource) and isinstance(new, GitSource)
+            and old.directory == new.directory):
+        changes = gitload.changed_files(old.directory, old.rev, new.rev)
+        old_paths = set(old.select(p for p, (o, n) in changes.items() if o))
+        new_paths = set(new.select(p for p, (o, n) in changes.items() if n))
+        return ({p: changes[p][0] for p in old_paths},
+                {p: changes[p][1] for p in new_paths})
+    old_hashes = old.file_hashes()
+    new_hashes = new.file_hashes()
+    changed = {path for path in old_hashes.keys() | new_hashes.keys()
+               if old_hashes.get(path) != new_hashes.get(path)}
+    return ({p: h for p, h in old_hashes.items() if p in changed},
+            {p: h for p, h in new_hashes.items() if p in changed})
+
+
+def _without(info, *names):
+    return {k: v for k, v in info.items() if k not in names}
+
+
+def _entities(files):
+    """Get comparable entities from parsed data files
+
+    Returns a dict with a mapping of keys to values for each of `KINDS`,
+    and a mapping of speaker names to sets of talk keys under 'speakers'.
+    """
+    result = {kind: {} for kind in KINDS}
+    result['speakers'] = collections.defaultdict(set)
+    for path, info in files:
+        parts = path[:-len('.yaml')].split('/')
+        if parts[0] == 'cities' and parts[2:] == ['city']:
+            result['cities'][parts[1]] = _without(info, '_source')
+        elif parts[0] == 'cities' and parts[2:3] == ['venues']:
+            key = '{}/{}'.format(parts[1], parts[3])
+            result['venues'][key] = _without(info, '_source')
+        elif parts[0] == 'series' and parts[2:] == ['series']:
+            result['series'][parts[1]] = _without(info, '_source')
+        elif parts[0] == 'series' and parts[2:3] == ['events']:
+            date = make_full_datetime(info['start']).date()
+            event_key = '{}/{}'.format(parts[1], date)
+            result['events'][event_key] = _without(info, '_source', 'talks')
+            for position, talk in enumerate(info.get('talks') or (), 1):
+                talk_key = '{} #{}: {}'.format(event_key, position,
+                                               talk['title'])
+                result['talks'][talk_key] = talk
+                for speaker in talk.get('speakers', ()):
+                    result['speakers'][speaker].add(talk_key)
+    return result
+
+
+def _changed_fields(old, new):
+    return sorted(name for name in old.keys() | new.keys()
+                  if old.get(name) != new.get(name))
+
+
+def compare(old, new):
+    """Compare two sources; see the module docstring for the result"""
+    old_files, new_files = changed_files(old, new)
+    old_entities = _entities(old.parse(old_files))
+    new_entities = _entities(new.parse(new_files))
+
+    result = collections.OrderedDict()
+    result['files'] = sorted(old_files.keys() | new_files.keys())
+    for kind in KINDS:
+        old_items = old_entities[kind]
+        new_items = new_entities[kind]
+        section = result[kind] = collections.OrderedDict()
+        section['added'] = sorted(new_items.keys() - old_items.keys())
+        section['removed'] = sorted(old_items.keys() - new_items.keys())
+        section['changed'] = collections.OrderedDict()
+        for key in sorted(old_items.keys() & new_items.keys()):
+            fields = _changed_fields(old_items[key], new_items[key])
+            if fields:
+                section['changed'][key] = fields
+
+    result['speakers'] = speakers = collections.OrderedDict()
+    old_speakers = old_entities['speakers']
+    new_speakers = new_entities['speakers']
+    for name in sorted(old_speakers.keys() | new_speakers.keys()):
+        added = new_speakers.get(name, set()) - old_speakers.get(name, set())
+        removed = old_speakers.get(name, set()) - new_speakers.get(name, set())
+        if added or removed:
+            speakers[name] = collections.OrderedDict([
+                ('added_talks', sorted(added)),
+                ('removed_talks', sorted(removed)),
+            ])
+    return result
+
+
+def format_changes(changes):
+    """Format the result of `compare` for humans"""
+    lines = []
+    for kind in KINDS:
+        section = changes[kind]
+        kind_lines = [*('  + ' + key for key in section['added']),
+                      *('  - ' + key for key in section['removed']),
+                      *('  ~ {} ({})'.format(key, ', '.join(fields))
+                        for key, fields in section['changed'].items())]
+        if kind_lines:
+            lines.append('{}:'.format(kind.capitalize()))
+            lines.extend(kind_lines)
+    if changes['speakers']:
+        lines.append('Speakers:')
+        for name, talks in changes['speakers'].items():
+            lines.append('  ~ ' + name)
+            lines.extend('      + ' + key for key in talks['added_talks'])
+            lines.extend('      - ' + key for key in talks['removed_talks'])
+    if not lines:
+        lines.append('No changes')
+    lines.append('({} file{} changed)'.format(
+        len(changes['files']), '' if len(changes['files']) == 1 else 's'))
+    return '\n'.join(lines)
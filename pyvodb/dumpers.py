@@ -1,3 +1,4 @@
+import os
 import json
 import collections
 import datetime
@@ -13,6 +14,26 @@ def yaml_dump(data):
 def json_dump(data):
     return JsonEncoder(ensure_ascii=False, indent=2).encode(data)
 
+def write_if_changed(filename, content):
+    """Write `content` to a file, unless the file already contains it
+
+    Missing directories are created.
+    Returns 'created', 'updated' or 'unchanged'.
+    """
+    try:
+        with open(filename, encoding='utf-8') as f:
+            old_content = f.read()
+    except FileNotFoundError:
+        status = 'created'
+    else:
+        if old_content == content:
+            return 'unchanged'
+        status = 'updated'
+    os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return status
+
 
 class EventDumper(yaml.SafeDumper):
     def __init__(self, *args, **kwargs):
@@ -0,0 +1,107 @@
+"""Geographic queries: nearest venues and nearby events
+
+Candidates are selected with a bounding box on the indexed latitude and
+longitude columns; only those are then checked for the exact distance.
+"""
+
+import math
+import collections
+
+from sqlalchemy.orm import joinedload
+
+from pyvodb import tables
+
+EARTH_RADIUS_KM = 6371.0
+
+NearbyVenue = collections.namedtuple('NearbyVenue', ['distance', 'venue'])
+NearbyVenue.__doc__ = """A venue with its distance (in km) from a point"""
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points, in kilometers"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2 +
+         math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1, math.sqrt(a)))
+
+
+def format_coordinate(value):
+    """Format a latitude or longitude for output, like in the data files
+
+    The data files have coordinates as strings of decimal numbers. Floats
+    format to the shortest string that converts back to the same value,
+    which gives the original string, except for trailing zeros.
+    """
+    text = repr(float(value))
+    if text.endswith('.0'):
+        text = text[:-2]
+    return text
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """Get a box containing all points within `radius_km` of a point
+
+    Returns ``(min_lat, max_lat, min_lon, max_lon)``.
+    The longitude bounds are None if the box would contain a pole or cross
+    the 180th meridian; in that case no points can be excluded by longitude.
+    """
+    delta_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat = latitude - delta_lat
+    max_lat = latitude + delta_lat
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90), min(max_lat, 90), None, None
+    delta_lon = math.degrees(math.asin(
+        min(1, math.sin(radius_km / EARTH_RADIUS_KM) /
+            math.cos(math.radians(latitude)))))
+    min_lon = longitude - delta_lon
+    max_lon = longitude + delta_lon
+    if min_lon < -180 or max_lon > 180:
+        return min_lat, max_lat, None, None
+    return min_lat, max_lat, min_lon, max_lon
+
+
+def nearest_venues(db, latitude, longitude, radius_km=10, limit=None):
+    """Get venues within `radius_km` of a point, nearest first
+
+    Returns a list of NearbyVenue tuples.
+    """
+    min_lat, max_lat, min_lon, max_lon = bounding_box(
+        latitude, longitude, radius_km)
+    query = db.query(tables.Venue)
+    query = query.options(joinedload(tables.Venue.city))
+    query = query.filter(tables.Venue.latitude.between(min_lat, max_lat))
+    if min_lon is not None:
+        query = query.filter(tables.Venue.longitude.between(min_lon, max_lon))
+
+    result = []
+    for venue in query:
+        distance = distance_km(latitude, longitude,
+                               venue.latitude, venue.longitude)
+        if distance <= radius_km:
+            result.append(NearbyVenue(distance, venue))
+    result.sort(key=lambda n: (n.distance, n.venue.id))
+    if limit is not None:
+        result = result[:limit]
+    return result
+
+
+def nearby_events(db, latitude, longitude, radius_km=10, since=None):
+    """Get events at venues within `radius_km` of a point
+
+    If `since` (a date) is given, only events on or after it are returned.
+    Returns a dict mapping NearbyVenue tuples (nearest first) to lists of
+    their events, in chronological order.
+    """
+    venues = nearest_venues(db, latitude, longitude, radius_km)
+    result = collections.OrderedDict((n, []) for n in venues)
+    if not venues:
+        return result
+    by_id = {n.venue.id: n for n in venues}
+    query = db.query(tables.Event)
+    query = query.filter(tables.Event.venue_id.in_(by_id))
+    if since is not None:
+        query = query.filter(tables.Event.date >= since)
+    query = query.order_by(tables.Event.date, tables.Event.start_time)
+    for event in query:
+        result[by_id[event.venue_id]].append(event)
+    return result
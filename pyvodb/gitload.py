@@ -0,0 +1,193 @@
+"""Reading data files from a git repository, without checking them out
+
+Files are listed with ``git ls-tree``, and their contents are read through
+a single ``git cat-file --batch`` process (see BlobReader).
+
+Parsed files can be kept in a BlobCache, keyed by git blob IDs. A blob ID
+is a hash of the file's content, so a cached entry is valid for any revision
+(and any repository): when loading several revisions with the same cache,
+only files that changed between them are parsed again.
+Caching is opt-in: a cache holds parsed data for as long as it's kept.
+"""
+
+import hashlib
+import threading
+import subprocess
+import collections
+
+
+class GitError(ValueError):
+    """Raised when a git command fails"""
+
+
+def _run_git(directory, *args):
+    try:
+        result = subprocess.run(
+            ['git', *args], cwd=directory,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            stdin=subprocess.DEVNULL)
+    except OSError as e:
+        raise GitError('Could not run git: {}'.format(e)) from e
+    if result.returncode:
+        raise GitError('git {} failed: {}'.format(
+            args[0], result.stderr.decode('utf-8', 'replace').strip()))
+    return result.stdout
+
+
+def blob_id(content):
+    """Compute the git blob ID of a file's content (bytes)"""
+    digest = hashlib.sha1(b'blob %d\0' % len(content))
+    digest.update(content)
+    return digest.hexdigest()
+
+
+def list_files(directory, rev, paths=()):
+    """List files under `directory` at a given git revision
+
+    If `paths` are given, only those files are listed.
+    Returns a dict mapping paths relative to `directory`
+    (with ``/`` as separator) to blob IDs.
+    """
+    output = _run_git(directory, 'ls-tree', '-r', '-z', rev, '--', *paths)
+    result = {}
+    for entry in output.split(b'\0'):
+        if not entry:
+            continue
+        info, path = entry.split(b'\t', 1)
+        mode, kind, blob_id = info.split()
+        if kind == b'blob':
+            result[path.decode('utf-8')] = blob_id.decode('ascii')
+    return result
+
+
+def changed_files(directory, old_rev, new_rev):
+    """List files under `directory` that differ between two revisions
+
+    Returns a dict mapping paths relative to `directory`
+    (with ``/`` as separator) to ``(old_blob_id, new_blob_id)``;
+    a blob ID is None if the file doesn't exist in that revision.
+    Git only compares trees that differ, so this takes time proportional
+    to the size of the change.
+    """
+    output = _run_git(directory, 'diff', '--raw', '-z', '--no-abbrev',
+                      '--no-renames', '--relative', old_rev, new_rev)
+    fields = output.split(b'\0')
+    result = {}
+    for info, path in zip(fields[0::2], fields[1::2]):
+        old_mode, new_mode, old_id, new_id, status = info.split()
+        result[path.decode('utf-8')] = (
+            None if set(old_id) == {ord('0')} else old_id.decode('ascii'),
+            None if set(new_id) == {ord('0')} else new_id.decode('ascii'),
+        )
+    return result
+
+
+class BlobReader:
+    """Reads contents of git blobs through one ``git cat-file --batch`` process
+
+    Use as a context manager; the process is stopped on exit.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self._process = None
+
+    def __enter__(self):
+        try:
+            self._process = subprocess.Popen(
+                ['git', 'cat-file', '--batch'], cwd=self.directory,
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        except OSError as e:
+            raise GitError('Could not run git: {}'.format(e)) from e
+        return self
+
+    def __exit__(self, *exc_info):
+        process = self._process
+        self._process = None
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+        process.stdout.close()
+        if exc_info[0] is not None:
+            process.kill()
+        process.wait()
+
+    def read(self, blob_ids):
+        """Read the given blobs
+
+        Returns a list of ``(blob_id, content)`` pairs, with `content`
+        as bytes, in the order of `blob_ids`.
+        """
+        blob_ids = list(blob_ids)
+        process = self._process
+        if process is None:
+            raise ValueError('BlobReader must be used as a context manager')
+
+        def write_requests():
+            # Write from a separate thread, so that neither of the pipes
+            # can fill up and block the other
+            try:
+                for blob_id in blob_ids:
+                    process.stdin.write(blob_id.encode('ascii') + b'\n')
+                process.stdin.flush()
+            except BrokenPipeError:
+                pass
+
+        writer = threading.Thread(target=write_requests, daemon=True)
+        writer.start()
+        result = []
+        try:
+            for blob_id in blob_ids:
+                header = process.stdout.readline().split()
+                if len(header) != 3 or header[1] != b'blob':
+                    raise GitError('Could not read blob {}: {}'.format(
+                        blob_id,
+                        b' '.join(header).decode('utf-8', 'replace')))
+                content = process.stdout.read(int(header[2]))
+                process.stdout.read(1)  # newline after the content
+                result.append((blob_id, content))
+        except BaseException:
+            # Unblock the writer thread
+            process.kill()
+            raise
+        finally:
+            writer.join()
+        return result
+
+
+class BlobCache:
+    """Parsed file contents, keyed by git blob ID
+
+    Holds at most `maxsize` entries (or any number if `maxsize` is None);
+    the least recently used ones are dropped first.
+    The cached values are shared, and must not be modified.
+    """
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize
+        self._entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, blob_id):
+        return blob_id in self._entries
+
+    def get(self, blob_id, default=None):
+        """Get a cached value, or `default`"""
+        try:
+            value = self._entries[blob_id]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._entries.move_to_end(blob_id)
+        self.hits += 1
+        return value
+
+    def put(self, blob_id, value):
+        self._entries[blob_id] = value
+        self._entries.move_to_end(blob_id)
+        if self.maxsize is not None:
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
@@ -0,0 +1,284 @@
+"""Export of events as iCalendar (RFC 5545) feeds
+
+Feeds are generated as a stream of content lines, so even a large archive
+is never held in memory as a whole.
+"""
+
+import os
+import filecmp
+import datetime
+import contextlib
+import collections
+
+from dateutil import tz
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.exc import NoResultFound
+
+from pyvodb import tables
+from pyvodb import geo
+
+UTC = tz.tzutc()
+
+PRODID = '-//Pyvec//pyvodb//EN'
+UID_DOMAIN = 'pyvo.cz'
+EVENT_URL = 'https://pyvo.cz/{series}/{slug}/'
+
+# RFC 5545 says content lines should not be longer than 75 octets
+MAX_LINE_OCTETS = 75
+
+
+def escape_text(value):
+    """Escape a TEXT property value"""
+    value = value.replace('\\', '\\\\')
+    value = value.replace(';', '\\;').replace(',', '\\,')
+    value = value.replace('\r\n', '\n').replace('\n', '\\n')
+    return value
+
+
+def fold_line(line):
+    """Fold a content line into chunks of at most 75 octets
+
+    Continuation lines start with a single space.
+    Multi-byte UTF-8 sequences are never split.
+    """
+    result = []
+    current = []
+    size = 0
+    limit = MAX_LINE_OCTETS
+    for char in line:
+        char_size = len(char.encode('utf-8'))
+        if size + char_size > limit:
+            result.append(''.join(current))
+            current = [' ']
+            size = 1
+        current.append(char)
+        size += char_size
+    result.append(''.join(current))
+    return result
+
+
+def format_utc(value):
+    """Format an aware datetime (or naive one in CET) as an UTC DATE-TIME"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=tables.CET)
+    return value.astimezone(UTC).strftime('%Y%m%dT%H%M%SZ')
+
+
+def calendar_header(name):
+    yield 'BEGIN:VCALENDAR'
+    yield 'VERSION:2.0'
+    yield 'PRODID:' + PRODID
+    yield 'CALSCALE:GREGORIAN'
+    yield 'METHOD:PUBLISH'
+    yield 'X-WR-CALNAME:' + escape_text(name)
+
+
+def calendar_footer():
+    yield 'END:VCALENDAR'
+
+
+def event_lines(event, stamp):
+    """Yield unfolded content lines of a VEVENT for the given Event"""
+    yield 'BEGIN:VEVENT'
+    yield 'UID:pyvo-{}-{}@{}'.format(
+        event.series_slug, event.date.isoformat(), UID_DOMAIN)
+    yield 'DTSTAMP:' + stamp
+    if event.all_day:
+        end_date = event.end.date() if event.end else event.date
+        yield 'DTSTART;VALUE=DATE:' + event.date.strftime('%Y%m%d')
+        yield 'DTEND;VALUE=DATE:' + (
+            end_date + datetime.timedelta(days=1)).strftime('%Y%m%d')
+    else:
+        yield 'DTSTART:' + format_utc(event.start)
+        if event.end is not None:
+            yield 'DTEND:' + format_utc(event.end)
+    yield 'SUMMARY:' + escape_text(event.title)
+    if event.description:
+        yield 'DESCRIPTION:' + escape_text(event.description)
+    venue = event.venue
+    if venue is not None:
+        location = venue.name
+        if venue.address:
+            location = '{}, {}'.format(location, venue.short_address)
+        yield 'LOCATION:' + escape_text(location)
+        yield 'GEO:{};{}'.format(geo.format_coordinate(venue.latitude),
+                                 geo.format_coordinate(venue.longitude))
+    yield 'URL:' + EVENT_URL.format(series=event.series_slug, slug=event.slug)
+    yield 'STATUS:CONFIRMED'
+    yield 'END:VEVENT'
+
+
+def occurrence_lines(series, occurrence, stamp):
+    """Yield unfolded content lines of a tentative VEVENT
+
+    ``occurrence`` is a datetime projected from the series' recurrence rule.
+    """
+    yield 'BEGIN:VEVENT'
+    yield 'UID:pyvo-{}-{}-projected@{}'.format(
+        series.slug, occurrence.date().isoformat(), UID_DOMAIN)
+    yield 'DTSTAMP:' + stamp
+    yield 'DTSTART:' + format_utc(occurrence)
+    yield 'SUMMARY:' + escape_text(series.name)
+    if series.recurrence_description_en:
+        yield 'DESCRIPTION:' + escape_text(series.recurrence_description_en)
+    yield 'STATUS:TENTATIVE'
+    yield 'END:VEVENT'
+
+
+def projected_occurrences(series, n):
+    """Get up to `n` projected occurrences of a series (may be empty)"""
+    if not n or series.recurrence_scheme is None:
+        return []
+    try:
+        return list(series.next_occurrences(n=n))
+    except NoResultFound:
+        # No event planned yet, so there's nothing to project from
+        return []
+
+
+def query_events(db, city_slug=None, series_slug=None):
+    """Query events for a feed, oldest first, with venues loaded eagerly"""
+    query = db.query(tables.Event)
+    query = query.options(joinedload(tables.Event.venue))
+    if city_slug is not None:
+        query = query.filter(tables.Event.city_slug == city_slug)
+    if series_slug is not None:
+        query = query.filter(tables.Event.series_slug == series_slug)
+    query = query.order_by(tables.Event.date, tables.Event.start_time)
+    return query.yield_per(100)
+
+
+def get_stamp(now=None):
+    if now is None:
+        now = datetime.datetime.now(UTC)
+    return format_utc(now)
+
+
+def generate_feed(db, name, city_slug=None, series_slug=None, projected=0,
+                  now=None):
+    """Yield folded content lines of a feed
+
+    :param name: Name of the calendar
+    :param city_slug: If given, only include events in this city
+    :param series_slug: If given, only include events of this series
+    :param projected: Number of tentative occurrences to project for each
+                      series with a recurrence rule
+    :param now: Time to use for DTSTAMP (default: current time)
+    """
+    stamp = get_stamp(now)
+    yield from fold_feed_lines(calendar_header(name))
+    for event in query_events(db, city_slug, series_slug):
+        yield from fold_feed_lines(event_lines(event, stamp))
+    if projected:
+        query = db.query(tables.Series)
+        if series_slug is not None:
+            query = query.filter(tables.Series.slug == series_slug)
+        if city_slug is not None:
+            query = query.filter(tables.Series.home_city_slug == city_slug)
+        for series in query.order_by(tables.Series.slug):
+            for occurrence in projected_occurrences(series, projected):
+                yield from fold_feed_lines(
+                    occurrence_lines(series, occurrence, stamp))
+    yield from fold_feed_lines(calendar_footer())
+
+
+def fold_feed_lines(lines):
+    for line in lines:
+        yield from fold_line(line)
+
+
+def write_lines(outfile, lines):
+    for line in lines:
+        outfile.write(line + '\r\n')
+
+
+def write_all_feeds(db, directory, projected=0, now=None):
+    """Write the global feed and feeds for all cities and series
+
+    The events are read from the database in a single pass; each VEVENT
+    is rendered once and written to all feeds it belongs to.
+
+    The files written are ``all.ics``, ``cities/<slug>.ics`` and
+    ``series/<slug>.ics`` under `directory`. Each feed is streamed to
+    a temporary file, which replaces the feed only if the content changed.
+    Returns a dict mapping the paths to 'created', 'updated' or 'unchanged'
+    (like `dumpers.write_if_changed`).
+    """
+    stamp = get_stamp(now)
+    cities = db.query(tables.City).order_by(tables.City.slug).all()
+    series_list = db.query(tables.Series).order_by(tables.Series.slug).all()
+
+    paths = []
+    with contextlib.ExitStack() as stack:
+        # (exited after the files are closed)
+        stack.enter_context(_removing_temp_files_on_error(paths))
+
+        def open_feed(path, name):
+            path = os.path.join(directory, path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            paths.append(path)
+            outfile = stack.enter_context(open(
+                path + _TEMP_SUFFIX, 'w', encoding='utf-8', newline=''))
+            write_lines(outfile, fold_feed_lines(calendar_header(name)))
+            return outfile
+
+        global_feed = open_feed('all.ics', 'Pyvo')
+        city_feeds = {
+            city.slug: open_feed(os.path.join('cities', city.slug + '.ics'),
+                                 city.name)
+            for city in cities}
+        series_feeds = {
+            series.slug: open_feed(
+                os.path.join('series', series.slug + '.ics'), series.name)
+            for series in series_list}
+
+        for event in query_events(db):
+            lines = list(fold_feed_lines(event_lines(event, stamp)))
+            write_lines(global_feed, lines)
+            write_lines(city_feeds[event.city_slug], lines)
+            write_lines(series_feeds[event.series_slug], lines)
+
+        for series in series_list:
+            for occurrence in projected_occurrences(series, projected):
+                lines = list(fold_feed_lines(
+                    occurrence_lines(series, occurrence, stamp)))
+                write_lines(global_feed, lines)
+                write_lines(series_feeds[series.slug], lines)
+                if series.home_city_slug in city_feeds:
+                    write_lines(city_feeds[series.home_city_slug], lines)
+
+        for outfile in [global_feed, *city_feeds.values(),
+                        *series_feeds.values()]:
+            write_lines(outfile, calendar_footer())
+
+    return collections.OrderedDict(
+        (path, _replace_if_changed(path)) for path in paths)
+
+
+_TEMP_SUFFIX = '.new'
+
+
+@contextlib.contextmanager
+def _removing_temp_files_on_error(paths):
+    try:
+        yield
+    except BaseException:
+        for path in paths:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(path + _TEMP_SUFFIX)
+        raise
+
+
+def _replace_if_changed(path):
+    """Move a feed from its temporary file to `path`, if it changed"""
+    temp_path = path + _TEMP_SUFFIX
+    if not os.path.exists(path):
+        status = 'created'
+    elif filecmp.cmp(temp_path, path, shallow=False):
+        os.unlink(temp_path)
+        return 'unchanged'
+    else:
+        status = 'updated'
+    os.replace(temp_path, path)
+    return status
+
@@ -0,0 +1,169 @@
+"""Counting and timing of SQL statements
+
+A QueryCounter listens to an engine's cursor events. It counts the
+statements (including ones that fail), aggregates their times by normalized
+SQL (so that repeated queries, e.g. lazy loads in a loop, show up as one
+line with a high count), and logs statements that take longer than a
+threshold.
+
+In tests, use `count_queries` to assert a query budget::
+
+    with count_queries(db, max_queries=5):
+        do_something(db)
+"""
+
+import re
+import time
+import logging
+import contextlib
+import collections
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+QueryStats = collections.namedtuple('QueryStats', ['count', 'seconds'])
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_LITERAL_RE = re.compile(r"""'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b""")
+_PARAM_LIST_RE = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)')
+_SELECT_LIST_RE = re.compile(r'^SELECT (?:DISTINCT )?.*? FROM ')
+
+
+def normalize_sql(statement):
+    """Normalize a SQL statement for aggregation
+
+    Whitespace is collapsed, literal values are replaced by ``?``,
+    and lists of parameters (as in ``IN (?, ?, ?)``) by ``(...)``.
+    """
+    statement = _WHITESPACE_RE.sub(' ', statement).strip()
+    statement = _LITERAL_RE.sub('?', statement)
+    statement = _PARAM_LIST_RE.sub('(...)', statement)
+    return statement
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised by `count_queries` when too many statements were executed"""
+
+
+class QueryCounter:
+    """Counts and times SQL statements executed on an engine
+
+    :param slow_threshold: Statements that take longer than this many
+                           seconds are logged as warnings, and collected
+                           in `slow_queries`.
+    """
+    def __init__(self, slow_threshold=None):
+        self.slow_threshold = slow_threshold
+        self.count = 0
+        self.seconds = 0
+        self.statements = collections.OrderedDict()
+        self.slow_queries = []
+        self._engine = None
+
+    def attach(self, engine):
+        """Start listening to statements executed on `engine`"""
+        if self._engine is not None:
+            raise ValueError('QueryCounter is already attached')
+        event.listen(engine, 'before_cursor_execute', self._before)
+        event.listen(engine, 'after_cursor_execute', self._after)
+        event.listen(engine, 'handle_error', self._handle_error)
+        self._engine = engine
+
+    def detach(self):
+        """Stop listening"""
+        event.remove(self._engine, 'before_cursor_execute', self._before)
+        event.remove(self._engine, 'after_cursor_execute', self._after)
+        event.remove(self._engine, 'handle_error', self._handle_error)
+        self._engine = None
+
+    def _before(self, conn, cursor, statement, parameters, context,
+                executemany):
+        conn.info.setdefault('pyvodb_query_start', []).append(
+            time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context,
+               executemany):
+        self._finish(conn, statement)
+
+    def _handle_error(self, exception_context):
+        # A failed statement doesn't get to after_cursor_execute
+        if exception_context.connection is not None:
+            self._finish(exception_context.connection,
+                         exception_context.statement)
+
+    def _finish(self, conn, statement):
+        starts = conn.info.get('pyvodb_query_start')
+        if not starts:
+            # Started before the counter was attached
+            return
+        seconds = time.perf_counter() - starts.pop()
+        if statement is not None:
+            self.add(statement, seconds)
+
+    def add(self, statement, seconds):
+        """Record an executed statement"""
+        self.count += 1
+        self.seconds += seconds
+        key = normalize_sql(statement)
+        old = self.statements.get(key, QueryStats(0, 0))
+        self.statements[key] = QueryStats(old.count + 1, old.seconds + seconds)
+        if self.slow_threshold is not None and seconds > self.slow_threshold:
+            self.slow_queries.append((seconds, statement))
+            logger.warning('Slow query (%.4f s): %s', seconds, key)
+
+    def format_summary(self, limit=10, width=100):
+        """Return a human-readable summary
+
+        The `limit` statements with the highest total time are listed.
+        """
+        lines = ['SQL statements: {} in {:.4f} s'.format(
+            self.count, self.seconds)]
+        if self.statements:
+            lines.append('{:>6} {:>9}  {}'.format(
+                'count', 'seconds', 'statement'))
+        by_time = sorted(self.statements.items(),
+                         key=lambda item: -item[1].seconds)
+        for statement, stats in by_time[:limit]:
+            # The list of selected columns is long and rarely interesting
+            statement = _SELECT_LIST_RE.sub('SELECT … FROM ', statement)
+            if len(statement) > width:
+                statement = statement[:width - 1] + '…'
+            lines.append('{:>6} {:>9.4f}  {}'.format(
+                stats.count, stats.seconds, statement))
+        if len(by_time) > limit:
+            lines.append('  ({} more)'.format(len(by_time) - limit))
+        if self.slow_queries:
+            lines.append('{} statement(s) took longer than {} s'.format(
+                len(self.slow_queries), self.slow_threshold))
+        return '\n'.join(lines)
+
+
+def _get_engine(db):
+    get_bind = getattr(db, 'get_bind', None)
+    if get_bind is not None:
+        return get_bind()
+    return db
+
+
+@contextlib.contextmanager
+def count_queries(db, max_queries=None, slow_threshold=None):
+    """Context manager that counts statements executed in its body
+
+    :param db: A Session or Engine
+    :param max_queries: If given, raise QueryBudgetExceeded if more
+                        statements were executed
+    :param slow_threshold: See QueryCounter
+
+    Yields a QueryCounter.
+    """
+    counter = QueryCounter(slow_threshold=slow_threshold)
+    counter.attach(_get_engine(db))
+    try:
+        yield counter
+    finally:
+        counter.detach()
+    if max_queries is not None and counter.count > max_queries:
+        raise QueryBudgetExceeded(
+            'Expected at most {} SQL statements, got {}\n{}'.format(
+                max_queries, counter.count, counter.format_summary()))
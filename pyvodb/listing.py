@@ -0,0 +1,197 @@
+"""Paginated listing of events, using keyset pagination
+
+Events are listed in the order of ``(date, start_time, id)``, which is
+unique. Instead of skipping rows with OFFSET (which gets slower the deeper
+the page is), each page continues from the key of the last (or first)
+event of the previous page, so any page is found with an index lookup.
+
+`list_events` returns a Page with *cursors*: opaque strings that encode
+the position and the listing options. Pass one back to `list_events` to
+get the next or previous page::
+
+    page = list_events(db, city_slug='brno', limit=10)
+    while page.next is not None:
+        page = list_events(db, page.next, limit=10)
+
+`nth_event` gets a single event at a given position in the same order,
+e.g. the third upcoming meetup.
+"""
+
+import json
+import base64
+import datetime
+import binascii
+import collections
+
+from sqlalchemy import tuple_
+
+from pyvodb import tables
+
+CURSOR_VERSION = 1
+
+Page = collections.namedtuple('Page', ['events', 'next', 'previous'])
+Page.__doc__ = """A page of events
+
+`events` is a list of events, in the listing order. `next` and `previous`
+are cursors for the neighboring pages, or None if there are no more events
+in that direction.
+"""
+
+_KEY_COLUMNS = (tables.Event.date, tables.Event.start_time, tables.Event.id)
+
+
+def list_events(db, cursor=None, *, limit=20, city_slug=None,
+                series_slug=None, newest_first=False, start=None):
+    """Get a page of events
+
+    :param cursor: A cursor from a previous Page. It encodes all the other
+                   options except `limit`, so they can't be given with it.
+    :param limit: Maximum number of events on the page
+    :param city_slug: List only events in this city
+    :param series_slug: List only events of this series
+    :param newest_first: List the newest events first
+    :param start: A date where the listing starts: with the default order,
+                  the first page starts with events on or after this date;
+                  with `newest_first`, with the last event before it.
+
+    Raises ValueError for an invalid cursor.
+    """
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    if cursor is not None:
+        if (city_slug, series_slug, newest_first, start) != (
+                None, None, False, None):
+            raise ValueError('Listing options cannot be used with a cursor')
+        city_slug, series_slug, newest_first, backwards, key = (
+            _decode_cursor(cursor))
+    else:
+        backwards = False
+        key = None
+
+    base_query = _base_query(db, city_slug, series_slug)
+
+    def encode(backwards, event):
+        return _encode_cursor(city_slug, series_slug, newest_first,
+                              backwards, _key(event))
+
+    # The direction of the query: descending if listing newest first,
+    # or going back from an oldest-first cursor (but not both)
+    descending = newest_first != backwards
+    query = base_query
+    if key is not None:
+        query = query.filter(_after(key, descending))
+    else:
+        query = _from_start(query, start, newest_first)
+    events = _ordered(query, descending).limit(limit + 1).all()
+    has_more = len(events) > limit
+    del events[limit:]
+    if backwards:
+        events.reverse()
+
+    if not events:
+        return Page([], None, None)
+
+    if backwards:
+        previous = has_more
+        next = True
+    else:
+        next = has_more
+        if key is not None:
+            previous = True
+        elif start is not None:
+            # Check if anything is before the start
+            previous_query = base_query.filter(
+                _after(_key(events[0]), not newest_first))
+            previous = previous_query.first() is not None
+        else:
+            previous = False
+    return Page(
+        events,
+        encode(False, events[-1]) if next else None,
+        encode(True, events[0]) if previous else None,
+    )
+
+
+def nth_event(db, n, *, city_slug=None, series_slug=None,
+              newest_first=False, start=None):
+    """Get the `n`-th event (counting from 1) of a listing, or None
+
+    The options are the same as for `list_events`.
+    Like `list_events`, this doesn't use OFFSET: only the keys of the first
+    `n` events are read (from the index), and the event is then looked up
+    by its key. Only the one event is loaded.
+    """
+    if n < 1:
+        raise ValueError('n must be positive')
+    base_query = _base_query(db, city_slug, series_slug)
+    key_query = _from_start(base_query.with_entities(*_KEY_COLUMNS),
+                            start, newest_first)
+    keys = _ordered(key_query, newest_first).limit(n).all()
+    if len(keys) < n:
+        return None
+    return base_query.filter(
+        tuple_(*_KEY_COLUMNS) == tuple_(*keys[-1])).one()
+
+
+def _base_query(db, city_slug, series_slug):
+    query = db.query(tables.Event)
+    if city_slug is not None:
+        query = query.filter(tables.Event.city_slug == city_slug)
+    if series_slug is not None:
+        query = query.filter(tables.Event.series_slug == series_slug)
+    return query
+
+
+def _from_start(query, start, newest_first):
+    if start is None:
+        return query
+    if newest_first:
+        return query.filter(tables.Event.date < start)
+    return query.filter(tables.Event.date >= start)
+
+
+def _ordered(query, descending):
+    if descending:
+        return query.order_by(*(c.desc() for c in _KEY_COLUMNS))
+    return query.order_by(*_KEY_COLUMNS)
+
+
+def _key(event):
+    return event.date, event.start_time, event.id
+
+
+def _after(key, descending):
+    """Condition for events after `key`, in the query order"""
+    columns = tuple_(*_KEY_COLUMNS)
+    values = tuple_(*key)
+    if descending:
+        return columns < values
+    else:
+        return columns > values
+
+
+def _encode_cursor(city_slug, series_slug, newest_first, backwards, key):
+    date, start_time, event_id = key
+    data = [CURSOR_VERSION, city_slug, series_slug, newest_first, backwards,
+            date.isoformat(), start_time.isoformat(), event_id]
+    encoded = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(encoded).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(cursor):
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        data = json.loads(
+            base64.urlsafe_b64decode(cursor + padding).decode('utf-8'))
+        (version, city_slug, series_slug, newest_first, backwards,
+         date, start_time, event_id) = data
+        if version != CURSOR_VERSION:
+            raise ValueError('unsupported version')
+        # (time.isoformat() only includes microseconds if there are any)
+        time_format = '%H:%M:%S.%f' if '.' in start_time else '%H:%M:%S'
+        key = (datetime.datetime.strptime(date, '%Y-%m-%d').date(),
+               datetime.datetime.strptime(start_time, time_format).time(),
+               int(event_id))
+    except (ValueError, TypeError, binascii.Error) as e:
+        raise ValueError('Invalid cursor: {}'.format(cursor)) from e
+    return city_slug, series_slug, bool(newest_first), bool(backwards), key
@@ -1,9 +1,15 @@
 import os
 import sys
+from sys import intern
 import json
+import time
+import hashlib
+import itertools
 import datetime
 import contextlib
 import collections
+import concurrent.futures
+from urllib.parse import urlparse
 
 import yaml
 from sqlalchemy import create_engine
@@ -12,6 +18,12 @@ from sqlalchemy.sql.expression import select
 from dateutil import rrule
 
 from . import tables
+from . import search
+from . import prefix
+from . import gitload
+from . import packload
+from . import tiered
+from . import metrics
 
 try:
     YAML_SAFE_LOADER = yaml.CSafeLoader
@@ -19,40 +31,249 @@ except AttributeError:
     YAML_SAFE_LOADER = yaml.SafeLoader
 
 
-def get_db(directory, engine=None):
+# Files to skip if meta.yaml doesn't list `ignored_files`
+DEFAULT_IGNORED_FILES = ('.git', 'README', 'tests')
+
+PhaseStats = collections.namedtuple('PhaseStats', ['seconds', 'count'])
+
+
+class LoadProfile:
+    """Wall time and counts of the phases of loading the data
+
+    The phases are:
+
+    * ``listdir``: listing directories, listing the files of a git
+      revision, or reading a packed data directory
+      (count: directories, revisions or packs)
+    * ``parse``: reading and parsing YAML files (count: files);
+      files found in a BlobCache are not counted
+    * ``build``: building rows from the parsed data (count: rows)
+    * ``insert``: inserting rows into the database (count: rows);
+      also recorded per table
+    * ``index``: building the prefix and full-text indexes
+    * ``archive``: checking and attaching an archive (see `pyvodb.tiered`)
+
+    Pass a LoadProfile to `get_db` or the `load_*` functions to fill it.
+    Each measurement is also passed to the `callback`, if given, as
+    ``callback(phase, table, seconds, count)``; `table` is None except for
+    per-table ``insert`` measurements.
+    """
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.phases = collections.OrderedDict()
+        self.tables = collections.OrderedDict()
+
+    def add(self, phase, seconds, count=1, table=None):
+        """Record a measurement"""
+        if table is None:
+            stats = self.phases
+            key = phase
+        else:
+            stats = self.tables
+            key = table
+        old = stats.get(key, PhaseStats(0, 0))
+        stats[key] = PhaseStats(old.seconds + seconds, old.count + count)
+        if self.callback:
+            self.callback(phase, table, seconds, count)
+
+    @contextlib.contextmanager
+    def phase(self, phase, count=1, table=None):
+        """Context manager that records the time spent in its body"""
+        start = time.perf_counter()
+        yield
+        self.add(phase, time.perf_counter() - start, count, table)
+
+    @property
+    def total_seconds(self):
+        return sum(s.seconds for s in self.phases.values())
+
+    def format(self):
+        """Return a human-readable table of the measurements"""
+        lines = ['{:<16} {:>9} {:>8}'.format('phase', 'seconds', 'count')]
+        line = '{:<16} {:>9.4f} {:>8}'
+        for phase, stats in self.phases.items():
+            lines.append(line.format(phase, stats.seconds, stats.count))
+            if phase == 'insert':
+                for table, stats in self.tables.items():
+                    lines.append(line.format(
+                        '  ' + table, stats.seconds, stats.count))
+        lines.append(line.format('total', self.total_seconds, ''))
+        return '\n'.join(lines)
+
+
+class _NullProfile:
+    """Stand-in for LoadProfile that doesn't measure anything"""
+    def add(self, phase, seconds, count=1, table=None):
+        pass
+
+    def phase(self, phase, count=1, table=None):
+        return _NULL_CONTEXT
+
+
+class _NullContext:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NULL_CONTEXT = _NullContext()
+NULL_PROFILE = _NullProfile()
+
+
+def get_db(directory, engine=None, fulltext=False, profile=None, rev=None,
+           blob_cache=None, archive=None):
     """Get a database
 
-    :param directory: The root data directory
+    :param directory: The root data directory, or a ``.tar.gz``,
+                      ``.tar.zst`` or ``.zip`` file of it
+                      (see `pyvodb.packload`), or a list of data
+                      directories to overlay (see `load_from_overlay`)
     :param engine: a pre-created SQLAlchemy engine (default: in-memory SQLite)
+    :param fulltext: If true, build the full-text search index
+                     (see `pyvodb.search`)
+    :param profile: A LoadProfile to record timings in
+    :param rev: If given, load the data from this git revision of the
+                directory (which must be in a git repository), rather than
+                from the files on disk
+    :param blob_cache: For `rev`: a `gitload.BlobCache` to keep parsed
+                       files in (default: no caching)
+    :param archive: An archive file made by `tiered.build_archive`;
+                    archived events are taken from it rather than parsed
+                    from the directory. The database is then read-only.
     """
+    collect_metrics = metrics.enabled
+    if collect_metrics:
+        start = time.perf_counter()
+        profile = metrics.LoadMetrics(profile)
     if engine is None:
         engine = create_engine('sqlite://')
+    if collect_metrics:
+        metrics.instrument_engine(engine)
     tables.metadata.create_all(engine)
     Session = sessionmaker(bind=engine)
     db = Session()
-    if directory is not None:
-        load_from_directory(db, directory)
+    overlay = isinstance(directory, (list, tuple))
+    packed = (directory is not None and not overlay
+              and packload.is_packed(directory))
+    if archive is not None:
+        if directory is None or rev is not None or packed or overlay:
+            raise ValueError('An archive can only be used with a directory')
+        load_with_archive(db, directory, archive, fulltext=fulltext,
+                          profile=profile)
+    elif packed:
+        if rev is not None:
+            raise ValueError('A revision can only be used with a directory')
+        load_from_packed(db, directory, fulltext=fulltext, profile=profile)
+    elif overlay:
+        if rev is not None:
+            raise ValueError('A revision cannot be used with overlaid '
+                             'directories')
+        load_from_overlay(db, directory, fulltext=fulltext, profile=profile)
+    elif directory is not None and rev is not None:
+        load_from_git(db, directory, rev, fulltext=fulltext, profile=profile,
+                      blob_cache=blob_cache)
+    elif directory is not None:
+        load_from_directory(db, directory, fulltext=fulltext, profile=profile)
+    if collect_metrics:
+        metrics.record_load(time.perf_counter() - start)
     return db
 
 
-def dict_from_directory(directory, root, ignored_files=()):
+def dict_from_directory(directory, root, ignored_files=(), profile=None,
+                        skip=frozenset()):
+    """Load a directory of YAML files into a nested dict
+
+    Files whose paths (relative to `root`, as in ``_source``) are in `skip`
+    are left out.
+    """
+    if profile is None:
+        profile = NULL_PROFILE
     data = {}
-    for filename in os.listdir(os.path.join(root, directory)):
+    with profile.phase('listdir'):
+        filenames = os.listdir(os.path.join(root, directory))
+    for filename in filenames:
         fullname = os.path.join(directory, filename)
         absname = os.path.join(root, fullname)
         if filename in ignored_files or filename.startswith('.'):
             pass
+        elif fullname in skip:
+            pass
         elif filename.endswith('.yaml'):
-            info = load_yaml_file(absname)
+            with profile.phase('parse'):
+                info = load_yaml_file(absname)
             info['_source'] = fullname
-            data[filename[:-5]] = info
+            data[intern(filename[:-5])] = info
         elif os.path.isdir(absname):
-            data[filename] = dict_from_directory(fullname, root)
+            data[intern(filename)] = dict_from_directory(
+                fullname, root, profile=profile, skip=skip)
         else:
             raise ValueError('Unexpected file: ' + fullname)
     return data
 
 
+def list_data_files(directory, ignored_files=()):
+    """List data files in a directory
+
+    Returns paths relative to the directory, with ``/`` as separator,
+    selected by `data_file_paths`.
+    """
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(directory):
+        reldir = os.path.relpath(dirpath, directory)
+        dirnames[:] = [
+            d for d in dirnames
+            if not d.startswith('.')
+            and not (reldir == '.' and d in ignored_files)]
+        for filename in filenames:
+            path = os.path.normpath(os.path.join(reldir, filename))
+            paths.append(path.replace(os.sep, '/'))
+    return data_file_paths(paths, ignored_files)
+
+
+def data_file_paths(paths, ignored_files=()):
+    """Select data files from a list of all files under the data directory
+
+    The paths are relative to the data directory, with ``/`` as separator.
+    Like in `dict_from_directory`, top-level `ignored_files`, and files and
+    directories whose names start with a dot, are skipped;
+    other files that are not YAML raise ValueError.
+    """
+    result = []
+    for path in paths:
+        parts = path.split('/')
+        if parts[0] in ignored_files:
+            continue
+        if any(part.startswith('.') for part in parts):
+            continue
+        if not parts[-1].endswith('.yaml'):
+            raise ValueError('Unexpected file: ' + os.path.join('.', *parts))
+        result.append(path)
+    return result
+
+
+def dict_from_files(files):
+    """Build the data dict (as from `dict_from_directory`) from parsed files
+
+    :param files: Iterable of ``(path, info)`` pairs, where `path` is
+                  relative to the data directory (with ``/`` as separator)
+                  and `info` is the parsed content of the file.
+
+    The `info` dicts are not modified; copies (with ``_source`` added)
+    are stored in the result.
+    """
+    data = {}
+    for path, info in files:
+        *directories, filename = path.split('/')
+        node = data
+        for directory in directories:
+            node = node.setdefault(intern(directory), {})
+        node[intern(filename[:-5])] = dict(
+            info, _source=os.path.join('.', *directories, filename))
+    return data
+
+
 def load_yaml_file(filename):
     try:
         with open(filename) as f:
@@ -61,22 +282,232 @@ def load_yaml_file(filename):
         raise Exception('Failed to load file {}: {}'.format(filename, e)) from e
 
 
-def load_from_directory(db, directory):
-    metadata = load_yaml_file(os.path.join(directory, 'meta.yaml'))
+def load_from_directory(db, directory, fulltext=False, profile=None,
+                        skip=frozenset(), archived_events=()):
+    if profile is None:
+        profile = NULL_PROFILE
+    if isinstance(directory, (list, tuple)):
+        if skip or archived_events:
+            raise ValueError('An archive can only be used with a directory')
+        load_from_overlay(db, directory, fulltext=fulltext, profile=profile)
+        return
+    with profile.phase('parse'):
+        metadata = load_yaml_file(os.path.join(directory, 'meta.yaml'))
     data = dict_from_directory(
         '.', directory,
-        ignored_files=metadata.get('ignored_files',
-                                   ['.git', 'README', 'tests']))
-    load_from_dict(db, data, metadata)
+        ignored_files=metadata.get('ignored_files', DEFAULT_IGNORED_FILES),
+        profile=profile, skip=skip)
+    load_from_dict(db, data, metadata, fulltext=fulltext, profile=profile,
+                   consume=True, archived_events=archived_events)
+
+
+def load_from_overlay(db, roots, fulltext=False, profile=None):
+    """Load data from several data directories overlaid on each other
 
+    `roots` are data directories, from the lowest precedence to the
+    highest: if several of them have a file at the same path (e.g. an
+    event), the file from the last one is used. `meta.yaml` is taken the
+    same way, so at least one of the roots must have it. The roots must be
+    directories (not packs).
 
-def load_from_dict(db, data, metadata):
+    The files are merged before they're parsed, and each root's files are
+    parsed in a separate thread. The root of each city and event is stored
+    in its ``_root`` column.
+    """
+    if profile is None:
+        profile = NULL_PROFILE
+    roots = [str(root) for root in roots]
+    if not roots:
+        raise ValueError('No data directory given')
+    for root in roots:
+        if not os.path.isdir(root):
+            raise ValueError(
+                'Only data directories can be overlaid: {}'.format(root))
+    meta_roots = [root for root in roots
+                  if os.path.exists(os.path.join(root, 'meta.yaml'))]
+    with profile.phase('parse'):
+        metadata = load_yaml_file(os.path.join(
+            (meta_roots or roots)[-1], 'meta.yaml'))
+    ignored_files = metadata.get('ignored_files', DEFAULT_IGNORED_FILES)
+
+    roots_by_path = {}
+    for root in roots:
+        with profile.phase('listdir'):
+            for path in list_data_files(root, ignored_files):
+                roots_by_path[path] = root
+    paths_by_root = {root: [] for root in roots}
+    for path, root in sorted(roots_by_path.items()):
+        paths_by_root[root].append(path)
+
+    def parse(root):
+        files = []
+        for path in paths_by_root[root]:
+            info = load_yaml_file(os.path.join(root, path))
+            info['_root'] = root
+            files.append((path, info))
+        return files
+
+    with profile.phase('parse', count=len(roots_by_path)):
+        with concurrent.futures.ThreadPoolExecutor(len(roots)) as executor:
+            parsed = list(executor.map(parse, roots))
+    data = dict_from_files(itertools.chain.from_iterable(parsed))
+    load_from_dict(db, data, metadata, fulltext=fulltext, profile=profile,
+                   consume=True)
+    db.info['overlay'] = roots
+
+
+def load_with_archive(db, directory, archive, fulltext=False, profile=None):
+    """Load data from a directory, taking archived events from an archive
+
+    See `pyvodb.tiered`.
+    """
+    if profile is None:
+        profile = NULL_PROFILE
+    with profile.phase('archive'):
+        files, archived_files, cutoff = tiered.read_archive_info(archive)
+        tiered.check_archived_files(directory, files)
+        archived_events = tiered.read_archived_events(archive)
+    load_from_directory(db, directory, profile=profile, skip=archived_files,
+                        archived_events=archived_events)
+    with profile.phase('archive'):
+        tiered.attach_archive(db, archive)
+    if fulltext:
+        with profile.phase('index'):
+            search.build_index(db)
+
+
+def load_from_git(db, directory, rev, fulltext=False, profile=None,
+                  blob_cache=None):
+    """Load data from a git revision of a data directory into database
+
+    The files are read from the git object store, without checking them out
+    (see `pyvodb.gitload`). If `blob_cache` is given, parsed files are
+    kept in it, so files that are the same in several revisions loaded
+    with the same cache are only parsed once.
+    """
+    if profile is None:
+        profile = NULL_PROFILE
+    with profile.phase('listdir'):
+        blob_ids = gitload.list_files(directory, rev)
+    if 'meta.yaml' not in blob_ids:
+        raise ValueError('No meta.yaml in {} at {}'.format(directory, rev))
+
+    with gitload.BlobReader(directory) as reader:
+        [(_, metadata)] = parse_git_files(
+            reader, {'meta.yaml': blob_ids['meta.yaml']}, rev,
+            blob_cache=blob_cache, profile=profile)
+        paths = data_file_paths(
+            blob_ids,
+            ignored_files=metadata.get('ignored_files',
+                                       DEFAULT_IGNORED_FILES))
+        data = dict_from_files(parse_git_files(
+            reader, {path: blob_ids[path] for path in paths}, rev,
+            blob_cache=blob_cache, profile=profile))
+    load_from_dict(db, data, metadata, fulltext=fulltext, profile=profile,
+                   consume=True)
+    db.info['rev'] = rev
+
+
+def load_from_packed(db, filename, fulltext=False, profile=None):
+    """Load data from a packed data directory (.tar.gz, .tar.zst or .zip)
+
+    The file is read once, sequentially, and the YAML files are parsed
+    from memory (see `pyvodb.packload`). ``_source`` paths and
+    `ignored_files` are the same as for the unpacked directory.
+    """
+    if profile is None:
+        profile = NULL_PROFILE
+    with profile.phase('listdir'):
+        contents = packload.read_files(filename)
+    if contents.get('meta.yaml') is None:
+        raise ValueError('No meta.yaml in {}'.format(filename))
+
+    def parse(path):
+        with profile.phase('parse'):
+            try:
+                return yaml.load(contents[path], Loader=YAML_SAFE_LOADER)
+            except Exception as e:
+                raise Exception('Failed to load file {}:{}: {}'.format(
+                    filename, path, e)) from e
+
+    metadata = parse('meta.yaml')
+    paths = data_file_paths(
+        contents,
+        ignored_files=metadata.get('ignored_files', DEFAULT_IGNORED_FILES))
+    data = dict_from_files((path, parse(path)) for path in paths)
+    load_from_dict(db, data, metadata, fulltext=fulltext, profile=profile,
+                   consume=True)
+    db.info['pack'] = filename
+
+
+def parse_git_files(reader, blob_ids, rev, blob_cache=None, profile=None):
+    """Parse YAML files from git
+
+    :param reader: A `gitload.BlobReader`
+    :param blob_ids: Dict mapping paths to blob IDs of the files to parse
+    :param rev: Git revision, for error messages
+    :param blob_cache: A `gitload.BlobCache`, or None for no caching;
+                       only files not found in the cache are read and
+                       parsed
+    :param profile: A LoadProfile to record timings in
+
+    Returns a list of ``(path, info)`` pairs, in the order of `blob_ids`.
+    """
+    if profile is None:
+        profile = NULL_PROFILE
+    parsed = {}
+    missing = collections.OrderedDict()
+    for path, blob_id in blob_ids.items():
+        if blob_id in parsed or blob_id in missing:
+            continue
+        if blob_cache is None:
+            info = _MISSING
+        else:
+            info = blob_cache.get(blob_id, _MISSING)
+        if info is _MISSING:
+            missing[blob_id] = path
+        else:
+            parsed[blob_id] = info
+    if metrics.enabled and blob_cache is not None:
+        metrics.record_cache_lookups('blob', len(parsed), len(missing))
+    for blob_id, content in reader.read(missing):
+        with profile.phase('parse'):
+            try:
+                info = yaml.load(content, Loader=YAML_SAFE_LOADER)
+            except Exception as e:
+                raise Exception('Failed to load file {}:{}: {}'.format(
+                    rev, missing[blob_id], e)) from e
+        if blob_cache is not None:
+            blob_cache.put(blob_id, info)
+        parsed[blob_id] = info
+    return [(path, parsed[blob_id]) for path, blob_id in blob_ids.items()]
+
+
+_MISSING = object()
+
+
+def load_from_dict(db, data, metadata, fulltext=False, profile=None,
+                   consume=False, archived_events=()):
     """Load data from a dict (as loaded from directory of YAMLs) into database
+
+    If `fulltext` is true, also build the full-text search index.
+    If `profile` (a LoadProfile) is given, timings are recorded in it.
+    If `consume` is true, entries are removed from `data` as soon as they
+    are converted to rows, so that they can be freed early.
+    `archived_events` are ``(city_slug, series_slug, content_hash)`` of
+    events that are not in `data`, but will be added from an archive
+    (see `pyvodb.tiered`); they're included in the cities' and series'
+    content hashes.
     """
+    if profile is None:
+        profile = NULL_PROFILE
+
     # The ORM overhead is too high for this kind of bulk load,
     # so drop down to SQLAlchemy Core.
     # This tries to do minimize the number of SQL commands by loading entire
-    # tables at once
+    # tables at once.
+    # Slugs, names and other strings that repeat across rows are interned,
+    # so that each value is stored only once while the rows are built.
 
     if metadata['version'] != 2:
         raise ValueError('Can only load version 2')
@@ -89,52 +520,90 @@ def load_from_dict(db, data, metadata):
         if bind.dialect.name == 'sqlite':
             db.execute('PRAGMA foreign_keys = ON')
 
-    with bulk_inserter(db) as insert:
+    # (slug, name) pairs for the prefix indexes
+    index_items = {kind: [] for kind in prefix.INDEXED_TABLES}
+
+    with bulk_inserter(db, profile) as insert:
 
-        # Load speakers
+        # Load speakers, and compute content hashes of events
+        # (the hashes of cities and series, which are loaded first,
+        # include them)
 
         speaker_slugs = set()
+        event_hashes = {}
+        city_event_hashes = collections.defaultdict(list)
+        series_event_hashes = collections.defaultdict(list)
+        for city_slug, series_slug, event_hash in archived_events:
+            city_event_hashes[city_slug].append(event_hash)
+            series_event_hashes[series_slug].append(event_hash)
 
         for series_slug, series in data['series'].items():
             for event_slug, event in series['events'].items():
+                venues = data['cities'].get(event['city'], {}).get('venues')
+                venue = (venues or {}).get(event.get('venue'))
+                event_hash = content_hash(event, venue)
+                event_hashes[series_slug, event_slug] = event_hash
+                city_event_hashes[event['city']].append(event_hash)
+                series_event_hashes[series_slug].append(event_hash)
+
                 for talk in event.get('talks'):
                     for speaker in talk.get('speakers', ()):
+                        speaker = intern(speaker)
                         if speaker not in speaker_slugs:
                             speaker_slugs.add(speaker)
                             insert(tables.Speaker, {
                                 'slug': speaker,
                                 'name': speaker,
                             })
+                            index_items['speaker'].append((speaker, speaker))
 
         venue_ids = {}
 
+        # Names for the denormalized columns of events
+        city_names = {}
+        venue_names = {}
+
         # Load cities, and their venues
 
-        for city_slug, city in data['cities'].items():
+        for city_slug, city in _items(data, 'cities', consume):
             city_data = city['city']
             insert(tables.City, {
                 'slug': city_slug,
-                'name': city_data['name'],
-                'latitude': city_data['location']['latitude'],
-                'longitude': city_data['location']['longitude'],
+                'name': intern(city_data['name']),
+                'latitude': float(city_data['location']['latitude']),
+                'longitude': float(city_data['location']['longitude']),
                 '_source': city_data['_source'],
+                '_root': city_data.get('_root'),
+                'content_hash': content_hash(
+                    city_data,
+                    *(dict(venue, slug=slug) for slug, venue
+                      in sorted(city.get('venues', {}).items())),
+                    *sorted(city_event_hashes[city_slug])),
             })
+            index_items['city'].append((city_slug, city_data['name']))
+            city_names[city_slug] = intern(city_data['name'])
 
             for venue_slug, venue in city.get('venues', {}).items():
                 venue_ids[city_slug, venue_slug] = insert(tables.Venue, {
+                    'id': tables.stable_id('venue', city_slug, venue_slug),
                     'city_slug': city_slug,
                     'slug': venue_slug,
-                    'name': venue['name'],
+                    'name': intern(venue['name']),
                     'address': venue.get('address'),
-                    'latitude': venue['location']['latitude'],
-                    'longitude': venue['location']['longitude'],
+                    'latitude': float(venue['location']['latitude']),
+                    'longitude': float(venue['location']['longitude']),
                     'notes': venue.get('notes'),
+                    '_source': venue['_source'],
                 })
+                venue_names[city_slug, venue_slug] = intern(venue['name'])
 
 
         # Load series, their events, and everything underneath
 
-        for series_slug, series_dir in data['series'].items():
+        # Sources of events by (series slug, date), which determine IDs
+        event_sources = {}
+
+        for series_slug, series_dir in _items(data, 'series', consume):
 
             series = series_dir['series']
             recurrence = series.get('recurrence')
@@ -156,28 +625,43 @@ def load_from_dict(db, data, metadata):
                 }
             insert(tables.Series, {
                 'slug': series_slug,
-                'name': series['name'],
-                'home_city_slug': series.get('city'),
+                'name': intern(series['name']),
+                'home_city_slug': _intern_optional(series.get('city')),
                 'description_cs': series['description']['cs'],
                 'description_en': series['description']['en'],
                 'organizer_info': json.dumps(series.get('organizer-info', ())),
+                'content_hash': content_hash(
+                    series, *sorted(series_event_hashes[series_slug])),
                 **recurrence_attrs,
             })
+            index_items['series'].append((series_slug, series['name']))
 
-            for event_slug, event in series_dir['events'].items():
+            for event_slug, event in _items(series_dir, 'events', consume):
                 venue_slug = event.get('venue')
-                city_slug = event['city']
+                city_slug = intern(event['city'])
                 if venue_slug:
                     venue_id = venue_ids[city_slug, venue_slug]
+                    venue_name = venue_names[city_slug, venue_slug]
                 else:
                     venue_id = None
+                    venue_name = None
+                talks = event.get('talks', ())
+                talk_links = [_talk_links(talk) for talk in talks]
 
                 start = make_full_datetime(event['start'])
                 end = event.get('end')
                 if end is None:
                     end = start.replace(hour=23, minute=59, second=59)
+                other_source = event_sources.setdefault(
+                    (series_slug, start.date()), event['_source'])
+                if other_source != event['_source']:
+                    raise ValueError(
+                        'Events {} and {} are on the same day in the same '
+                        'series'.format(other_source, event['_source']))
                 event_id = insert(tables.Event, {
-                    'name': event['name'],
+                    'id': tables.stable_id('event', series_slug,
+                                           start.date()),
+                    'name': intern(event['name']),
                     'number': event.get('number'),
                     'topic': event.get('topic'),
                     'description': event.get('description'),
@@ -188,11 +672,20 @@ def load_from_dict(db, data, metadata):
                     'series_slug': series_slug,
                     'city_slug': city_slug,
                     'venue_id': venue_id,
-                    '_source': event['_source']
+                    '_source': event['_source'],
+                    '_root': event.get('_root'),
+                    'content_hash': event_hashes[series_slug, event_slug],
+                    'city_name': city_names.get(city_slug),
+                    'venue_name': venue_name,
+                    'talk_count': len(talks),
+                    'has_video': any(
+                        link['youtube_id'] is not None
+                        for links in talk_links for link in links),
                 })
 
-                for i, talk in enumerate(event.get('talks', ())):
+                for i, (talk, links) in enumerate(zip(talks, talk_links)):
                     talk_id = insert(tables.Talk, {
+                        'id': tables.stable_id('talk', event_id, i),
                         'event_id': event_id,
                         'index': i,
                         'title': talk['title'],
@@ -205,19 +698,11 @@ def load_from_dict(db, data, metadata):
                         insert(tables.TalkSpeaker, {
                             'talk_id': talk_id,
                             'index': i,
-                            'speaker_slug': speaker,
+                            'speaker_slug': intern(speaker),
                         })
 
-                    for i, link in enumerate([
-                            *({'talk': u} for u in talk.get('urls', ())),
-                            *talk.get('coverage', {})]):
-                        for kind, url in link.items():
-                            insert(tables.TalkLink, {
-                                'talk_id': talk_id,
-                                'index': i,
-                                'url': url,
-                                'kind': kind,
-                            })
+                    for link in links:
+                        insert(tables.TalkLink, dict(link, talk_id=talk_id))
 
                 for i, url in enumerate(event.get('urls', ())):
                     insert(tables.EventLink, {
@@ -226,6 +711,72 @@ def load_from_dict(db, data, metadata):
                         'url': url,
                     })
 
+    with profile.phase('index'):
+        db.info['prefix_indexes'] = prefix.build_indexes(index_items)
+
+    if fulltext:
+        with profile.phase('index'):
+            search.build_index(db)
+
+
+def _talk_links(talk):
+    """Get rows of TalkLink for a talk, except `talk_id`"""
+    links = []
+    for i, link in enumerate([
+            *({'talk': u} for u in talk.get('urls', ())),
+            *talk.get('coverage', {})]):
+        for kind, url in link.items():
+            links.append({
+                'index': i,
+                'url': url,
+                'kind': intern(kind),
+                'hostname': _intern_optional(urlparse(url).hostname),
+                'youtube_id': tables.youtube_id_from_url(url),
+            })
+    return links
+
+
+def content_hash(*parts):
+    """Compute a content hash of data loaded from YAML files
+
+    The parts are serialized as JSON with sorted keys, so the hash doesn't
+    depend on the order of keys in the files. ``_source`` and ``_root``
+    entries of dicts in `parts` are ignored, so moving a file (or taking it
+    from another overlaid directory) doesn't change the hash.
+    """
+    parts = [_without_source(part) for part in parts]
+    serialized = json.dumps(parts, sort_keys=True, ensure_ascii=False,
+                            separators=(',', ':'), default=str)
+    return hashlib.sha1(serialized.encode('utf-8')).hexdigest()
+
+
+def _without_source(value):
+    if isinstance(value, dict) and ('_source' in value or '_root' in value):
+        return {k: v for k, v in value.items()
+                if k != '_source' and k != '_root'}
+    return value
+
+
+def _items(data, key, consume):
+    """Iterate over items of the dict `data[key]`
+
+    If `consume` is true, remove each item from the dict before yielding it,
+    and finally remove the emptied dict from `data`.
+    """
+    mapping = data[key]
+    if not consume:
+        yield from mapping.items()
+        return
+    for item_key in list(mapping):
+        yield item_key, mapping.pop(item_key)
+    del data[key]
+
+
+def _intern_optional(value):
+    if value is None:
+        return None
+    return intern(value)
+
 
 def make_full_datetime(value):
     if hasattr(value, 'time'):
@@ -238,11 +789,18 @@ def make_full_datetime(value):
 
 
 @contextlib.contextmanager
-def bulk_inserter(db):
-    next_id = {}
+def bulk_inserter(db, profile=None):
+    """Context manager that collects rows, and inserts them on exit
+
+    Yields a function ``insert(orm_class, row)``, which returns the row's
+    ``id`` (if any). Raises ValueError if two rows of a table have the
+    same ``id``.
+    """
+    if profile is None:
+        profile = NULL_PROFILE
     table_columns = {}
     table_rows = collections.OrderedDict()
-    need_id = {}
+    seen_ids = {}
 
     def insert(orm_class, row):
         table = orm_class.__table__
@@ -250,24 +808,30 @@ def bulk_inserter(db):
             if set(row) != table_columns[table]:
                 raise ValueError('uneven table row')
         else:
-            next_id[table] = 0
             table_columns[table] = set(row)
             table_rows[table] = []
-            need_id[table] = ('id' in table.c and table.c['id'].autoincrement)
+            seen_ids[table] = set()
 
-        row = dict(row)
-        if need_id[table]:
-            row['id'] = the_id = next_id[table]
-            next_id[table] += 1
-        else:
-            the_id = None
+        the_id = row.get('id')
+        if the_id is not None:
+            if the_id in seen_ids[table]:
+                raise ValueError('ID collision in {}: {}'.format(
+                    table.name, the_id))
+            seen_ids[table].add(the_id)
 
-        table_rows[table].append(row)
+        table_rows[table].append(dict(row))
 
         return the_id
 
+    start = time.perf_counter()
     yield insert
-
-    for table, rows in table_rows.items():
-        db.execute(table.delete())
-        db.execute(table.insert(), rows)
+    profile.add('build', time.perf_counter() - start,
+                sum(len(rows) for rows in table_rows.values()))
+
+    # Remove each table's rows as soon as they're inserted
+    while table_rows:
+        table, rows = table_rows.popitem(last=False)
+        with profile.phase('insert', len(rows)):
+            with profile.phase('insert', len(rows), table=table.name):
+                db.execute(table.delete())
+                db.execute(table.insert(), rows)
@@ -0,0 +1,374 @@
+"""Runtime metrics, for export in Prometheus text format or as a dict
+
+Metrics are disabled by default. While disabled, instrumented code does
+little more than check the module-level `enabled` flag. Call `enable()`
+(e.g. when a service starts) to collect:
+
+* ``pyvodb_loads_total`` and ``pyvodb_load_seconds``: databases loaded by
+  `load.get_db`, and how long loading took
+* ``pyvodb_load_phase_seconds_total{phase}``: time spent in the phases of
+  loading (see `load.LoadProfile`)
+* ``pyvodb_yaml_files_parsed_total``
+* ``pyvodb_rows_inserted_total{table}``: rows inserted by
+  `load.bulk_inserter`
+* ``pyvodb_cache_lookups_total{cache,result}``: lookups in the
+  `gitload.BlobCache` when loading a git revision
+* ``pyvodb_queries_total{statement}`` and
+  ``pyvodb_query_seconds{statement}``: SQL statements executed on
+  databases loaded while metrics are enabled, by kind (``SELECT``,
+  ``INSERT``, ...); statements that fail are included
+* ``pyvodb_db_generation``: number of the latest loaded database
+  (1 for the first one in the process)
+* ``pyvodb_db_load_timestamp_seconds`` and ``pyvodb_db_age_seconds``:
+  when the latest database was loaded
+
+Use `format_prometheus` for a ``/metrics`` endpoint, or `as_dict` for
+other exporters. Values are cumulative since the start of the process
+(or the last `reset`).
+"""
+
+import re
+import math
+import bisect
+import time
+import threading
+import contextlib
+import collections
+
+from sqlalchemy import event
+
+enabled = False
+
+_lock = threading.Lock()
+
+QUERY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1)
+LOAD_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def enable():
+    """Start collecting metrics"""
+    global enabled
+    enabled = True
+
+
+def disable():
+    """Stop collecting metrics; values collected so far are kept"""
+    global enabled
+    enabled = False
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = collections.OrderedDict()
+        METRICS[name] = self
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError('{} needs labels: {}'.format(
+                self.name, ', '.join(self.labelnames)))
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def reset(self):
+        with _lock:
+            self._values.clear()
+
+    def _labels(self, key):
+        return collections.OrderedDict(zip(self.labelnames, key))
+
+
+class Counter(_Metric):
+    """A value that only goes up"""
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._inc(key, amount)
+
+    def _inc(self, key, amount):
+        # Must be called with the lock held
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        return [(self.name, self._labels(key), value)
+                for key, value in self._values.items()]
+
+    def _as_dict(self, key, value):
+        return {'labels': self._labels(key), 'value': value}
+
+
+class Gauge(Counter):
+    """A value that can go up and down"""
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """Counts of observed values, in buckets by their upper bounds"""
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=QUERY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf, )
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._observe(key, value)
+
+    def _observe(self, key, value):
+        # Must be called with the lock held
+        try:
+            counts, total = self._values[key]
+        except KeyError:
+            counts, total = [0] * len(self.buckets), 0
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._values[key] = counts, total + value
+
+    def get(self, **labels):
+        """Get ``(count, sum)`` of the observed values"""
+        counts, total = self._values.get(self._key(labels), ((), 0))
+        return sum(counts), total
+
+    def _cumulative(self, counts):
+        return list(zip(self.buckets, _accumulate(counts)))
+
+    def _samples(self):
+        samples = []
+        for key, (counts, total) in self._values.items():
+            labels = self._labels(key)
+            for bound, count in self._cumulative(counts):
+                samples.append((self.name + '_bucket',
+                                dict(labels, le=_format_value(bound)),
+                                count))
+            samples.append((self.name + '_sum', labels, total))
+            samples.append((self.name + '_count', labels, sum(counts)))
+        return samples
+
+    def _as_dict(self, key, value):
+        counts, total = value
+        return {
+            'labels': self._labels(key),
+            'count': sum(counts),
+            'sum': total,
+            'buckets': [[bound, count]
+                        for bound, count in self._cumulative(counts)],
+        }
+
+
+def _accumulate(counts):
+    total = 0
+    for count in counts:
+        total += count
+        yield total
+
+
+METRICS = collections.OrderedDict()
+
+LOADS = Counter(
+    'pyvodb_loads_total', 'Databases loaded')
+LOAD_SECONDS = Histogram(
+    'pyvodb_load_seconds', 'Time to load a database',
+    buckets=LOAD_BUCKETS)
+LOAD_PHASE_SECONDS = Counter(
+    'pyvodb_load_phase_seconds_total', 'Time spent in phases of loading',
+    ['phase'])
+YAML_FILES_PARSED = Counter(
+    'pyvodb_yaml_files_parsed_total', 'YAML files parsed')
+ROWS_INSERTED = Counter(
+    'pyvodb_rows_inserted_total', 'Rows inserted when loading',
+    ['table'])
+CACHE_LOOKUPS = Counter(
+    'pyvodb_cache_lookups_total', 'Cache lookups',
+    ['cache', 'result'])
+QUERIES = Counter(
+    'pyvodb_queries_total', 'SQL statements executed',
+    ['statement'])
+QUERY_SECONDS = Histogram(
+    'pyvodb_query_seconds', 'Time to execute SQL statements',
+    ['statement'], buckets=QUERY_BUCKETS)
+DB_GENERATION = Gauge(
+    'pyvodb_db_generation', 'Number of the latest loaded database')
+DB_LOAD_TIMESTAMP = Gauge(
+    'pyvodb_db_load_timestamp_seconds',
+    'Unix time when the latest database was loaded')
+
+_DB_AGE_NAME = 'pyvodb_db_age_seconds'
+_DB_AGE_HELP = 'Seconds since the latest database was loaded'
+
+
+def reset():
+    """Forget all collected values"""
+    for metric in METRICS.values():
+        metric.reset()
+
+
+class LoadMetrics:
+    """Load profile that records metrics
+
+    It can be used where a `load.LoadProfile` is expected. Measurements
+    are also passed on to `profile`, if given.
+    """
+    def __init__(self, profile=None):
+        self.profile = profile
+
+    def add(self, phase, seconds, count=1, table=None):
+        if table is None:
+            LOAD_PHASE_SECONDS.inc(seconds, phase=phase)
+            if phase == 'parse':
+                YAML_FILES_PARSED.inc(count)
+        elif phase == 'insert':
+            ROWS_INSERTED.inc(count, table=table)
+        if self.profile is not None:
+            self.profile.add(phase, seconds, count, table)
+
+    @contextlib.contextmanager
+    def phase(self, phase, count=1, table=None):
+        start = time.perf_counter()
+        yield
+        self.add(phase, time.perf_counter() - start, count, table)
+
+
+def record_load(seconds):
+    """Record that a database was loaded"""
+    LOADS.inc()
+    LOAD_SECONDS.observe(seconds)
+    DB_GENERATION.inc()
+    DB_LOAD_TIMESTAMP.set(time.time())
+
+
+def record_cache_lookups(cache, hits, misses):
+    """Record lookups in a cache"""
+    if hits:
+        CACHE_LOOKUPS.inc(hits, cache=cache, result='hit')
+    if misses:
+        CACHE_LOOKUPS.inc(misses, cache=cache, result='miss')
+
+
+def instrument_engine(engine):
+    """Record SQL statements executed on `engine` (once per engine)"""
+    if not event.contains(engine, 'before_cursor_execute', _before_execute):
+        event.listen(engine, 'before_cursor_execute', _before_execute)
+        event.listen(engine, 'after_cursor_execute', _after_execute)
+        event.listen(engine, 'handle_error', _handle_error)
+
+
+_STATEMENT_KIND_RE = re.compile(r'\s*(\w*)')
+
+# Key in Connection.info for start times of running statements. A start
+# time is only pushed while metrics are enabled, and is popped when the
+# statement finishes or fails.
+_START_KEY = 'pyvodb_metrics_start'
+
+
+def _before_execute(conn, cursor, statement, parameters, context,
+                    executemany):
+    if enabled:
+        conn.info.setdefault(_START_KEY, []).append(time.perf_counter())
+
+
+def _after_execute(conn, cursor, statement, parameters, context,
+                   executemany):
+    _finish_execute(conn, statement)
+
+
+def _handle_error(exception_context):
+    if exception_context.connection is not None:
+        _finish_execute(exception_context.connection,
+                        exception_context.statement)
+
+
+def _finish_execute(conn, statement):
+    starts = conn.info.get(_START_KEY)
+    if not starts:
+        # Started while metrics were disabled
+        return
+    seconds = time.perf_counter() - starts.pop()
+    if enabled and statement is not None:
+        key = (_STATEMENT_KIND_RE.match(statement).group(1).upper(), )
+        with _lock:
+            QUERIES._inc(key, 1)
+            QUERY_SECONDS._observe(key, seconds)
+
+
+def _db_age():
+    timestamp = DB_LOAD_TIMESTAMP._values.get(())
+    if timestamp is None:
+        return None
+    return time.time() - timestamp
+
+
+def as_dict():
+    """Get the collected values
+
+    Returns a dict mapping metric names to dicts with ``type``, ``help``
+    and ``samples``: a list of dicts with ``labels`` and ``value``, or for
+    histograms, ``count``, ``sum`` and cumulative ``buckets`` (a list of
+    ``[upper_bound, count]``).
+    """
+    result = collections.OrderedDict()
+    with _lock:
+        for name, metric in METRICS.items():
+            result[name] = {
+                'type': metric.type,
+                'help': metric.help,
+                'samples': [metric._as_dict(key, value)
+                            for key, value in metric._values.items()],
+            }
+    age = _db_age()
+    result[_DB_AGE_NAME] = {
+        'type': 'gauge',
+        'help': _DB_AGE_HELP,
+        'samples': [] if age is None else [{'labels': {}, 'value': age}],
+    }
+    return result
+
+
+def format_prometheus():
+    """Get the collected values in the Prometheus text exposition format"""
+    lines = []
+
+    def add_metric(name, type, help, samples):
+        lines.append('# HELP {} {}'.format(name, _escape(help, '\\\n')))
+        lines.append('# TYPE {} {}'.format(name, type))
+        for sample_name, labels, value in samples:
+            if labels:
+                label_text = '{{{}}}'.format(','.join(
+                    '{}="{}"'.format(k, _escape(v, '\\\n"'))
+                    for k, v in labels.items()))
+            else:
+                label_text = ''
+            lines.append('{}{} {}'.format(
+                sample_name, label_text, _format_value(value)))
+
+    with _lock:
+        for name, metric in METRICS.items():
+            add_metric(name, metric.type, metric.help, metric._samples())
+    age = _db_age()
+    add_metric(_DB_AGE_NAME, 'gauge', _DB_AGE_HELP,
+               [] if age is None else [(_DB_AGE_NAME, {}, age)])
+    return '\n'.join(lines) + '\n'
+
+
+def _escape(text, characters):
+    for char in characters:
+        text = text.replace(char, {'\n': '\\n'}.get(char, '\\' + char))
+    return text
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(value)
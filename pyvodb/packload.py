@@ -0,0 +1,116 @@
+"""Reading data files from a packed data directory, without extracting it
+
+A data directory can be packed as ``.tar.gz`` (or ``.tgz``), ``.tar.zst``
+or ``.zip``. The pack is read once, sequentially, and the contents of the
+YAML files are kept in memory to be parsed. Member paths are relative to
+the data directory: a leading ``./``, or a single top-level directory
+containing ``meta.yaml``, is stripped.
+
+Reading ``.tar.zst`` needs the optional `zstandard` package.
+"""
+
+import os
+import tarfile
+import zipfile
+import posixpath
+
+TAR_SUFFIXES = ('.tar.gz', '.tgz', '.tar.zst', '.tar.zstd')
+ZIP_SUFFIXES = ('.zip', )
+SUFFIXES = TAR_SUFFIXES + ZIP_SUFFIXES
+
+
+class PackError(ValueError):
+    """Raised when a packed data directory can't be read"""
+
+
+def is_packed(path):
+    """Return true if `path` names a packed data directory"""
+    return str(path).lower().endswith(SUFFIXES) and os.path.isfile(path)
+
+
+def read_files(path):
+    """Read a packed data directory
+
+    Returns a dict mapping paths of all files (relative to the data
+    directory, with ``/`` as separator) to their contents (bytes) for YAML
+    files, or to None for other files.
+    """
+    lowered = str(path).lower()
+    try:
+        if lowered.endswith(ZIP_SUFFIXES):
+            members = _read_zip(path)
+        elif lowered.endswith(('.tar.zst', '.tar.zstd')):
+            members = _read_zstd_tar(path)
+        elif lowered.endswith(TAR_SUFFIXES):
+            members = _read_tar(path, 'r|gz')
+        else:
+            raise PackError('Unknown pack format: {}'.format(path))
+        files = {}
+        for name, content in members:
+            files[_normalize(name, path)] = content
+    except (tarfile.TarError, zipfile.BadZipFile, EOFError, OSError) as e:
+        raise PackError('Could not read {}: {}'.format(path, e)) from e
+    return _strip_root(files)
+
+
+def _wanted(name):
+    return name.endswith('.yaml')
+
+
+def _read_tar(path, mode, fileobj=None):
+    # Stream mode ('r|...') reads the file sequentially, without seeking
+    with tarfile.open(path if fileobj is None else None, mode,
+                      fileobj=fileobj) as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            if _wanted(member.name):
+                yield member.name, tar.extractfile(member).read()
+            else:
+                yield member.name, None
+
+
+def _read_zstd_tar(path):
+    try:
+        import zstandard
+    except ImportError:
+        raise PackError(
+            'Reading {} needs the zstandard package'.format(path)) from None
+    with open(path, 'rb') as f:
+        reader = zstandard.ZstdDecompressor().stream_reader(f)
+        with reader:
+            yield from _read_tar(None, 'r|', fileobj=reader)
+
+
+def _read_zip(path):
+    with zipfile.ZipFile(path) as pack:
+        # In the order the members are stored, to read the file sequentially
+        infos = sorted(pack.infolist(), key=lambda info: info.header_offset)
+        for info in infos:
+            if info.filename.endswith('/'):
+                continue
+            if _wanted(info.filename):
+                yield info.filename, pack.read(info)
+            else:
+                yield info.filename, None
+
+
+def _normalize(name, path):
+    normalized = posixpath.normpath(name)
+    if normalized.startswith(('/', '../')) or normalized == '..':
+        raise PackError('Unsafe path in {}: {}'.format(path, name))
+    return normalized
+
+
+def _strip_root(files):
+    """Make paths relative to the directory that contains meta.yaml"""
+    if 'meta.yaml' in files:
+        return files
+    roots = {name.split('/', 1)[0] for name in files}
+    if len(roots) == 1:
+        [root] = roots
+        prefix = root + '/'
+        if prefix + 'meta.yaml' in files:
+            return {name[len(prefix):]: content
+                    for name, content in files.items()}
+    return files
@@ -0,0 +1,132 @@
+"""In-memory prefix index for slugs and names
+
+Used to resolve abbreviated city/series/speaker names given on the command
+line, and for shell completion.
+"""
+
+import bisect
+import collections
+
+from pyvodb import tables
+
+NONE = 'none'
+UNIQUE = 'unique'
+AMBIGUOUS = 'ambiguous'
+
+PrefixMatch = collections.namedtuple('PrefixMatch', ['status', 'slugs'])
+PrefixMatch.__doc__ = """Result of a prefix lookup
+
+    `status` is one of NONE, UNIQUE or AMBIGUOUS;
+    `slugs` is a sorted list of the matching slugs.
+    """
+
+# Tables that get indexed, by kind
+INDEXED_TABLES = {
+    'city': tables.City,
+    'series': tables.Series,
+    'speaker': tables.Speaker,
+}
+
+
+# Sorts after any character that can follow a prefix
+_MAX_CHAR = chr(0x10FFFF)
+
+
+def _normalize(key):
+    return key.casefold()
+
+
+class PrefixIndex:
+    """Sorted arrays of keys, searched with bisect
+
+    Each item is indexed under its slug and its name (case-insensitively).
+    Lookups prefer slugs: names are only matched if no slug matches.
+    """
+    def __init__(self, items=()):
+        """Initialize from an iterable of (slug, name) pairs"""
+        slug_entries = set()
+        name_entries = set()
+        for slug, name in items:
+            slug_entries.add((_normalize(slug), slug))
+            if name:
+                name_entries.add((_normalize(name), slug))
+        self._by_slug = _SortedKeys(slug_entries)
+        self._by_name = _SortedKeys(name_entries)
+
+    def __len__(self):
+        return len(self._by_slug.slugs)
+
+    def complete(self, prefix):
+        """Return a sorted list of slugs with a slug or name starting with
+        `prefix`"""
+        return sorted(set(self._by_slug.complete(prefix)) |
+                      set(self._by_name.complete(prefix)))
+
+    def lookup(self, prefix):
+        """Look up a prefix; return a PrefixMatch
+
+        An exact slug wins over longer slugs that start with it, and slug
+        prefixes win over names, so a prefix of one item's slug isn't made
+        ambiguous by another item's name.
+        """
+        exact = self._by_slug.exact(prefix)
+        if exact is not None:
+            return PrefixMatch(UNIQUE, [exact])
+        slugs = self._by_slug.complete(prefix)
+        if not slugs:
+            slugs = self._by_name.complete(prefix)
+        if not slugs:
+            status = NONE
+        elif len(slugs) == 1:
+            status = UNIQUE
+        else:
+            status = AMBIGUOUS
+        return PrefixMatch(status, slugs)
+
+
+class _SortedKeys:
+    """Normalized keys, sorted, with the slugs they belong to"""
+    def __init__(self, entries):
+        entries = sorted(entries)
+        self.keys = [key for key, slug in entries]
+        self.slugs = [slug for key, slug in entries]
+
+    def _range(self, prefix):
+        prefix = _normalize(prefix)
+        start = bisect.bisect_left(self.keys, prefix)
+        end = bisect.bisect_left(self.keys, prefix + _MAX_CHAR, lo=start)
+        return start, end
+
+    def complete(self, prefix):
+        start, end = self._range(prefix)
+        return sorted(set(self.slugs[start:end]))
+
+    def exact(self, key):
+        """Return the slug indexed under exactly `key`, or None"""
+        key = _normalize(key)
+        index = bisect.bisect_left(self.keys, key)
+        if index < len(self.keys) and self.keys[index] == key:
+            return self.slugs[index]
+        return None
+
+
+def build_indexes(items_by_kind):
+    """Build prefix indexes from a dict of {kind: [(slug, name), ...]}"""
+    return {kind: PrefixIndex(items) for kind, items in items_by_kind.items()}
+
+
+def get_index(db, kind):
+    """Get the prefix index of the given kind ('city', 'series', 'speaker')
+
+    The indexes are built by the loader and stored in the session's `info`.
+    If the data was not loaded that way, the index is built from the
+    database on first use.
+    """
+    indexes = db.info.setdefault('prefix_indexes', {})
+    try:
+        return indexes[kind]
+    except KeyError:
+        table = INDEXED_TABLES[kind]
+        query = db.query(table.slug, table.name)
+        index = indexes[kind] = PrefixIndex(query)
+        return index
@@ -0,0 +1,99 @@
+"""Common lookups, as prebuilt statements
+
+SQLAlchemy caches the compiled SQL of statements, but building an ORM
+Query and computing its cache key on every call still costs more than
+running a simple query on the in-memory database. The statements here are
+built once, at import time, with bound parameters for the values; each
+call only executes one of them.
+
+The functions return ORM objects, like the equivalent `db.query(...)`.
+Events are ordered by ``(date, start_time, id)``.
+"""
+
+from sqlalchemy import bindparam, select
+
+from pyvodb import tables
+from pyvodb import prefix
+
+Event = tables.Event
+
+_EVENT_ORDER = (Event.date, Event.start_time, Event.id)
+
+EVENTS_BY_CITY_DATE = select(Event).where(
+    Event.city_slug == bindparam('city_slug'),
+    Event.date == bindparam('date'),
+).order_by(*_EVENT_ORDER)
+
+EVENTS_IN_RANGE = select(Event).where(
+    Event.date >= bindparam('start'),
+    Event.date < bindparam('end'),
+).order_by(*_EVENT_ORDER)
+
+EVENTS_IN_RANGE_IN_CITY = EVENTS_IN_RANGE.where(
+    Event.city_slug == bindparam('city_slug'))
+
+EVENTS_IN_RANGE_OF_SERIES = EVENTS_IN_RANGE.where(
+    Event.series_slug.in_(bindparam('series_slugs', expanding=True)))
+
+LATEST_EVENT_OF_SERIES = select(Event).where(
+    Event.series_slug == bindparam('series_slug'),
+).order_by(*(c.desc() for c in _EVENT_ORDER)).limit(1)
+
+TALKS_BY_SPEAKER = select(tables.Talk).join(
+    tables.TalkSpeaker, tables.TalkSpeaker.talk_id == tables.Talk.id,
+).join(
+    Event, Event.id == tables.Talk.event_id,
+).where(
+    tables.TalkSpeaker.speaker_slug == bindparam('speaker_slug'),
+).order_by(*(c.desc() for c in _EVENT_ORDER), tables.Talk.index)
+
+
+def _all(db, statement, **params):
+    return db.execute(statement, params).scalars().all()
+
+
+def events_by_city_date(db, city_slug, date):
+    """Get a list of events in a city on a date"""
+    return _all(db, EVENTS_BY_CITY_DATE, city_slug=city_slug, date=date)
+
+
+def events_in_range(db, start, end, city_slug=None, series_slugs=None):
+    """Get a list of events between `start` (inclusive) and `end` (exclusive)
+
+    The events can be limited to one city, or to a collection of series
+    (but not both).
+    """
+    if city_slug is not None and series_slugs is not None:
+        raise ValueError('Cannot filter by both city and series')
+    if city_slug is not None:
+        return _all(db, EVENTS_IN_RANGE_IN_CITY, start=start, end=end,
+                    city_slug=city_slug)
+    if series_slugs is not None:
+        return _all(db, EVENTS_IN_RANGE_OF_SERIES, start=start, end=end,
+                    series_slugs=list(series_slugs))
+    return _all(db, EVENTS_IN_RANGE, start=start, end=end)
+
+
+def latest_event(db, series_slug):
+    """Get the latest event of a series, or None if it has no events"""
+    return db.execute(LATEST_EVENT_OF_SERIES,
+                      {'series_slug': series_slug}).scalars().first()
+
+
+def city_by_prefix(db, text):
+    """Find a city by a prefix of its slug or name
+
+    Returns a `prefix.PrefixMatch`, and the City if the match is unique
+    (otherwise None).
+    """
+    match = prefix.get_index(db, 'city').lookup(text)
+    if match.status != prefix.UNIQUE:
+        return match, None
+    [city_slug] = match.slugs
+    # Uses the Session's identity map if the city was already loaded
+    return match, db.get(tables.City, city_slug)
+
+
+def talks_by_speaker(db, speaker_slug):
+    """Get a list of talks of a speaker, newest first"""
+    return _all(db, TALKS_BY_SPEAKER, speaker_slug=speaker_slug)
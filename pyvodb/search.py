@@ -0,0 +1,136 @@
+"""Full-text search over events and talks
+
+Uses an SQLite FTS5 virtual table, which is filled from the already loaded
+tables. The index is only available with SQLite databases.
+"""
+
+import collections
+
+from sqlalchemy.sql import text
+
+from pyvodb import tables
+
+INDEX_TABLE = 'search_index'
+
+SearchResult = collections.namedtuple(
+    'SearchResult', ['event', 'talk', 'snippet', 'rank'])
+SearchResult.__doc__ = """A search hit
+
+    `event` is the matching Event, or the event of the matching talk.
+    `talk` is the matching Talk, or None if the event itself matched.
+    `rank` is the BM25 rank; lower is better.
+    """
+
+# Weights of the indexed columns for BM25 ranking
+COLUMN_WEIGHTS = {
+    'title': 10.0,
+    'description': 1.0,
+    'speakers': 5.0,
+}
+
+
+def _check_sqlite(db):
+    bind = db.get_bind(tables.Event)
+    if bind.dialect.name != 'sqlite':
+        raise ValueError('Full-text search is only supported with SQLite')
+
+
+def has_index(db):
+    """Return true if the full-text index was built for the database"""
+    _check_sqlite(db)
+    query = text("SELECT 1 FROM sqlite_master WHERE name = :name")
+    return db.execute(query, {'name': INDEX_TABLE}).first() is not None
+
+
+def build_index(db):
+    """(Re)build the full-text index from the loaded tables"""
+    _check_sqlite(db)
+    db.execute('DROP TABLE IF EXISTS {}'.format(INDEX_TABLE))
+    db.execute("""
+        CREATE VIRTUAL TABLE {} USING fts5(
+            {},
+            event_id UNINDEXED, talk_id UNINDEXED,
+            tokenize = 'unicode61 remove_diacritics 1'
+        )
+    """.format(INDEX_TABLE, ', '.join(COLUMN_WEIGHTS)))
+    # Events: name and topic form the title
+    db.execute("""
+        INSERT INTO {} (title, description, speakers, event_id, talk_id)
+        SELECT name || coalesce(' ' || topic, ''), description, NULL, id, NULL
+        FROM events
+    """.format(INDEX_TABLE))
+    # Talks, with speaker names in talk order
+    db.execute("""
+        INSERT INTO {} (title, description, speakers, event_id, talk_id)
+        SELECT talks.title, talks.description,
+            (SELECT group_concat(name, ', ') FROM (
+                SELECT speakers.name AS name
+                FROM talk_speakers
+                JOIN speakers ON speakers.slug = talk_speakers.speaker_slug
+                WHERE talk_speakers.talk_id = talks.id
+                ORDER BY talk_speakers."index"
+            )),
+            talks.event_id, talks.id
+        FROM talks
+    """.format(INDEX_TABLE))
+
+
+def ensure_index(db):
+    """Build the full-text index unless it already exists"""
+    if not has_index(db):
+        build_index(db)
+
+
+def quote_query(query):
+    """Convert a plain user query to FTS5 syntax
+
+    Each word is quoted, so punctuation doesn't trigger FTS5 syntax errors.
+    All words must match.
+    """
+    return ' '.join('"{}"'.format(word.replace('"', '""'))
+                    for word in query.split())
+
+
+def search(db, query, limit=20, raw=False, highlight=('[', ']')):
+    """Search events and talks; return a list of SearchResult
+
+    :param query: The words to search for. If `raw` is true, the query is
+                  passed to FTS5 unchanged, allowing its full syntax.
+    :param limit: Maximum number of results
+    :param highlight: Strings to put around matches in the snippets
+    """
+    if not raw:
+        query = quote_query(query)
+    if not query:
+        return []
+    weights = ', '.join(str(w) for w in COLUMN_WEIGHTS.values())
+    sql = text("""
+        SELECT event_id, talk_id,
+            snippet({table}, -1, :open, :close, '…', 12) AS snippet,
+            bm25({table}, {weights}) AS rank
+        FROM {table}
+        WHERE {table} MATCH :query
+        ORDER BY rank
+        LIMIT :limit
+    """.format(table=INDEX_TABLE, weights=weights))
+    rows = db.execute(sql, {
+        'query': query, 'limit': limit,
+        'open': highlight[0], 'close': highlight[1],
+    }).fetchall()
+
+    event_ids = {r.event_id for r in rows}
+    talk_ids = {r.talk_id for r in rows if r.talk_id is not None}
+    events = {}
+    if event_ids:
+        query = db.query(tables.Event).filter(tables.Event.id.in_(event_ids))
+        events = {e.id: e for e in query}
+    talks = {}
+    if talk_ids:
+        query = db.query(tables.Talk).filter(tables.Talk.id.in_(talk_ids))
+        talks = {t.id: t for t in query}
+
+    return [SearchResult(event=events[r.event_id],
+                         talk=talks.get(r.talk_id),
+                         snippet=r.snippet,
+                         rank=r.rank)
+            for r in rows]
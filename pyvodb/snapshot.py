@@ -0,0 +1,296 @@
+"""Read-only snapshot of the data, as plain Python objects
+
+A Snapshot holds the same data as a database loaded by `pyvodb.load`,
+but as a graph of small immutable objects with ``__slots__``.
+Relationships are direct references (or tuples of them), resolved and
+sorted once when the snapshot is built, so reading them never touches the
+database. This is meant for read-heavy consumers that walk all of the data,
+like exporters and static site generators.
+
+The objects have the same attribute names as the ORM classes in
+`pyvodb.tables`, and `Event.as_dict` gives the same result, so most code
+written for the ORM works with a snapshot as well.
+Collections of events are ordered newest first, like `City.events`
+and `Series.events` in the ORM.
+"""
+
+import types
+
+from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy.sql.expression import select
+
+from . import tables
+from .load import get_db, load_from_dict
+
+
+def _columns(orm_class):
+    return tuple(c.name for c in orm_class.__table__.columns)
+
+
+class _Frozen:
+    """Base for snapshot objects: attributes can't be set after creation"""
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError('{} is read-only'.format(type(self).__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError('{} is read-only'.format(type(self).__name__))
+
+    def __repr__(self):
+        return '<{} {}>'.format(type(self).__name__, self._key())
+
+
+def _new(cls, attrs):
+    obj = cls.__new__(cls)
+    for name, value in attrs.items():
+        object.__setattr__(obj, name, value)
+    return obj
+
+
+def _set(obj, name, value):
+    object.__setattr__(obj, name, value)
+
+
+def _newest_first(events):
+    return tuple(sorted(events, key=_event_order, reverse=True))
+
+
+def _event_order(event):
+    return event.date, event.start_time, event.id
+
+
+class City(_Frozen):
+    __slots__ = _columns(tables.City) + ('events', 'venues', 'series')
+
+    def _key(self):
+        return self.slug
+
+
+class Series(_Frozen):
+    __slots__ = _columns(tables.Series) + ('home_city', 'events')
+
+    def _key(self):
+        return self.slug
+
+    def next_occurrences(self, n=None, since=None):
+        """Yield the next planned occurrences after the date "since"
+
+        See `pyvodb.tables.Series.next_occurrences`.
+        """
+        if self.recurrence_scheme is None:
+            return ()
+        if self.events:
+            last_planned_event = self.events[0]
+        elif since is None:
+            raise NoResultFound('Series {} has no events'.format(self.slug))
+        else:
+            last_planned_event = None
+        return tables.next_occurrences(self, last_planned_event,
+                                       n=n, since=since)
+
+
+class Venue(_Frozen):
+    __slots__ = _columns(tables.Venue) + ('city', 'events')
+
+    short_address = vars(tables.Venue)['short_address']
+
+    def _key(self):
+        return '{}/{}'.format(self.city_slug, self.slug)
+
+
+class Event(_Frozen):
+    __slots__ = _columns(tables.Event) + (
+        'city', 'series', 'venue', 'talks', 'links')
+
+    title = vars(tables.Event)['title']
+    start = vars(tables.Event)['start']
+    slug = vars(tables.Event)['slug']
+    one_day = vars(tables.Event)['one_day']
+    as_dict = vars(tables.Event)['as_dict']
+
+    @property
+    def year(self):
+        return self.date.year
+
+    @property
+    def month(self):
+        return self.date.month
+
+    @property
+    def day(self):
+        return self.date.day
+
+    def _key(self):
+        return '{}/{}'.format(self.series_slug, self.date)
+
+
+class Talk(_Frozen):
+    __slots__ = _columns(tables.Talk) + ('event', 'speakers', 'links')
+
+    youtube_id = vars(tables.Talk)['youtube_id']
+
+    def _key(self):
+        return self.id
+
+
+class Speaker(_Frozen):
+    __slots__ = _columns(tables.Speaker) + ('talks', )
+
+    def _key(self):
+        return self.slug
+
+
+class TalkLink(_Frozen):
+    __slots__ = _columns(tables.TalkLink) + ('talk', )
+
+    def _key(self):
+        return self.url
+
+
+class EventLink(_Frozen):
+    __slots__ = _columns(tables.EventLink) + ('event', )
+
+    def _key(self):
+        return self.url
+
+
+class Snapshot(_Frozen):
+    """All the data, as read-only objects
+
+    Attributes:
+
+    * ``cities``, ``series``, ``speakers``: mappings keyed by slug
+    * ``venues``, ``talks``: mappings keyed by ID
+    * ``events``: tuple of all events, in chronological order
+    """
+    __slots__ = ('cities', 'series', 'venues', 'events', 'talks', 'speakers')
+
+    def _key(self):
+        return '({} events)'.format(len(self.events))
+
+
+def _rows(db, orm_class):
+    result = db.execute(select([orm_class.__table__]))
+    keys = result.keys()
+    for row in result:
+        yield dict(zip(keys, row))
+
+
+def from_db(db):
+    """Build a Snapshot of the data in a database
+
+    The data is read with one query per table; the ORM is not used.
+    """
+    cities = {r['slug']: _new(City, r) for r in _rows(db, tables.City)}
+    series = {r['slug']: _new(Series, r) for r in _rows(db, tables.Series)}
+    venues = {r['id']: _new(Venue, r) for r in _rows(db, tables.Venue)}
+    events = {r['id']: _new(Event, r) for r in _rows(db, tables.Event)}
+    talks = {r['id']: _new(Talk, r) for r in _rows(db, tables.Talk)}
+    speakers = {r['slug']: _new(Speaker, r)
+                for r in _rows(db, tables.Speaker)}
+
+    # Collect the one-to-many relationships in lists,
+    # then sort them and freeze them into tuples
+    children = {obj: {} for mapping in (cities, series, venues, events,
+                                        talks, speakers)
+                for obj in mapping.values()}
+
+    def add_child(parent, name, child):
+        children[parent].setdefault(name, []).append(child)
+
+    for venue in venues.values():
+        _set(venue, 'city', cities[venue.city_slug])
+        add_child(venue.city, 'venues', venue)
+
+    for s in series.values():
+        home_city = cities.get(s.home_city_slug)
+        _set(s, 'home_city', home_city)
+        if home_city is not None:
+            add_child(home_city, 'series', s)
+
+    for event in events.values():
+        _set(event, 'city', cities[event.city_slug])
+        _set(event, 'series', series[event.series_slug])
+        _set(event, 'venue', venues.get(event.venue_id))
+        add_child(event.city, 'events', event)
+        add_child(event.series, 'events', event)
+        if event.venue is not None:
+            add_child(event.venue, 'events', event)
+
+    for talk in talks.values():
+        _set(talk, 'event', events.get(talk.event_id))
+        if talk.event is not None:
+            add_child(talk.event, 'talks', talk)
+
+    for row in _rows(db, tables.TalkSpeaker):
+        talk = talks[row['talk_id']]
+        speaker = speakers[row['speaker_slug']]
+        add_child(talk, 'speakers', (row['index'], speaker))
+        add_child(speaker, 'talks', talk)
+
+    for orm_class, cls, attr, parents in (
+            (tables.TalkLink, TalkLink, 'talk', talks),
+            (tables.EventLink, EventLink, 'event', events)):
+        id_column = attr + '_id'
+        for row in _rows(db, orm_class):
+            link = _new(cls, row)
+            parent = parents[row[id_column]]
+            _set(link, attr, parent)
+            add_child(parent, 'links', link)
+
+    def freeze(objects, names, key=None):
+        for obj in objects:
+            lists = children[obj]
+            for name in names:
+                items = lists.get(name, ())
+                if key is not None:
+                    items = sorted(items, key=key)
+                _set(obj, name, tuple(items))
+
+    def by_index(obj):
+        return obj.index
+
+    for obj in (*cities.values(), *series.values(), *venues.values()):
+        _set(obj, 'events', _newest_first(children[obj].get('events', ())))
+    freeze(cities.values(), ['venues'], key=lambda v: v.id)
+    freeze(cities.values(), ['series'], key=lambda s: s.slug)
+    freeze(events.values(), ['talks', 'links'], key=by_index)
+    freeze(talks.values(), ['links'], key=by_index)
+    freeze(speakers.values(), ['talks'], key=lambda t: t.id)
+    for talk in talks.values():
+        speaker_list = sorted(children[talk].get('speakers', ()),
+                              key=lambda item: item[0])
+        _set(talk, 'speakers', tuple(s for i, s in speaker_list))
+
+    return _new(Snapshot, {
+        'cities': types.MappingProxyType(cities),
+        'series': types.MappingProxyType(series),
+        'venues': types.MappingProxyType(venues),
+        'events': tuple(sorted(events.values(), key=_event_order)),
+        'talks': types.MappingProxyType(talks),
+        'speakers': types.MappingProxyType(speakers),
+    })
+
+
+def from_dict(data, metadata):
+    """Build a Snapshot from a dict (as loaded from directory of YAMLs)
+
+    The data is loaded into a temporary in-memory database first,
+    so it is validated in the same way as with `pyvodb.load.load_from_dict`.
+    """
+    db = get_db(None)
+    try:
+        load_from_dict(db, data, metadata)
+        return from_db(db)
+    finally:
+        db.close()
+
+
+def from_directory(directory):
+    """Build a Snapshot from a data directory"""
+    db = get_db(directory)
+    try:
+        return from_db(db)
+    finally:
+        db.close()
@@ -0,0 +1,202 @@
+"""Generator of synthetic data directories, for benchmarks and tests
+
+The output is a version 2 data directory, like pyvo-data, with as many
+cities, venues, series, events, talks, speakers and links as requested.
+For the same arguments (including the seed), the output is identical.
+
+Run ``python -m pyvodb.synthetic --help`` for command-line usage.
+"""
+
+import os
+import random
+import datetime
+
+import click
+import yaml
+
+LINK_KINDS = ('slides', 'video', 'link', 'writeup', 'notes')
+
+WORDS = '''
+    python django flask asyncio testing packaging typing docs data science
+    web api rust pypy cython numpy pandas jupyter security deployment docker
+    cloud databases postgres sqlite performance profiling debugging gui
+    education community micropython hardware games music linux windows
+'''.split()
+
+
+def _write_yaml(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(data, f, allow_unicode=True, default_flow_style=False,
+                       sort_keys=False)
+
+
+def _sentence(rng, n_words):
+    return ' '.join(rng.choice(WORDS) for i in range(n_words)).capitalize()
+
+
+def _month_start(first, months):
+    year, month = divmod(first.month - 1 + months, 12)
+    return first.replace(year=first.year + year, month=month + 1, day=1)
+
+
+def generate(directory, *, cities=3, venues_per_city=3, series_per_city=1,
+             events_per_series=50, talks_per_event=3, speakers=100,
+             links_per_talk=2, first_date=datetime.date(2000, 1, 1), seed=0):
+    """Write a synthetic data directory
+
+    Each series has one event per month, starting at `first_date`.
+    Returns a dict with the numbers of generated objects, keyed by the
+    names of the corresponding database tables.
+    """
+    rng = random.Random(seed)
+    speaker_names = ['Speaker {:05d}'.format(i) for i in range(speakers)]
+    counts = dict.fromkeys(
+        ['cities', 'venues', 'series', 'events', 'talks', 'talk_links',
+         'talk_speakers', 'event_links'], 0)
+    used_speakers = set()
+
+    _write_yaml(os.path.join(directory, 'meta.yaml'), {
+        'version': 2,
+        'ignored_files': ['README', 'README.md'],
+    })
+
+    for city_number in range(cities):
+        city_slug = 'city-{:03d}'.format(city_number)
+        latitude = 48.5 + rng.random() * 2.5
+        longitude = 12.1 + rng.random() * 6.7
+        city_dir = os.path.join(directory, 'cities', city_slug)
+        _write_yaml(os.path.join(city_dir, 'city.yaml'), {
+            'name': 'City {:03d}'.format(city_number),
+            'location': {
+                'latitude': '{:.7f}'.format(latitude),
+                'longitude': '{:.7f}'.format(longitude),
+            },
+        })
+        counts['cities'] += 1
+
+        venue_slugs = []
+        for venue_number in range(venues_per_city):
+            venue_slug = 'venue-{:03d}'.format(venue_number)
+            venue_slugs.append(venue_slug)
+            path = os.path.join(city_dir, 'venues', venue_slug + '.yaml')
+            _write_yaml(path, {
+                'city': 'City {:03d}'.format(city_number),
+                'name': 'Venue {:03d}'.format(venue_number),
+                'address': '{} {}'.format(_sentence(rng, 2),
+                                          rng.randrange(1, 200)),
+                'location': {
+                    'latitude': '{:.7f}'.format(
+                        latitude + rng.uniform(-0.05, 0.05)),
+                    'longitude': '{:.7f}'.format(
+                        longitude + rng.uniform(-0.05, 0.05)),
+                },
+            })
+            counts['venues'] += 1
+
+        for series_number in range(series_per_city):
+            series_slug = '{}-series-{:02d}'.format(city_slug, series_number)
+            series_name = 'Pyvo {:03d}/{:02d}'.format(city_number,
+                                                     series_number)
+            series_dir = os.path.join(directory, 'series', series_slug)
+            _write_yaml(os.path.join(series_dir, 'series.yaml'), {
+                'name': series_name,
+                'city': city_slug,
+                'description': {
+                    'cs': _sentence(rng, 20),
+                    'en': _sentence(rng, 20),
+                },
+                'recurrence': {
+                    'scheme': 'monthly',
+                    'rrule': 'RRULE:FREQ=MONTHLY;BYDAY=-1TH;'
+                             'BYHOUR=19;BYMINUTE=0;BYSECOND=0',
+                    'description': {
+                        'cs': 'Každý poslední čtvrtek v měsíci.',
+                        'en': 'On the last Thursday of each month.',
+                    },
+                },
+            })
+            counts['series'] += 1
+
+            for event_number in range(events_per_series):
+                # Series in the same city meet on different days
+                date = _month_start(first_date, event_number).replace(
+                    day=1 + series_number % 28)
+                start = datetime.datetime.combine(
+                    date, datetime.time(19, series_number // 28 % 60))
+                talks = []
+                for talk_number in range(talks_per_event):
+                    talk_speakers = rng.sample(
+                        speaker_names, min(rng.randint(1, 2), speakers))
+                    used_speakers.update(talk_speakers)
+                    talk = {
+                        'title': _sentence(rng, rng.randint(2, 6)),
+                        'speakers': talk_speakers,
+                    }
+                    if rng.random() < 0.3:
+                        talk['lightning'] = True
+                    if rng.random() < 0.5:
+                        talk['description'] = _sentence(rng, 30)
+                    if links_per_talk:
+                        talk['urls'] = [
+                            'https://talks.example.org/{}/{}/{}'.format(
+                                series_slug, date, talk_number)]
+                    talk['coverage'] = []
+                    for link_number in range(links_per_talk - 1):
+                        kind = LINK_KINDS[link_number % len(LINK_KINDS)]
+                        if kind == 'video':
+                            url = 'https://www.youtube.com/watch?v={:011x}'
+                            url = url.format(rng.getrandbits(44))
+                        else:
+                            url = 'https://{}.example.org/{:08x}'.format(
+                                kind, rng.getrandbits(32))
+                        talk['coverage'].append({kind: url})
+                    talks.append(talk)
+                    counts['talks'] += 1
+                    counts['talk_speakers'] += len(talk_speakers)
+                    counts['talk_links'] += min(links_per_talk, 1) + len(
+                        talk['coverage'])
+                event = {
+                    'city': city_slug,
+                    'start': start,
+                    'name': series_name,
+                    'number': event_number + 1,
+                    'talks': talks,
+                    'urls': ['https://meetup.example.org/{}/{}'.format(
+                        series_slug, date)],
+                }
+                if venue_slugs:
+                    event['venue'] = rng.choice(venue_slugs)
+                if rng.random() < 0.5:
+                    event['topic'] = _sentence(rng, 2)
+                if rng.random() < 0.5:
+                    event['description'] = _sentence(rng, 40)
+                filename = '{}-{}.yaml'.format(date, event_number + 1)
+                _write_yaml(os.path.join(series_dir, 'events', filename),
+                            event)
+                counts['events'] += 1
+                counts['event_links'] += 1
+
+    counts['speakers'] = len(used_speakers)
+    return counts
+
+
+@click.command()
+@click.option('--cities', type=int, default=3)
+@click.option('--venues-per-city', type=int, default=3)
+@click.option('--series-per-city', type=int, default=1)
+@click.option('--events-per-series', type=int, default=50)
+@click.option('--talks-per-event', type=int, default=3)
+@click.option('--speakers', type=int, default=100)
+@click.option('--links-per-talk', type=int, default=2)
+@click.option('--seed', type=int, default=0)
+@click.argument('directory')
+def main(directory, **kwargs):
+    """Generate a synthetic data directory for benchmarks"""
+    counts = generate(directory, **kwargs)
+    for table, count in sorted(counts.items()):
+        print('{}: {}'.format(table, count))
+
+
+if __name__ == '__main__':
+    main()
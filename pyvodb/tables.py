@@ -1,16 +1,18 @@
 import re
 from urllib.parse import urlparse
+import hashlib
 import datetime
 import collections
 import itertools
 
 from sqlalchemy import Column, ForeignKey, MetaData, extract, desc
-from sqlalchemy import UniqueConstraint
+from sqlalchemy import UniqueConstraint, Index
 from sqlalchemy.types import Boolean, Integer, Unicode, UnicodeText, Date, Time
+from sqlalchemy.types import Float
 from sqlalchemy.types import Enum, DateTime
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.ext.hybrid import hybrid_property
-from sqlalchemy.orm import backref, relationship
+from sqlalchemy.orm import backref, relationship, validates
 from sqlalchemy.orm.session import Session
 from sqlalchemy.ext.orderinglist import ordering_list
 from sqlalchemy.ext.associationproxy import association_proxy
@@ -29,6 +31,36 @@ YOUTUBE_RE = re.compile(r'''(?x)https?://
                         ([-0-9a-zA-Z_]+)''')
 
 
+def stable_id(kind, *key):
+    """Derive the numeric ID of a row from its natural key
+
+    IDs of events are ``stable_id('event', series_slug, date)``, of venues
+    ``stable_id('venue', city_slug, slug)``, and of talks
+    ``stable_id('talk', event_id, index)``. So, unlike counters, they don't
+    change when unrelated data is added or files are listed in another
+    order. IDs are below 2**53, so they're exact in JavaScript numbers.
+    """
+    text = '\0'.join(str(part) for part in (kind, *key))
+    digest = hashlib.sha1(text.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') & (2**53 - 1)
+
+
+def youtube_id_from_url(url):
+    """Get the ID of a YouTube video from its URL, or None"""
+    match = YOUTUBE_RE.match(url)
+    if match:
+        return match.group(1)
+
+
+def _stable_id_default(kind, *names):
+    """Make a default for an `id` column, computed from the row's natural key
+    """
+    def _default(context):
+        params = context.get_current_parameters()
+        return stable_id(kind, *(params[name] for name in names))
+    return _default
+
+
 def date_property(name):
     @hybrid_property
     def _func(self):
@@ -42,10 +74,16 @@ def date_property(name):
 class Event(TableBase):
     u"""An event."""
     __tablename__ = 'events'
-    __table_args__ = (UniqueConstraint('city_slug', 'date', 'start_time'),)
+    __table_args__ = (
+        UniqueConstraint('city_slug', 'date', 'start_time'),
+        # For listings in (date, start_time, id) order (see pyvodb.listing)
+        Index('ix_events_listing', 'date', 'start_time'),
+        Index('ix_events_series_listing', 'series_slug', 'date', 'start_time'),
+    )
     id = Column(
-        Integer, primary_key=True, nullable=False,
-        doc=u"An internal numeric ID")
+        Integer, primary_key=True, nullable=False, autoincrement=False,
+        default=_stable_id_default('event', 'series_slug', 'date'),
+        doc=u"A numeric ID derived from the natural key (see `stable_id`)")
     series_slug = Column(
         ForeignKey('series.slug'), nullable=False,
         doc=u"The series this event belongs to")
@@ -77,6 +115,32 @@ class Event(TableBase):
     _source = Column(
         Unicode(), nullable=True,
         doc=u"File from which the entry was loaded")
+    _root = Column(
+        Unicode(), nullable=True,
+        doc=u"Data directory the file was taken from, when several "
+            u"directories are overlaid (see `load.load_from_overlay`)")
+    content_hash = Column(
+        Unicode(), nullable=True, index=True,
+        doc=u"Hash of the event's data, including its talks, speakers, "
+            u"links and venue. Changes whenever any of these change, "
+            u"so it can be used as an ETag")
+    # Copies of related data, filled in by the loader so that lists of
+    # events don't need to load cities, venues and talks. The normalized
+    # tables stay authoritative. (Archived events have copies made when the
+    # archive was built; `pyvodb.tiered` refuses to use an archive when the
+    # city or venue files of archived events change.)
+    city_name = Column(
+        Unicode(), nullable=True,
+        doc=u"Name of the event's city (copy of `city.name`)")
+    venue_name = Column(
+        Unicode(), nullable=True,
+        doc=u"Name of the event's venue, if any (copy of `venue.name`)")
+    talk_count = Column(
+        Integer(), nullable=False, default=0,
+        doc=u"Number of talks")
+    has_video = Column(
+        Boolean(), nullable=False, default=False,
+        doc=u"True if any of the talks has a YouTube video")
     city_slug = Column(ForeignKey('cities.slug'), nullable=False)
     city = relationship('City', backref=backref('events',
                                                 order_by=desc('date')))
@@ -156,6 +220,7 @@ class Event(TableBase):
 class City(TableBase):
     u"""A city that holds events"""
     __tablename__ = 'cities'
+    __table_args__ = (Index('ix_cities_location', 'latitude', 'longitude'),)
     slug = Column(
         Unicode(), primary_key=True,
         doc=u"Unique identifier for use in URLs")
@@ -163,14 +228,22 @@ class City(TableBase):
         Unicode(), nullable=False,
         doc=u"Name of the city")
     longitude = Column(
-        Unicode(), nullable=False,
-        doc=u"Longitude of the location")
+        Float(), nullable=False,
+        doc=u"Longitude of the location, in degrees")
     latitude = Column(
-        Unicode(), nullable=False,
-        doc=u"Latitude of the location")
+        Float(), nullable=False,
+        doc=u"Latitude of the location, in degrees")
     _source = Column(
         Unicode(), nullable=True,
         doc=u"File from which the entry was loaded")
+    _root = Column(
+        Unicode(), nullable=True,
+        doc=u"Data directory the file was taken from, when several "
+            u"directories are overlaid (see `load.load_from_overlay`)")
+    content_hash = Column(
+        Unicode(), nullable=True, index=True,
+        doc=u"Hash of the city's data, including its venues and the "
+            u"content hashes of its events")
 
 
 class Series(TableBase):
@@ -209,6 +282,10 @@ class Series(TableBase):
     organizer_info = Column(
         Unicode(), nullable=True,
         doc=u"Info about organizers, as JSON.")
+    content_hash = Column(
+        Unicode(), nullable=True, index=True,
+        doc=u"Hash of the series' data, including the content hashes of "
+            u"its events")
 
     home_city = relationship('City', backref=backref('series'))
 
@@ -223,8 +300,7 @@ class Series(TableBase):
         otherwise, infinite results may be generated.
         Note that less than `n` results may be yielded.
         """
-        scheme = self.recurrence_scheme
-        if scheme is None:
+        if self.recurrence_scheme is None:
             return ()
 
         db = Session.object_session(self)
@@ -232,41 +308,61 @@ class Series(TableBase):
         query = query.filter(Event.series_slug == self.slug)
         query = query.order_by(desc(Event.date))
         query = query.limit(1)
-        last_planned_event = query.one_or_none()
-
         if since is None:
             last_planned_event = query.one()
-            since = last_planned_event.date
-        elif since < last_planned_event.date:
-            since = last_planned_event.date
-
-        start = getattr(since, 'date', since)
-
-        start += relativedelta.relativedelta(days=+1)
-
-        if (scheme == 'monthly'
-                and last_planned_event
-                and last_planned_event.date.year == start.year
-                and last_planned_event.date.month == start.month):
-            # Monthly events try to have one event per month, so exclude
-            # the current month if there was already a meetup
-            start += relativedelta.relativedelta(months=+1)
-            start = start.replace(day=1)
-
-        start = datetime.datetime.combine(start, datetime.time(tzinfo=CET))
-        result = rrule.rrulestr(self.recurrence_rule, dtstart=start)
-        if n is not None:
-            result = itertools.islice(result, n)
-        return result
+        else:
+            last_planned_event = query.one_or_none()
+
+        return next_occurrences(self, last_planned_event, n=n, since=since)
+
+
+def next_occurrences(series, last_planned_event, n=None, since=None):
+    """Implementation of Series.next_occurrences
+
+    Works with any object that has the Series attributes, given the latest
+    event of the series. If the series has no events, `last_planned_event`
+    is None, and `since` must be given.
+    """
+    scheme = series.recurrence_scheme
+    if scheme is None:
+        return ()
+
+    if since is None:
+        since = last_planned_event.date
+    elif last_planned_event is not None and since < last_planned_event.date:
+        since = last_planned_event.date
+
+    start = getattr(since, 'date', since)
+
+    start += relativedelta.relativedelta(days=+1)
+
+    if (scheme == 'monthly'
+            and last_planned_event
+            and last_planned_event.date.year == start.year
+            and last_planned_event.date.month == start.month):
+        # Monthly events try to have one event per month, so exclude
+        # the current month if there was already a meetup
+        start += relativedelta.relativedelta(months=+1)
+        start = start.replace(day=1)
+
+    start = datetime.datetime.combine(start, datetime.time(tzinfo=CET))
+    result = rrule.rrulestr(series.recurrence_rule, dtstart=start)
+    if n is not None:
+        result = itertools.islice(result, n)
+    return result
 
 
 class Venue(TableBase):
     u"""A venue to old events in"""
     __tablename__ = 'venues'
-    __table_args__ = (UniqueConstraint('city_slug', 'slug'),)
+    __table_args__ = (
+        UniqueConstraint('city_slug', 'slug'),
+        Index('ix_venues_location', 'latitude', 'longitude'),
+    )
     id = Column(
-        Integer, primary_key=True, nullable=False,
-        doc=u"An internal numeric ID")
+        Integer, primary_key=True, nullable=False, autoincrement=False,
+        default=_stable_id_default('venue', 'city_slug', 'slug'),
+        doc=u"A numeric ID derived from the natural key (see `stable_id`)")
     name = Column(
         Unicode(), nullable=False,
         doc=u"Name of the venue")
@@ -277,17 +373,20 @@ class Venue(TableBase):
         Unicode(), nullable=True,
         doc=u"Address of the venue")
     longitude = Column(
-        Unicode(), nullable=False,
-        doc=u"Longitude of the location")
+        Float(), nullable=False,
+        doc=u"Longitude of the location, in degrees")
     latitude = Column(
-        Unicode(), nullable=False,
-        doc=u"Latitude of the location")
+        Float(), nullable=False,
+        doc=u"Latitude of the location, in degrees")
     slug = Column(
         Unicode(), nullable=False,
         doc=u"Identifier for use in URLs")
     notes = Column(
         Unicode(), nullable=True,
         doc=u"Notes about the venue, e.g. directions to get there")
+    _source = Column(
+        Unicode(), nullable=True,
+        doc=u"File from which the entry was loaded")
 
     city = relationship('City', backref=backref('venues'))
 
@@ -311,8 +410,9 @@ class Talk(TableBase):
     u"""A talk"""
     __tablename__ = 'talks'
     id = Column(
-        Integer, primary_key=True, nullable=False,
-        doc=u"An internal numeric ID")
+        Integer, primary_key=True, nullable=False, autoincrement=False,
+        default=_stable_id_default('talk', 'event_id', 'index'),
+        doc=u"A numeric ID derived from the natural key (see `stable_id`)")
     title = Column(
         Unicode(), nullable=False,
         doc=u"Talk title")
@@ -383,13 +483,17 @@ class TalkLink(TableBase):
         Enum('slides', 'video', 'link', 'writeup', 'notes', 'talk'),
         doc="Kind of the link. 'talk' is a link to the talk itself; "
             "the rest is for suporting material")
-
-    @property
-    def hostname(self):
-        return urlparse(self.url).hostname
-
-    @property
-    def youtube_id(self):
-        match = YOUTUBE_RE.match(self.url)
-        if match:
-            return match.group(1)
+    hostname = Column(
+        Unicode(), nullable=True,
+        doc=u"Host name from the URL (set when `url` is set)")
+    youtube_id = Column(
+        Unicode(), nullable=True, index=True,
+        doc=u"ID of the YouTube video the URL points to, if any "
+            u"(set when `url` is set)")
+
+    @validates('url')
+    def _set_url(self, key, url):
+        # Keep the columns derived from the URL in step with it
+        self.hostname = urlparse(url).hostname
+        self.youtube_id = youtube_id_from_url(url)
+        return url
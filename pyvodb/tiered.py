@@ -0,0 +1,294 @@
+"""Two-tier data: a read-only SQLite archive of past events, plus YAML files
+
+Most events are in the past and never change. They can be compiled into an
+*archive* (an SQLite file) with `build_archive`. When the data is loaded
+with an archive (``get_db(directory, archive=...)``), the archived event
+files are not parsed; only the other files (cities, venues, series, and
+recent or upcoming events) are loaded from YAML.
+
+The archive is attached to the in-memory database with ``ATTACH DATABASE``.
+Temporary views with the names of the event tables (``events``, ``talks``
+etc.) then show the union of the loaded and the archived rows, so queries
+(including ORM queries) work without changes. The views shadow the real
+tables, so the database is read-only.
+
+IDs are derived from natural keys (see `tables.stable_id`), so archived
+rows have the same IDs as they would have if loaded from YAML, and
+archived events refer to venues (which are always loaded from YAML)
+directly.
+
+Each archived file is recorded with its git blob ID (a hash of the
+content), and so are the files of the cities and venues of archived events,
+which their content hashes and denormalized columns (like `venue_name`)
+are computed from. If any of these files changes or disappears, loading
+fails, and the archive needs to be rebuilt.
+"""
+
+import os
+import sqlite3
+import datetime
+import urllib.request
+
+from sqlalchemy import Column, MetaData, Table, create_engine
+from sqlalchemy.types import Boolean, Unicode
+from sqlalchemy.sql.expression import text
+
+from . import tables
+from . import gitload
+
+ARCHIVE_SCHEMA = 'archive'
+FORMAT_VERSION = '6'
+
+# Tables with rows of archived events, in the order they're copied
+ARCHIVED_TABLES = ('events', 'talks', 'talk_speakers', 'talk_links',
+                   'event_links')
+
+archive_metadata = MetaData()
+
+archive_info = Table(
+    'archive_info', archive_metadata,
+    Column('key', Unicode(), primary_key=True),
+    Column('value', Unicode(), nullable=False),
+)
+
+archive_files = Table(
+    'archive_files', archive_metadata,
+    Column('path', Unicode(), primary_key=True),
+    Column('blob_id', Unicode(), nullable=False),
+    # True for files of archived events (which are not parsed when loading);
+    # false for files of cities and venues that archived events depend on
+    Column('archived', Boolean(), nullable=False),
+)
+
+
+# Indexes for looking up archived rows through the union views
+ARCHIVE_INDEXES = (
+    ('events', 'date'),
+    ('events', 'series_slug'),
+    ('events', 'venue_id'),
+    ('talks', 'event_id'),
+    ('talk_speakers', 'speaker_slug'),
+)
+
+_ARCHIVED_EVENTS = '(SELECT id FROM main.events WHERE date < :cutoff)'
+_ARCHIVED_TALKS = ('(SELECT id FROM main.talks WHERE event_id IN {})'
+                   .format(_ARCHIVED_EVENTS))
+
+
+class StaleArchiveError(ValueError):
+    """Raised when archived files were changed after the archive was built"""
+
+
+def build_archive(db, directory, filename, cutoff):
+    """Write the events before `cutoff` (a date) to an archive file
+
+    :param db: Database with all the data loaded from the files in
+               `directory` (not from a git revision, a pack or overlaid
+               directories, and not using an archive)
+    :param directory: The data directory
+    :param filename: The archive file; it is overwritten if it exists
+
+    Returns the number of archived events.
+    """
+    if is_tiered(db):
+        raise ValueError('Cannot build an archive from a database that '
+                         'already uses one')
+    # Blob IDs of the archived files are computed from the files in
+    # `directory`, so they must be what the data was loaded from
+    for key, description in (('rev', 'a git revision'),
+                             ('pack', 'a packed data directory'),
+                             ('overlay', 'overlaid data directories')):
+        if key in db.info:
+            raise ValueError('Cannot build an archive from data loaded '
+                             'from {}'.format(description))
+    if os.path.exists(filename):
+        os.unlink(filename)
+    engine = create_engine('sqlite:///' + filename)
+    tables.metadata.create_all(engine)
+    archive_metadata.create_all(engine)
+    engine.dispose()
+
+    schema = 'new_' + ARCHIVE_SCHEMA
+    # SQLite can't attach databases in a transaction
+    db.commit()
+    db.execute(text('ATTACH DATABASE :filename AS {}'.format(schema)),
+               {'filename': filename})
+    try:
+        # Cities, series and venues are copied whole, so that foreign keys
+        # can be checked
+        conditions = [
+            ('cities', ''),
+            ('series', ''),
+            ('venues', ''),
+            ('events', 'WHERE date < :cutoff'),
+            ('talks', 'WHERE event_id IN ' + _ARCHIVED_EVENTS),
+            ('speakers', 'WHERE slug IN (SELECT speaker_slug '
+                         'FROM main.talk_speakers '
+                         'WHERE talk_id IN ' + _ARCHIVED_TALKS + ')'),
+            ('talk_speakers', 'WHERE talk_id IN ' + _ARCHIVED_TALKS),
+            ('talk_links', 'WHERE talk_id IN ' + _ARCHIVED_TALKS),
+            ('event_links', 'WHERE event_id IN ' + _ARCHIVED_EVENTS),
+        ]
+        for table, condition in conditions:
+            columns = tables.metadata.tables[table].columns
+            db.execute(
+                text('INSERT INTO {schema}.{table} ({columns}) '
+                     'SELECT {columns} FROM main.{table} {condition}'.format(
+                         schema=schema, table=table,
+                         columns=', '.join(_quote(c.name) for c in columns),
+                         condition=condition)),
+                {'cutoff': cutoff})
+        for table, column in ARCHIVE_INDEXES:
+            db.execute(
+                'CREATE INDEX {schema}.ix_archive_{table}_{column} '
+                'ON {table} ({column})'.format(
+                    schema=schema, table=table, column=column))
+
+        sources = [row[0] for row in db.execute(text(
+            'SELECT _source FROM {}.events'.format(schema)))]
+        dependencies = [row[0] for row in db.execute(text(
+            'SELECT _source FROM {schema}.cities WHERE slug IN '
+            '(SELECT city_slug FROM {schema}.events) '
+            'UNION '
+            'SELECT _source FROM {schema}.venues WHERE id IN '
+            '(SELECT venue_id FROM {schema}.events)'.format(schema=schema)))]
+        files = []
+        for paths, archived in (sources, True), (dependencies, False):
+            for source in paths:
+                path = os.path.join(directory, source)
+                with open(path, 'rb') as f:
+                    files.append({'path': source,
+                                  'blob_id': gitload.blob_id(f.read()),
+                                  'archived': archived})
+        if files:
+            db.execute(text(
+                'INSERT INTO {}.archive_files (path, blob_id, archived) '
+                'VALUES (:path, :blob_id, :archived)'.format(schema)), files)
+        db.execute(text(
+            'INSERT INTO {}.archive_info (key, value) '
+            'VALUES (:key, :value)'.format(schema)), [
+                {'key': 'format_version', 'value': FORMAT_VERSION},
+                {'key': 'cutoff', 'value': cutoff.isoformat()},
+            ])
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    finally:
+        db.execute('DETACH DATABASE {}'.format(schema))
+    return len(sources)
+
+
+def _read_only_uri(filename):
+    return 'file:{}?mode=ro'.format(
+        urllib.request.pathname2url(os.path.abspath(filename)))
+
+
+def _read_only_engine(filename):
+    if not os.path.exists(filename):
+        raise ValueError('Archive not found: {}'.format(filename))
+    uri = _read_only_uri(filename)
+    return create_engine(
+        'sqlite://', creator=lambda: sqlite3.connect(uri, uri=True))
+
+
+def read_archive_info(filename):
+    """Get the recorded files and the cutoff date of an archive
+
+    Returns a dict mapping paths (as in the ``_source`` columns) of all
+    recorded files to blob IDs, a set of the paths of archived files
+    (which are not to be loaded), and the cutoff date.
+    """
+    engine = _read_only_engine(filename)
+    try:
+        with engine.connect() as connection:
+            info = dict(connection.execute(archive_info.select()).fetchall())
+            if info.get('format_version') != FORMAT_VERSION:
+                raise ValueError('Unsupported archive format: {}'.format(
+                    filename))
+            rows = connection.execute(archive_files.select()).fetchall()
+    finally:
+        engine.dispose()
+    files = {row.path: row.blob_id for row in rows}
+    archived = {row.path for row in rows if row.archived}
+    cutoff = datetime.datetime.strptime(info['cutoff'], '%Y-%m-%d').date()
+    return files, archived, cutoff
+
+
+def read_archived_events(filename):
+    """Get ``(city_slug, series_slug, content_hash)`` of archived events
+
+    These are needed to compute the content hashes of cities and series.
+    """
+    engine = _read_only_engine(filename)
+    try:
+        with engine.connect() as connection:
+            return connection.execute(text(
+                'SELECT city_slug, series_slug, content_hash FROM events '
+                'ORDER BY id')).fetchall()
+    finally:
+        engine.dispose()
+
+
+def check_archived_files(directory, files):
+    """Check that recorded files didn't change since the archive was built
+
+    :param files: Dict mapping paths to blob IDs, from `read_archive_info`
+
+    Raises StaleArchiveError if a file was changed or removed.
+    """
+    for path, blob_id in files.items():
+        try:
+            with open(os.path.join(directory, path), 'rb') as f:
+                content = f.read()
+        except FileNotFoundError:
+            raise StaleArchiveError(
+                'File was removed since the archive was built: {}; '
+                'rebuild the archive'.format(path))
+        if gitload.blob_id(content) != blob_id:
+            raise StaleArchiveError(
+                'File was changed since the archive was built: {}; '
+                'rebuild the archive'.format(path))
+
+
+def _quote(name):
+    return '"{}"'.format(name)
+
+
+def attach_archive(db, filename):
+    """Attach an archive to a loaded database, and create the union views
+
+    The data loaded into `db` must not include the archived files.
+    """
+    # SQLite can't attach databases in a transaction
+    db.commit()
+    db.execute(text('ATTACH DATABASE :uri AS {}'.format(ARCHIVE_SCHEMA)),
+               {'uri': _read_only_uri(filename)})
+    for name in ARCHIVED_TABLES:
+        table = tables.metadata.tables[name]
+        columns = ', '.join(_quote(c.name) for c in table.columns)
+        db.execute(
+            'CREATE TEMP VIEW {name} AS '
+            'SELECT {columns} FROM main.{name} '
+            'UNION ALL '
+            'SELECT {columns} FROM {schema}.{name}'.format(
+                name=name, columns=columns, schema=ARCHIVE_SCHEMA))
+    # Speakers that are in both parts are only listed once
+    columns = ', '.join(
+        _quote(c.name) for c in tables.Speaker.__table__.columns)
+    db.execute(
+        'CREATE TEMP VIEW speakers AS '
+        'SELECT {columns} FROM main.speakers '
+        'UNION ALL '
+        'SELECT {columns} FROM {schema}.speakers '
+        'WHERE slug NOT IN (SELECT slug FROM main.speakers)'.format(
+            columns=columns, schema=ARCHIVE_SCHEMA))
+    db.info['archive'] = filename
+    # The prefix indexes need to include archived speakers;
+    # they'll be rebuilt from the views on first use
+    db.info.pop('prefix_indexes', None)
+
+
+def is_tiered(db):
+    """Return true if an archive is attached to the database"""
+    return 'archive' in db.info
@@ -19,7 +19,7 @@ class PyTest(TestCommand):
 
 requires = [
     'blessings >= 1.6, < 2.0',
-    'sqlalchemy >= 1.3, < 2.0',
+    'sqlalchemy >= 1.4, < 2.0',
     'PyYAML >= 5.1, < 6.0',
     'python-dateutil >= 2.8, <3.0',
     'click >= 6.7, <7.0',
@@ -29,6 +29,11 @@ requires = [
 
 tests_require = ['pytest']
 
+extras_require = {
+    # Loading .tar.zst packs (see pyvodb.packload)
+    'zstd': ['zstandard'],
+}
+
 if sys.version_info < (3, 4):
     # pathlib is in the stdlib since Python 3.4
     requires.append('pathlib >= 1.0.1, < 2.0')
@@ -48,13 +53,13 @@ setup_args = dict(
         'Operating System :: OS Independent',
         'Programming Language :: Python',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.5',
         'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
         'Programming Language :: Python :: 3.8',
     ],
 
     install_requires=requires,
+    extras_require=extras_require,
 
     tests_require=tests_require,
     cmdclass={'test': PyTest},
@@ -1,5 +1,7 @@
 import os
 import glob
+import shutil
+import subprocess
 
 import pytest
 
@@ -20,3 +22,25 @@ def get_yaml_data(data_directory):
 @pytest.fixture(scope='module')
 def db(data_directory):
     return get_db(data_directory)
+
+def _git(repo, *args):
+    return subprocess.run(
+        ['git', '-c', 'user.name=Test', '-c', 'user.email=test@example.org',
+         *args],
+        cwd=repo, check=True, stdout=subprocess.PIPE, stdin=subprocess.DEVNULL,
+        universal_newlines=True).stdout
+
+@pytest.fixture(scope='session')
+def git():
+    """Function to run git in a repository: ``git(repo, *args)``"""
+    return _git
+
+@pytest.fixture
+def git_data(tmp_path, data_directory, git):
+    """A git repository with the test data committed in `data/`"""
+    repo = tmp_path / 'repo'
+    shutil.copytree(data_directory, str(repo / 'data'))
+    git(repo, 'init', '-q')
+    git(repo, 'add', '.')
+    git(repo, 'commit', '-q', '-m', 'Initial')
+    return repo / 'data'
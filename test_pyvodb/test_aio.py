@@ -0,0 +1,89 @@
+import asyncio
+import datetime
+import threading
+
+import pytest
+
+from pyvodb import tables
+from pyvodb.aio import AsyncDB
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+@pytest.fixture(scope='module')
+def brno_events(db):
+    query = db.query(tables.Event).filter(tables.Event.city_slug == 'brno')
+    return query.order_by(tables.Event.date).all()
+
+
+def test_get_event(data_directory, brno_events):
+    async def main():
+        async with await AsyncDB.open(data_directory) as adb:
+            return (await adb.get_event('brno', brno_events[0].date),
+                    await adb.get_event('brno', datetime.date(1999, 1, 1)))
+
+    event, missing = run(main())
+    assert event == brno_events[0].as_dict()
+    assert missing is None
+
+
+def test_many_concurrent_requests(data_directory, db, brno_events):
+    since = datetime.date(2014, 1, 1)
+
+    async def main():
+        async with await AsyncDB.open(data_directory) as adb:
+            return await asyncio.gather(
+                *(adb.get_event('brno', e.date) for e in brno_events * 10),
+                *(adb.get_calendar(2013, month) for month in range(1, 13)),
+                *(adb.series_occurrences('brno-pyvo', n=3, since=since)
+                  for i in range(20)),
+                *(adb.export(city_slug='brno') for i in range(5)),
+            )
+
+    results = run(main())
+    num_events = len(brno_events) * 10
+    assert results[:num_events] == [e.as_dict() for e in brno_events] * 10
+    calendars = results[num_events:num_events + 12]
+    for month, calendar in zip(range(1, 13), calendars):
+        assert len(calendar) == 3
+        assert list(calendar)[0] == (2013, month)
+        for week in calendar[2013, month]:
+            for day in week:
+                if not day['alien']:
+                    expected = [e.as_dict() for e in brno_events
+                                if e.date == day['day']]
+                    if expected:
+                        assert day['events'] == expected
+    series = db.query(tables.Series).get('brno-pyvo')
+    expected = list(series.next_occurrences(n=3, since=since))
+    assert results[num_events + 12:-5] == [expected] * 20
+    assert results[-5:] == [[e.as_dict() for e in brno_events]] * 5
+
+
+def test_runs_in_one_thread(data_directory):
+    async def main():
+        async with await AsyncDB.open(data_directory) as adb:
+            return await asyncio.gather(
+                *(adb.run(lambda db: threading.get_ident())
+                  for i in range(50)))
+
+    thread_ids = run(main())
+    assert len(set(thread_ids)) == 1
+    assert thread_ids[0] != threading.get_ident()
+
+
+def test_closed(data_directory):
+    async def main():
+        adb = await AsyncDB.open(data_directory)
+        await adb.close()
+        await adb.close()
+        with pytest.raises(ValueError):
+            await adb.get_event('brno', datetime.date(2013, 1, 1))
+
+    run(main())
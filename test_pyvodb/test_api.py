@@ -0,0 +1,102 @@
+import os
+import json
+import shutil
+
+import pytest
+
+from pyvodb import api, tables
+from pyvodb.load import get_db
+
+EVENT_PATH = 'events/brno-pyvo/2015-02-26.json'
+
+
+@pytest.fixture
+def datadir(tmp_path, data_directory):
+    path = str(tmp_path / 'data')
+    shutil.copytree(data_directory, path)
+    return path
+
+
+def read(directory, path):
+    with open(os.path.join(directory, path), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_build(db, tmp_path):
+    outdir = str(tmp_path / 'api')
+    report = api.build_api(db, outdir)
+    assert report['updated'] == report['removed'] == []
+    assert report['unchanged'] == []
+    num_events = db.query(tables.Event).count()
+    assert len(report['created']) == num_events + 3 + 4 + 2
+
+    event = read(outdir, EVENT_PATH)
+    assert event['series'] == 'brno-pyvo'
+    assert event['title'] == 'Brněnské Pyvo + BRUG + CzechiPub – Dokumentační'
+    assert event['start'] == '2015-02-26 19:00:00'
+    assert event['venue'] == 'u-dreveneho-orla'
+
+    index = read(outdir, 'index.json')
+    assert [c['slug'] for c in index['cities']] == ['brno', 'ostrava',
+                                                    'praha']
+    assert sum(c['event_count'] for c in index['cities']) == num_events
+
+    city = read(outdir, 'cities/brno.json')
+    assert city['name'] == 'Brno'
+    assert city['latitude'] == '49.1949975'
+    assert city['venues'][1]['longitude'] == '16.6008957'
+    assert [v['slug'] for v in city['venues']] == [
+        'hlavni-nadrazi', 'u-drevaka', 'u-dreveneho-orla']
+    dates = [e['start'] for e in city['events']]
+    assert dates == sorted(dates, reverse=True)
+    assert all(os.path.exists(os.path.join(outdir, e['path']))
+               for e in city['events'])
+
+    series = read(outdir, 'series/brno-pyvo.json')
+    assert EVENT_PATH in [e['path'] for e in series['events']]
+
+    summaries = read(outdir, 'events/index.json')
+    assert len(summaries) == num_events
+    [summary] = [s for s in summaries if s['path'] == EVENT_PATH]
+    assert summary['city_name'] == 'Brno'
+    assert summary['venue_name'] == 'U Dřevěného orla'
+
+    manifest = read(outdir, 'manifest.json')
+    assert sorted(manifest['files']) == sorted(report['created'])
+
+
+def test_rebuild_unchanged(db, tmp_path):
+    outdir = str(tmp_path / 'api')
+    api.build_api(db, outdir)
+    mtime = os.stat(os.path.join(outdir, EVENT_PATH)).st_mtime_ns
+    os.unlink(os.path.join(outdir, 'cities/praha.json'))
+
+    report = api.build_api(db, outdir)
+    assert report['created'] == ['cities/praha.json']
+    assert report['updated'] == report['removed'] == []
+    assert os.stat(os.path.join(outdir, EVENT_PATH)).st_mtime_ns == mtime
+
+
+def test_rebuild_after_change(datadir, tmp_path):
+    outdir = str(tmp_path / 'api')
+    api.build_api(get_db(datadir), outdir)
+
+    events_dir = os.path.join(datadir, 'series/brno-pyvo/events')
+    filename = os.path.join(events_dir, '2015-02-26-dokumentacni.yaml')
+    with open(filename, encoding='utf-8') as f:
+        content = f.read()
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write(content.replace('topic: Dokumentační', 'topic: Docs'))
+    os.unlink(os.path.join(events_dir, '2012-11-29-cli.yaml'))
+
+    report = api.build_api(get_db(datadir), outdir)
+    assert report['created'] == []
+    assert report['removed'] == ['events/brno-pyvo/2012-11-29.json']
+    assert sorted(report['updated']) == [
+        'cities/brno.json', EVENT_PATH, 'events/index.json', 'index.json',
+        'series/brno-pyvo.json']
+    assert read(outdir, EVENT_PATH)['topic'] == 'Docs'
+    assert not os.path.exists(
+        os.path.join(outdir, 'events/brno-pyvo/2012-11-29.json'))
+    manifest = read(outdir, 'manifest.json')
+    assert 'events/brno-pyvo/2012-11-29.json' not in manifest['files']
@@ -4,6 +4,8 @@ import textwrap
 import sys
 import builtins
 import re
+import json
+import tarfile
 
 from click.testing import CliRunner
 import yaml
@@ -13,6 +15,8 @@ from pyvodb.cli import cli
 from pyvodb.load import get_db
 from pyvodb import tables
 from pyvodb import cli as pyvodb_cli_module
+from pyvodb.cli import top as top_module
+
 
 @pytest.fixture
 def runner():
@@ -265,3 +269,324 @@ def test_calendar_yaml(run):
     assert result.exit_code == 0
     output = yaml.safe_load(result.output)
     assert output[0]
+
+
+def test_ics(run):
+    result = run('ics', '--city', 'ost')
+    assert result.exit_code == 0
+    lines = result.output.splitlines()
+    assert lines[0] == 'BEGIN:VCALENDAR'
+    assert 'X-WR-CALNAME:Ostrava' in lines
+    assert lines.count('BEGIN:VEVENT') == 5
+
+
+def test_ics_outdir(run, tmp_path):
+    outdir = str(tmp_path / 'ics')
+    result = run('ics', '--outdir', outdir)
+    assert result.exit_code == 0
+    assert result.output == '8 created, 0 updated, 0 unchanged\n'
+
+    result = run('ics', '--outdir', outdir, '--projected', '1')
+    assert result.exit_code == 0
+    assert result.output == '0 created, 4 updated, 4 unchanged\n'
+
+    result = run('-v', 'ics', '--outdir', outdir)
+    assert result.exit_code == 0
+    assert 'updated: {}\n'.format(
+        os.path.join(outdir, 'all.ics')) in result.output
+    assert 'ostrava' not in result.output
+    assert result.output.endswith('0 created, 4 updated, 4 unchanged\n')
+
+
+def test_search(run):
+    result = run('search', 'autoscaling')
+    assert result.exit_code == 0
+    assert result.output == textwrap.dedent("""\
+        praha 2015-03-18 Pražské PyVo #48 Zase Docker
+          Tomáš Plešek: Docker & Autoscaling
+            Docker & Autoscaling
+        """)
+
+
+@pytest.mark.parametrize('query', ['"docker', 'AND', 'docker AND'])
+def test_search_invalid_raw_query(run, query):
+    result = run('search', '--raw', query)
+    assert result.exit_code == 1
+    assert 'Invalid search syntax' in result.output
+
+
+@pytest.mark.parametrize(['args', 'expected'], [
+    [('city', ''), 'brno\nostrava\npraha\n'],
+    [('city', 'Pr'), 'praha\n'],
+    [('series', 'brno'), 'brno-pyvo\nbrno-pyvo-rruletest\n'],
+    [('speaker', 'Jiri'), 'Jiri Barton\n'],
+])
+def test_complete(run, args, expected):
+    result = run('complete', *args)
+    assert result.exit_code == 0
+    assert result.output == expected
+
+
+@pytest.mark.parametrize(['city', 'message'], [
+    ['x', 'No such city: x'],
+    ['', 'City is not unique: '],
+])
+def test_show_bad_city(run, city, message):
+    result = run('show', city)
+    assert result.exit_code != 0
+    assert message in result.output
+
+
+def test_near(run):
+    result = run('near', '49.84', '18.28', '--radius', '0.7')
+    assert result.exit_code == 0
+    assert result.output == textwrap.dedent("""\
+        V. R. Levský (Ostrava), 0.6 km
+          Škroupova 1114/4
+          2014-08-07 Ostravské KinoPyvo
+          2014-10-02 Ostravské Pyvo – Balíš. balím, balíme
+          2014-11-06 Ostravské Pyvo s Rubači – Testovací
+        """)
+
+
+def test_videometadata(run, tmpdir):
+    result = run('videometadata', 'brno', '2012-11-29', str(tmpdir))
+    assert result.exit_code == 0
+    assert result.output.startswith('Brno-2012-11\n')
+    config = yaml.safe_load(tmpdir.join(
+        'Brno-2012-11', '02-textova-rozhrani', 'config.yaml').read())
+    assert config['speaker'] == 'Petr Viktorin'
+    assert config['title'] == 'Textová rozhraní'
+    assert config['url'] == 'https://pyvo.cz/brno-pyvo/2012-11/'
+
+
+def test_videobatch(run, tmpdir):
+    args = ('videobatch', '--series', 'brno-pyvo', '--since', '2012-11-01',
+            '--until', '2013-12-31', str(tmpdir))
+    result = run(*args)
+    assert result.exit_code == 0
+    assert result.output.endswith('6 created, 0 updated, 0 unchanged\n')
+    assert result.output.count('created: ') == 6
+    assert sorted(os.listdir(str(tmpdir))) == [
+        'Brno-2012-11', 'Brno-2013-05']
+
+    edited = tmpdir.join('Brno-2013-05', 'config.yaml')
+    edited.write('edited')
+    result = run(*args)
+    assert result.exit_code == 0
+    assert result.output == (
+        'updated: {}\n'.format(edited) +
+        '0 created, 1 updated, 5 unchanged\n')
+    assert edited.read() != 'edited'
+
+
+def test_videobatch_conflict(run, tmpdir):
+    # Two Brno meetups in November 2012 map to the same directory
+    result = run('videobatch', '--city', 'brno', str(tmpdir))
+    assert result.exit_code != 0
+    assert 'would both be written to' in result.output
+    assert tmpdir.listdir() == []
+
+
+def test_videobatch_json(run, tmpdir):
+    result = run('--json', 'videobatch', '--series', 'praha-pyvo',
+                 '--since', '2015-05-01', str(tmpdir))
+    assert result.exit_code == 0
+    report = yaml.safe_load(result.output)
+    assert [len(report[s]) for s in ('created', 'updated', 'unchanged')] == [
+        1, 0, 0]
+
+
+def test_videos(run):
+    result = run('videos', '--city', 'ostrava')
+    assert result.exit_code == 0
+    assert result.output == textwrap.dedent("""\
+        2014-11-06 ostrava Daniel Dimitrov: Testování obecně
+            https://www.youtube.com/watch?v=fg2rQAf3ee0
+        2014-11-06 ostrava Petr Viktorin: import pytest
+            https://www.youtube.com/watch?v=X9rwiypBZMU
+        """)
+
+
+def test_videos_json(run):
+    result = run('--json', 'videos', '--series', 'brno-pyvo')
+    assert result.exit_code == 0
+    output = yaml.safe_load(result.output)
+    # Both the video and the writeup of this talk link to YouTube
+    assert [v['youtube_id'] for v in output].count('HDmCGUKfe7Y') == 1
+    assert output[0] == {
+        'city': 'brno',
+        'series': 'brno-pyvo',
+        'date': '2012-11-29',
+        'title': 'Docopt',
+        'speakers': ['Tomáš Ehrlich'],
+        'youtube_id': '4AV7NyQj9ZY',
+    }
+
+
+def test_profile(run, tmpdir):
+    profile_file = tmpdir.join('profile.stats')
+    result = run('--profile', '--profile-file', str(profile_file),
+                 'show', 'ostrava', 'p1')
+    assert result.exit_code == 0
+    assert 'Data loading profile:' in result.output
+    assert '\n  talk_speakers ' in result.output
+    assert profile_file.size() > 0
+
+
+def test_sql_stats(run):
+    result = run('--sql-stats', 'show', 'ostrava', 'p1')
+    assert result.exit_code == 0
+    assert re.search(r'SQL statements: \d+ in', result.output)
+    assert 'SELECT … FROM events' in result.output
+
+
+def test_rev(run, git_data):
+    (git_data / 'meta.yaml').write_text('invalid: [')
+    result = run('--rev', 'HEAD', 'show', 'ostrava', 'p1',
+                 datadir=str(git_data))
+    assert result.exit_code == 0
+    assert 'Ostravské Pyvo – Druhé' in result.output
+
+
+def test_rev_with_pack(run, data_directory, tmp_path):
+    pack = str(tmp_path / 'data.tar.gz')
+    with tarfile.open(pack, 'w:gz') as f:
+        f.add(data_directory, '.')
+    result = run('--rev', 'HEAD', 'show', 'ostrava', 'p1', datadir=pack)
+    assert result.exit_code == 1
+    assert 'Error: A revision can only be used with a directory' in (
+        result.output)
+
+
+def test_bad_pack(run, tmp_path):
+    pack = tmp_path / 'data.zip'
+    pack.write_bytes(b'not a zip file')
+    result = run('show', 'ostrava', 'p1', datadir=str(pack))
+    assert result.exit_code == 1
+    assert result.output.startswith('Error: Could not read ')
+
+
+def test_diff(run, git_data, git):
+    event_file = git_data / 'series/brno-pyvo/events/2013-05-30-gui.yaml'
+    event_file.write_text(event_file.read_text().replace('GUI', 'UI'))
+    git(git_data, 'commit', '-q', '-a', '-m', 'Change')
+    # The working tree is not loaded when comparing revisions
+    event_file.write_text('invalid: [')
+
+    result = run('diff', 'HEAD~1', 'HEAD', datadir=str(git_data))
+    assert result.exit_code == 0
+    assert result.output.splitlines() == [
+        'Events:',
+        '  ~ brno-pyvo/2013-05-30 (topic)',
+        '(1 file changed)',
+    ]
+
+    result = run('--json', 'diff', 'HEAD~1', 'HEAD', datadir=str(git_data))
+    assert result.exit_code == 0
+    data = yaml.safe_load(result.output)
+    assert data['events']['changed'] == {'brno-pyvo/2013-05-30': ['topic']}
+
+
+def test_diff_bad_revision(run, git_data):
+    result = run('diff', 'no-such-revision', datadir=str(git_data))
+    assert result.exit_code != 0
+    assert 'Not a valid object name no-such-revision' in result.output
+
+
+def test_build_archive(run, tmp_path):
+    filename = str(tmp_path / 'archive.sqlite')
+    result = run('build-archive', '--before', '2014-01-01', filename)
+    assert result.exit_code == 0
+    assert result.output == (
+        'Archived 6 meetups before 2014-01-01 in {}\n'.format(filename))
+
+    result = run('--archive', filename, 'show', 'brno', '2013-05-30')
+    assert result.exit_code == 0
+    assert 'Brněnské PyVo + BRUG – GUI' in result.output
+
+
+def test_build_api(run, tmp_path):
+    outdir = str(tmp_path / 'api')
+    result = run('build-api', outdir)
+    assert result.exit_code == 0
+    assert 'created: events/brno-pyvo/2013-05-30.json\n' in result.output
+    assert result.output.endswith('0 updated, 0 removed, 0 unchanged\n')
+
+    result = run('build-api', outdir)
+    assert result.exit_code == 0
+    assert result.output.startswith('0 created, 0 updated, 0 removed, ')
+
+
+def test_batch(run):
+    commands = textwrap.dedent("""
+        show brno 2015-02-26
+
+        # comment
+        calendar 2014-08
+        show nowhere
+        show brno 2099-01-01
+        show "brno
+        near --help
+        batch
+    """)
+    result = run('batch', stdin_text=commands)
+    assert result.exit_code == 0
+    records = [json.loads(line) for line in result.output.splitlines()]
+    assert [r['command'] for r in records] == [
+        'show brno 2015-02-26', 'calendar 2014-08', 'show nowhere',
+        'show brno 2099-01-01', 'show "brno', 'near --help', 'batch']
+
+    show, calendar, no_city, no_meetup, bad_quote, help, nested = records
+    assert show['result']['start'] == '2015-02-26 19:00:00'
+    assert show['result']['venue'] == 'u-dreveneho-orla'
+    assert len(calendar['result']) == 3
+    assert no_city == {'command': 'show nowhere',
+                       'error': 'No such city: nowhere'}
+    assert no_meetup['error'] == 'No such meetup'
+    assert 'quotation' in bad_quote['error']
+    assert help['output'].startswith('Usage: pyvo near')
+    assert nested['error'] == 'batch cannot be nested'
+
+
+def test_batch_loads_once(run, data_directory, tmp_path, monkeypatch):
+    loads = []
+    monkeypatch.setattr(top_module, 'get_db',
+                        lambda *a, **k: loads.append(a) or get_db(*a, **k))
+    path = tmp_path / 'commands'
+    path.write_text('show brno 2015-02-26\nshow brno 2014-08\n')
+    result = run('batch', str(path))
+    assert result.exit_code == 0
+    assert len(result.output.splitlines()) == 2
+    assert len(loads) == 1
+
+
+def test_overlay(run, tmp_path, data_directory):
+    overlay = tmp_path / 'overlay'
+    events = overlay / 'series/ostrava-pyvo/events'
+    events.mkdir(parents=True)
+    with open(os.path.join(data_directory, 'series/ostrava-pyvo/events',
+                           '2014-08-07.yaml'), encoding='utf-8') as f:
+        content = f.read()
+    (events / '2014-09-04.yaml').write_text(
+        content.replace('2014-08-07', '2014-09-04'), encoding='utf-8')
+
+    result = run('--overlay', str(overlay), '-v', 'show', 'ostrava',
+                 '2014-09-04')
+    assert result.exit_code == 0
+    assert 'KinoPyvo' in result.output
+    assert 'entry loaded from {}'.format(
+        os.path.join(str(overlay), 'series/ostrava-pyvo/events',
+                     '2014-09-04.yaml')) in result.output
+
+    result = run('show', 'ostrava', '2014-09-04')
+    assert result.exit_code != 0
+
+
+@pytest.mark.parametrize('option', [['--rev', 'HEAD'],
+                                    ['--archive', 'archive.sqlite']])
+def test_overlay_options(run, data_directory, option):
+    result = run('--overlay', data_directory, *option, 'show', 'brno')
+    assert result.exit_code == 2
+    assert 'Error: --overlay cannot be used with {}'.format(option[0]) in (
+        result.output)
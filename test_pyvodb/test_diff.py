@@ -0,0 +1,156 @@
+import pytest
+
+from pyvodb import diff
+
+
+EVENT = 'series/brno-pyvo/events/2013-05-30-gui.yaml'
+
+
+@pytest.fixture
+def changed_data(git_data, git):
+    """Commit some changes to the test data; return the data directory"""
+    event_file = git_data / EVENT
+    content = event_file.read_text()
+    content = content.replace('topic: GUI', 'topic: Graphical interfaces')
+    content = content.replace('- title: PySide & Qt', '- title: PyQt & Qt')
+    content = content.replace('  - Petr Viktorin\n  urls:\n  - http://lanyrd.com'
+                              '/2013/brnenske-pyvo-brug-kvetnove/schxdy/',
+                              '  - Petr Viktorin\n  - Nová Řečnice\n  urls:\n'
+                              '  - http://lanyrd.com'
+                              '/2013/brnenske-pyvo-brug-kvetnove/schxdy/')
+    event_file.write_text(content)
+    (git_data / 'cities/brno/venues/hlavni-nadrazi.yaml').unlink()
+    git(git_data, 'commit', '-q', '-a', '-m', 'Change')
+    return git_data
+
+
+def check_changes(changes):
+    assert changes['files'] == [
+        'cities/brno/venues/hlavni-nadrazi.yaml', EVENT]
+    assert changes['venues'] == {
+        'added': [], 'removed': ['brno/hlavni-nadrazi'], 'changed': {}}
+    assert changes['events'] == {
+        'added': [], 'removed': [],
+        'changed': {'brno-pyvo/2013-05-30': ['topic']}}
+    assert changes['talks'] == {
+        'added': ['brno-pyvo/2013-05-30 #2: PyQt & Qt'],
+        'removed': ['brno-pyvo/2013-05-30 #2: PySide & Qt'],
+        'changed': {},
+    }
+    assert changes['speakers'] == {
+        'Nová Řečnice': {
+            'added_talks': ['brno-pyvo/2013-05-30 #2: PyQt & Qt'],
+            'removed_talks': [],
+        },
+        'Petr Viktorin': {
+            'added_talks': ['brno-pyvo/2013-05-30 #2: PyQt & Qt'],
+            'removed_talks': ['brno-pyvo/2013-05-30 #2: PySide & Qt'],
+        },
+    }
+    assert changes['cities'] == changes['series'] == {
+        'added': [], 'removed': [], 'changed': {}}
+
+
+def test_revisions(changed_data):
+    old = diff.GitSource(str(changed_data), 'HEAD~1')
+    new = diff.GitSource(str(changed_data), 'HEAD')
+    check_changes(diff.compare(old, new))
+
+
+def test_revision_and_directory(changed_data):
+    old = diff.get_source(str(changed_data), 'HEAD~1')
+    new = diff.get_source(str(changed_data), None)
+    assert isinstance(new, diff.DirectorySource)
+    check_changes(diff.compare(old, new))
+
+
+def test_directories(changed_data, data_directory):
+    old = diff.get_source(str(changed_data), data_directory)
+    new = diff.get_source(str(changed_data), str(changed_data))
+    check_changes(diff.compare(old, new))
+
+
+def test_only_changed_files_parsed(changed_data, monkeypatch):
+    parsed = []
+    original_parse = diff.GitSource.parse
+
+    def parse(self, files):
+        parsed.extend(files)
+        return original_parse(self, files)
+
+    monkeypatch.setattr(diff.GitSource, 'parse', parse)
+    old = diff.GitSource(str(changed_data), 'HEAD~1')
+    new = diff.GitSource(str(changed_data), 'HEAD')
+    parsed.clear()
+    diff.compare(old, new)
+    assert sorted(parsed) == [
+        'cities/brno/venues/hlavni-nadrazi.yaml', EVENT, EVENT]
+
+
+def test_talk_changes(git_data):
+    event_file = git_data / EVENT
+    content = event_file.read_text()
+    event_file.write_text(content.replace(
+        '  - writeup: https://youtu.be/HDmCGUKfe7Y', '  - slides: http://x/'))
+    changes = diff.compare(diff.GitSource(str(git_data), 'HEAD'),
+                           diff.DirectorySource(str(git_data)))
+    assert changes['talks']['changed'] == {
+        'brno-pyvo/2013-05-30 #1: Python a GTK, Getting Things GNOME!':
+            ['coverage'],
+    }
+    assert changes['speakers'] == {}
+
+
+def test_talks_with_same_title(git_data, git):
+    event_file = git_data / EVENT
+    content = event_file.read_text()
+    content = content.replace('- title: PySide & Qt', '- title: Lightning')
+    content = content.replace('- title: Python a GTK, Getting Things GNOME!',
+                              '- title: Lightning')
+    event_file.write_text(content)
+    git(git_data, 'commit', '-q', '-a', '-m', 'Same titles')
+    event_file.write_text(content.replace('Petr Viktorin', 'Nová Řečnice'))
+    changes = diff.compare(diff.GitSource(str(git_data), 'HEAD'),
+                           diff.DirectorySource(str(git_data)))
+    assert changes['talks'] == {
+        'added': [], 'removed': [],
+        'changed': {'brno-pyvo/2013-05-30 #2: Lightning': ['speakers']},
+    }
+    assert changes['speakers'] == {
+        'Nová Řečnice': {
+            'added_talks': ['brno-pyvo/2013-05-30 #2: Lightning'],
+            'removed_talks': [],
+        },
+        'Petr Viktorin': {
+            'added_talks': [],
+            'removed_talks': ['brno-pyvo/2013-05-30 #2: Lightning'],
+        },
+    }
+
+
+def test_no_changes(git_data):
+    changes = diff.compare(diff.GitSource(str(git_data), 'HEAD'),
+                           diff.DirectorySource(str(git_data)))
+    assert changes['files'] == []
+    assert diff.format_changes(changes) == 'No changes\n(0 files changed)'
+
+
+def test_format_changes(changed_data):
+    changes = diff.compare(diff.GitSource(str(changed_data), 'HEAD~1'),
+                           diff.GitSource(str(changed_data), 'HEAD'))
+    assert diff.format_changes(changes).splitlines() == [
+        'Venues:',
+        '  - brno/hlavni-nadrazi',
+        'Events:',
+        '  ~ brno-pyvo/2013-05-30 (topic)',
+        'Talks:',
+        '  + brno-pyvo/2013-05-30 #2: PyQt & Qt',
+        '  - brno-pyvo/2013-05-30 #2: PySide & Qt',
+        'Speakers:',
+        '  ~ Nová Řečnice',
+        '      + brno-pyvo/2013-05-30 #2: PyQt & Qt',
+        '  ~ Petr Viktorin',
+        '      + brno-pyvo/2013-05-30 #2: PyQt & Qt',
+        '      - brno-pyvo/2013-05-30 #2: PySide & Qt',
+        '(2 files changed)',
+    ]
@@ -0,0 +1,75 @@
+import datetime
+
+import pytest
+
+from pyvodb import geo
+from pyvodb.tables import Venue
+
+
+def test_location_is_numeric(db):
+    venue = db.query(Venue).filter(Venue.slug == 'u-drevaka').one()
+    assert venue.latitude == 49.209095
+    assert venue.longitude == 16.6008957
+    assert venue.city.latitude == 49.1949975
+
+
+def test_distance():
+    # Prague -- Brno, as the crow flies
+    assert geo.distance_km(50.0875, 14.4213, 49.1950, 16.6081) == (
+        pytest.approx(186, abs=1))
+    assert geo.distance_km(49.2, 16.6, 49.2, 16.6) == 0
+
+
+@pytest.mark.parametrize(['lat', 'lon', 'radius'], [
+    [49.2, 16.6, 10],
+    [-33.86, 151.21, 50],
+    [89.99, 0, 10],
+    [0, 179.99, 10],
+])
+def test_bounding_box(lat, lon, radius):
+    min_lat, max_lat, min_lon, max_lon = geo.bounding_box(lat, lon, radius)
+    assert min_lat < lat < max_lat
+    if max_lat < 90:
+        assert geo.distance_km(lat, lon, max_lat, lon) == (
+            pytest.approx(radius))
+    if min_lon is not None:
+        assert min_lon < lon < max_lon
+        # Points on the box edge are at least `radius` away
+        assert geo.distance_km(lat, lon, lat, max_lon) >= radius
+
+
+def test_nearest_venues(db):
+    nearby = geo.nearest_venues(db, 49.2, 16.6, radius_km=1.2)
+    assert [n.venue.slug for n in nearby] == ['u-drevaka', 'u-dreveneho-orla']
+    assert nearby[0].distance < nearby[1].distance < 1.2
+
+
+def test_nearest_venues_limit(db):
+    nearby = geo.nearest_venues(db, 49.2, 16.6, radius_km=1000, limit=4)
+    assert len(nearby) == 4
+    assert all(n.venue.city_slug == 'brno' for n in nearby[:3])
+
+
+def test_nearest_venues_none(db):
+    assert geo.nearest_venues(db, -33.86, 151.21) == []
+
+
+def test_nearby_events(db):
+    nearby = geo.nearby_events(db, 49.84, 18.28, radius_km=2,
+                               since=datetime.date(2014, 8, 1))
+    venue_slugs = [n.venue.slug for n in nearby]
+    assert venue_slugs == ['vr-levsky', 'sport-club', 'ires-sc']
+    events = list(nearby.values())
+    assert [e.date.isoformat() for e in events[0]] == [
+        '2014-08-07', '2014-10-02', '2014-11-06']
+    assert events[1] == events[2] == []
+
+
+@pytest.mark.parametrize(['value', 'expected'], [
+    [49.1931942776, '49.1931942776'],
+    [16.6008957, '16.6008957'],
+    [14.0, '14'],
+    [-0.5, '-0.5'],
+])
+def test_format_coordinate(value, expected):
+    assert geo.format_coordinate(value) == expected
@@ -0,0 +1,64 @@
+import os
+import datetime
+
+from pyvodb import ics
+
+NOW = datetime.datetime(2014, 8, 7, 12, 0, 0)
+
+
+def test_fold_line():
+    line = 'DESCRIPTION:' + 'ř' * 100
+    folded = ics.fold_line(line)
+    assert all(len(l.encode('utf-8')) <= 75 for l in folded)
+    assert all(l.startswith(' ') for l in folded[1:])
+    assert folded[0] + ''.join(l[1:] for l in folded[1:]) == line
+
+
+def test_escape_text():
+    assert ics.escape_text('a, b; c\\d\ne') == 'a\\, b\\; c\\\\d\\ne'
+
+
+def test_city_feed(db):
+    lines = list(ics.generate_feed(db, 'Ostrava', city_slug='ostrava',
+                                   now=NOW))
+    assert lines[0] == 'BEGIN:VCALENDAR'
+    assert lines[-1] == 'END:VCALENDAR'
+    assert lines.count('BEGIN:VEVENT') == 5
+    assert 'UID:pyvo-ostrava-pyvo-2013-12-04@pyvo.cz' in lines
+    # 19:00 CET is 18:00 UTC
+    assert 'DTSTART:20131204T180000Z' in lines
+    assert 'SUMMARY:Ostravské Pyvo – Druhé' in lines
+    assert 'LOCATION:Sport Club\\, Vítězná 2\\, Moravská Ostrava\\, 70200' in lines
+    assert 'STATUS:TENTATIVE' not in lines
+
+
+def test_series_feed_projected(db):
+    lines = list(ics.generate_feed(db, 'Brno', series_slug='brno-pyvo',
+                                   projected=2, now=NOW))
+    assert lines.count('BEGIN:VEVENT') == 7
+    assert lines.count('STATUS:TENTATIVE') == 2
+    assert 'UID:pyvo-brno-pyvo-2015-03-26-projected@pyvo.cz' in lines
+
+
+def test_write_all_feeds(db, tmpdir):
+    paths = ics.write_all_feeds(db, str(tmpdir), now=NOW)
+    assert os.path.join(str(tmpdir), 'all.ics') in paths
+    with open(os.path.join(str(tmpdir), 'cities', 'ostrava.ics'),
+              newline='') as f:
+        city_feed = f.read()
+    assert city_feed == '\r\n'.join(
+        ics.generate_feed(db, 'Ostrava', city_slug='ostrava', now=NOW)
+    ) + '\r\n'
+    with open(os.path.join(str(tmpdir), 'all.ics'), newline='') as f:
+        assert f.read().count('BEGIN:VEVENT') == 15
+
+
+def test_write_all_feeds_unchanged(db, tmpdir):
+    statuses = ics.write_all_feeds(db, str(tmpdir), now=NOW)
+    assert set(statuses.values()) == {'created'}
+    statuses = ics.write_all_feeds(db, str(tmpdir), now=NOW)
+    assert set(statuses.values()) == {'unchanged'}
+    statuses = ics.write_all_feeds(db, str(tmpdir), projected=1, now=NOW)
+    path = os.path.join(str(tmpdir), 'series', 'brno-pyvo.ics')
+    assert statuses[path] == 'updated'
+    assert not [p for p in tmpdir.visit() if p.ext == '.new']
@@ -0,0 +1,81 @@
+import logging
+import datetime
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from pyvodb import tables
+from pyvodb.cli import cliutil
+from pyvodb.load import get_db
+from pyvodb.instrumentation import count_queries, normalize_sql
+from pyvodb.instrumentation import QueryCounter, QueryBudgetExceeded
+
+
+@pytest.mark.parametrize(['statement', 'expected'], [
+    ['SELECT  *\n FROM events', 'SELECT * FROM events'],
+    ["SELECT * FROM events WHERE id = 3 AND name = 'it''s'",
+     'SELECT * FROM events WHERE id = ? AND name = ?'],
+    ['SELECT * FROM talks WHERE event_id IN (?, ?,?)',
+     'SELECT * FROM talks WHERE event_id IN (...)'],
+    ['SELECT anon_1.x FROM t1', 'SELECT anon_1.x FROM t1'],
+])
+def test_normalize_sql(statement, expected):
+    assert normalize_sql(statement) == expected
+
+
+def test_count_queries(db):
+    with count_queries(db) as counter:
+        query = db.query(tables.Event).order_by(tables.Event.date).limit(3)
+        for event in query:
+            event.talks
+    # One query for the events, then one lazy load of talks for each
+    assert counter.count == 4
+    counts = sorted(s.count for s in counter.statements.values())
+    assert counts == [1, 3]
+    assert counter.seconds > 0
+    assert 'SQL statements: 4' in counter.format_summary()
+
+
+def test_count_queries_detached(db):
+    with count_queries(db) as counter:
+        pass
+    db.query(tables.Event).all()
+    assert counter.count == 0
+
+
+def test_failed_query(data_directory):
+    # (rolling back would discard the data of the shared `db` fixture)
+    db = get_db(data_directory)
+    with count_queries(db) as counter:
+        with pytest.raises(OperationalError):
+            db.execute('SELECT * FROM no_such_table')
+        db.rollback()
+        db.query(tables.City).all()
+        assert not db.connection().info.get('pyvodb_query_start')
+    assert counter.count == 2
+    assert 'SELECT * FROM no_such_table' in counter.statements
+
+
+def test_query_budget(db):
+    with pytest.raises(QueryBudgetExceeded):
+        with count_queries(db, max_queries=1):
+            db.query(tables.Event).all()
+            db.query(tables.City).all()
+
+
+def test_get_event_query_budget(db):
+    db.expire_all()
+    with count_queries(db, max_queries=2):
+        cliutil.get_event(db, 'brno', '2013-05', datetime.date(2014, 1, 1))
+
+
+def test_slow_queries(db, caplog):
+    counter = QueryCounter(slow_threshold=0)
+    counter.attach(db.get_bind())
+    try:
+        with caplog.at_level(logging.WARNING):
+            db.query(tables.City).all()
+    finally:
+        counter.detach()
+    assert len(counter.slow_queries) == 1
+    assert 'Slow query' in caplog.text
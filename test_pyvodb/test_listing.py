@@ -0,0 +1,131 @@
+import datetime
+
+import pytest
+from sqlalchemy import event
+
+from pyvodb import listing, tables
+from pyvodb.cli import cliutil
+
+
+def _all_events(db, **filters):
+    query = db.query(tables.Event).filter_by(**filters)
+    return query.order_by(tables.Event.date, tables.Event.start_time,
+                          tables.Event.id).all()
+
+
+def _pages(db, direction='next', **kwargs):
+    page = listing.list_events(db, **kwargs)
+    pages = [page]
+    while getattr(page, direction) is not None:
+        page = listing.list_events(db, getattr(page, direction),
+                                   limit=kwargs.get('limit', 20))
+        pages.append(page)
+    return pages
+
+
+@pytest.mark.parametrize('filters', [
+    {}, {'city_slug': 'brno'}, {'series_slug': 'ostrava-pyvo'}])
+@pytest.mark.parametrize('limit', [1, 4, 100])
+def test_paging(db, filters, limit):
+    expected = _all_events(db, **filters)
+    pages = _pages(db, limit=limit, **filters)
+    assert [e for p in pages for e in p.events] == expected
+    assert all(len(p.events) <= limit for p in pages)
+    assert pages[0].previous is None
+    assert pages[-1].next is None
+
+    # Going back from the last page gives the same pages
+    back_pages = [pages[-1]]
+    while back_pages[-1].previous is not None:
+        back_pages.append(listing.list_events(db, back_pages[-1].previous,
+                                              limit=limit))
+    assert [p.events for p in back_pages] == [p.events for p in pages[::-1]]
+
+
+def test_newest_first(db):
+    pages = _pages(db, limit=4, city_slug='brno', newest_first=True)
+    events = [e for p in pages for e in p.events]
+    assert events == _all_events(db, city_slug='brno')[::-1]
+
+
+@pytest.mark.parametrize('newest_first', [False, True])
+def test_start(db, newest_first):
+    start = datetime.date(2014, 1, 1)
+    page = listing.list_events(db, limit=2, city_slug='brno', start=start,
+                               newest_first=newest_first)
+    if newest_first:
+        assert [e.date for e in page.events] == [
+            datetime.date(2013, 5, 30), datetime.date(2012, 11, 29)]
+    else:
+        assert [e.date for e in page.events] == [
+            datetime.date(2014, 2, 27), datetime.date(2014, 7, 31)]
+    assert page.next is not None
+    previous = listing.list_events(db, page.previous, limit=100)
+    assert previous.next is not None
+    events = previous.events + page.events
+    assert events == sorted(events, key=listing._key,
+                            reverse=newest_first)
+
+
+@pytest.mark.parametrize('newest_first', [False, True])
+def test_nth_event(db, newest_first):
+    start = datetime.date(2014, 1, 1)
+    page = listing.list_events(db, limit=100, city_slug='brno', start=start,
+                               newest_first=newest_first)
+    assert [listing.nth_event(db, n, city_slug='brno', start=start,
+                              newest_first=newest_first)
+            for n in range(1, len(page.events) + 1)] == page.events
+    assert listing.nth_event(db, len(page.events) + 1, city_slug='brno',
+                             start=start, newest_first=newest_first) is None
+
+
+@pytest.mark.parametrize('date', ['', 'p3', '+2'])
+def test_relative_event_without_offset(db, date):
+    statements = []
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    engine = db.get_bind()
+    event.listen(engine, 'before_cursor_execute', before)
+    try:
+        cliutil.get_event(db, 'brno', date, datetime.date(2014, 1, 1))
+    finally:
+        event.remove(engine, 'before_cursor_execute', before)
+    assert statements
+    for statement, parameters in statements:
+        # SQLite always gets an OFFSET with LIMIT; no rows may be skipped
+        if 'OFFSET' in statement:
+            assert statement.rstrip().endswith('OFFSET ?')
+            assert parameters[-1] == 0
+
+
+def test_cursor_with_microseconds(db):
+    key = (datetime.date(2014, 1, 1), datetime.time(19, 0, 0, 500), 1)
+    cursor = listing._encode_cursor('brno', None, False, False, key)
+    assert listing._decode_cursor(cursor) == ('brno', None, False, False, key)
+
+
+def test_empty(db):
+    page = listing.list_events(db, city_slug='brno',
+                               start=datetime.date(2100, 1, 1))
+    assert page == listing.Page([], None, None)
+
+
+def test_cursor_is_opaque_string(db):
+    page = listing.list_events(db, limit=1)
+    assert isinstance(page.next, str)
+    assert page.next.isprintable()
+    assert '=' not in page.next
+
+
+@pytest.mark.parametrize('cursor', ['', 'garbage', 'WzEsMl0'])
+def test_invalid_cursor(db, cursor):
+    with pytest.raises(ValueError):
+        listing.list_events(db, cursor)
+
+
+def test_cursor_with_options(db):
+    page = listing.list_events(db, limit=1)
+    with pytest.raises(ValueError):
+        listing.list_events(db, page.next, city_slug='brno')
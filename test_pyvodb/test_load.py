@@ -1,9 +1,20 @@
+import os
+import sys
+import copy
+import shutil
+import tarfile
+import zipfile
+import datetime
+
 import pytest
 
 from sqlalchemy.exc import IntegrityError
 
-from pyvodb.load import get_db, load_from_directory
-from pyvodb.tables import Event, City, Venue
+from pyvodb.load import get_db, load_from_directory, LoadProfile
+from pyvodb.load import load_from_dict, dict_from_directory, load_yaml_file
+from pyvodb import gitload, packload, tables
+from pyvodb.tables import Event, City, Venue, Talk, TalkLink, Series
+
 
 @pytest.fixture
 def empty_db(data_directory):
@@ -241,3 +252,402 @@ def test_talk_description(db):
     event = query.one()
     assert event.talks[1].description.startswith(
         'Modelling API in Rest API Markup Language.\n')
+
+def test_talk_link_hostname(db):
+    query = db.query(Event)
+    query = query.filter(Event.year == 2013)
+    query = query.filter(Event.month == 5)
+    query = query.filter(Event.day == 30)
+    event = query.one()
+    talk = event.talks[0]
+    assert [s.hostname for s in talk.links] == [
+        'lanyrd.com', 'www.youtube.com', 'youtu.be']
+
+def test_talk_link_youtube_id_query(db):
+    query = db.query(TalkLink)
+    query = query.filter(TalkLink.youtube_id == 'HDmCGUKfe7Y')
+    assert [l.kind for l in query.order_by(TalkLink.index)] == [
+        'video', 'writeup']
+
+def test_talk_link_computed_columns(empty_db):
+    """Columns derived from the URL are filled for links added via the ORM
+    """
+    event = Event(name='Test', date=datetime.date(2020, 1, 1),
+                  city=City(slug='test', name='Test',
+                            latitude=0, longitude=0),
+                  series_slug='test')
+    talk = Talk(title='Test', index=0, event=event)
+    talk.links.append(TalkLink(url='https://youtu.be/abc', kind='video'))
+    empty_db.add(talk)
+    empty_db.flush()
+    empty_db.expire_all()
+    [link] = empty_db.query(TalkLink)
+    assert link.youtube_id == 'abc'
+    assert link.hostname == 'youtu.be'
+    assert event.id == tables.stable_id('event', 'test', event.date)
+    assert talk.id == tables.stable_id('talk', event.id, 0)
+
+def test_talk_link_url_change(empty_db):
+    """Columns derived from the URL follow changes of the URL"""
+    link = TalkLink(url='https://youtu.be/abc', kind='video')
+    # Set without a flush
+    assert link.youtube_id == 'abc'
+    assert link.hostname == 'youtu.be'
+    link.url = 'https://example.com/slides'
+    assert link.youtube_id is None
+    assert link.hostname == 'example.com'
+    event = Event(name='Test', date=datetime.date(2020, 1, 1),
+                  city=City(slug='test', name='Test',
+                            latitude=0, longitude=0),
+                  series_slug='test')
+    talk = Talk(title='Test', index=0, event=event)
+    talk.links.append(link)
+    empty_db.add(talk)
+    empty_db.flush()
+    link.url = 'https://www.youtube.com/watch?v=xyz'
+    empty_db.flush()
+    empty_db.expire_all()
+    [link] = empty_db.query(TalkLink)
+    assert link.youtube_id == 'xyz'
+    assert link.hostname == 'www.youtube.com'
+
+def _listing_columns(event):
+    return event.city_name, event.venue_name, event.talk_count, event.has_video
+
+
+def test_listing_columns(db):
+    events = db.query(Event).all()
+    assert events
+    for event in events:
+        assert _listing_columns(event) == (
+            event.city.name,
+            event.venue.name if event.venue else None,
+            len(event.talks),
+            any(link.youtube_id for talk in event.talks
+                for link in talk.links),
+        )
+    [event] = db.query(Event).filter(Event.date == datetime.date(2013, 5, 30))
+    assert _listing_columns(event) == ('Brno', 'U Dřeváka', 2, True)
+
+
+def test_load_profile(data_directory):
+    measurements = []
+    profile = LoadProfile(callback=lambda *args: measurements.append(args))
+    db = get_db(data_directory, profile=profile)
+    assert list(profile.phases) == [
+        'parse', 'listdir', 'build', 'insert', 'index']
+    # 1 meta.yaml, 3 city.yaml, 8 venues, 4 series.yaml, 16 events
+    assert profile.phases['parse'].count == 32
+    assert profile.tables['events'].count == db.query(Event).count()
+    assert profile.phases['insert'].count == sum(
+        s.count for s in profile.tables.values())
+    assert profile.total_seconds > 0
+    assert ('insert', 'cities', profile.tables['cities'].seconds, 3) in (
+        measurements)
+    assert profile.format().splitlines()[-1].startswith('total')
+
+@pytest.mark.parametrize('consume', [False, True])
+def test_load_from_dict_consume(data_directory, consume):
+    metadata = load_yaml_file(os.path.join(data_directory, 'meta.yaml'))
+    data = dict_from_directory('.', data_directory,
+                               ignored_files=metadata['ignored_files'])
+    original = copy.deepcopy(data)
+    db = get_db(None)
+    load_from_dict(db, data, metadata, consume=consume)
+    assert db.query(Event).count() == 15
+    if consume:
+        assert set(data) == {'meta'}
+    else:
+        assert data == original
+
+def test_slugs_interned(data_directory):
+    metadata = load_yaml_file(os.path.join(data_directory, 'meta.yaml'))
+    data = dict_from_directory('.', data_directory,
+                               ignored_files=metadata['ignored_files'])
+    slugs = [*data['cities'], *data['series'],
+             *data['cities']['brno']['venues']]
+    assert all(slug is sys.intern(slug) for slug in slugs)
+
+def _event_dicts(db):
+    return sorted((e._source, e.as_dict()) for e in db.query(Event))
+
+def _content_hashes(db):
+    return {
+        **{('event', e._source): e.content_hash for e in db.query(Event)},
+        **{('city', c.slug): c.content_hash for c in db.query(City)},
+        **{('series', s.slug): s.content_hash for s in db.query(Series)},
+    }
+
+def _edit(path, old, new):
+    with open(path, encoding='utf-8') as f:
+        content = f.read()
+    assert old in content
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content.replace(old, new))
+
+def test_content_hashes(db, data_directory):
+    hashes = _content_hashes(db)
+    assert all(hashes.values())
+    assert len(set(hashes.values())) == len(hashes)
+    assert _content_hashes(get_db(data_directory)) == hashes
+    event = db.query(Event).filter(Event.content_hash == hashes[
+        'event', './series/brno-pyvo/events/2013-05-30-gui.yaml']).one()
+    assert event.date == datetime.date(2013, 5, 30)
+
+def test_content_hashes_change(db, data_directory, tmp_path):
+    datadir = str(tmp_path / 'data')
+    shutil.copytree(data_directory, datadir)
+    event_source = './series/ostrava-pyvo/events/2014-08-07.yaml'
+    _edit(os.path.join(datadir, event_source), 'KinoPyvo', 'KinoPyvo 2')
+    _edit(os.path.join(datadir, 'cities/praha/city.yaml'),
+          'name:', '# Comment\nname:')
+
+    old_hashes = _content_hashes(db)
+    new_hashes = _content_hashes(get_db(datadir))
+    assert {k for k in old_hashes if old_hashes[k] != new_hashes[k]} == {
+        ('event', event_source), ('city', 'ostrava'),
+        ('series', 'ostrava-pyvo')}
+
+    # Venues are part of the hashes of their events
+    _edit(os.path.join(datadir, 'cities/ostrava/venues/vr-levsky.yaml'),
+          'Škroupova', 'Skroupova')
+    venue_hashes = _content_hashes(get_db(datadir))
+    changed = {k for k in new_hashes if new_hashes[k] != venue_hashes[k]}
+    events = './series/ostrava-pyvo/events/'
+    assert changed == {
+        ('event', events + '2014-08-07.yaml'),
+        ('event', events + '2014-10-02-balis-balim-balime.yaml'),
+        ('event', events + '2014-11-06-testovaci.yaml'),
+        ('city', 'ostrava'), ('series', 'ostrava-pyvo')}
+
+def _pack(data_directory, path, arcname):
+    """Pack the data directory; add an extra file in the ignored `tests`"""
+    if str(path).endswith('.zip'):
+        with zipfile.ZipFile(str(path), 'w') as pack:
+            for dirpath, dirnames, filenames in os.walk(data_directory):
+                for filename in filenames:
+                    fullname = os.path.join(dirpath, filename)
+                    pack.write(fullname, os.path.join(
+                        arcname, os.path.relpath(fullname, data_directory)))
+            pack.writestr(arcname + '/tests/extra.txt', 'not data')
+    else:
+        with tarfile.open(str(path), 'w:gz') as pack:
+            pack.add(data_directory, arcname)
+    return str(path)
+
+@pytest.mark.parametrize('filename', ['data.tar.gz', 'data.tgz', 'data.zip'])
+@pytest.mark.parametrize('arcname', ['.', 'pyvo-data'])
+def test_load_from_pack(db, data_directory, tmp_path, filename, arcname):
+    path = _pack(data_directory, tmp_path / filename, arcname)
+    packed_db = get_db(path)
+    assert _event_dicts(packed_db) == _event_dicts(db)
+    assert _content_hashes(packed_db) == _content_hashes(db)
+    assert (sorted(c._source for c in packed_db.query(City)) ==
+            sorted(c._source for c in db.query(City)))
+
+def test_load_from_zstd_pack(db, data_directory, tmp_path):
+    zstandard = pytest.importorskip('zstandard')
+    tar_path = _pack(data_directory, tmp_path / 'data.tar.gz', '.')
+    path = str(tmp_path / 'data.tar.zst')
+    with tarfile.open(tar_path) as src, open(path, 'wb') as f:
+        with zstandard.ZstdCompressor().stream_writer(f) as writer:
+            with tarfile.open(fileobj=writer, mode='w|') as dest:
+                for member in src:
+                    dest.addfile(member, src.extractfile(member))
+    assert _event_dicts(get_db(path)) == _event_dicts(db)
+
+def test_load_from_zstd_pack_without_zstandard(tmp_path, monkeypatch):
+    path = tmp_path / 'data.tar.zst'
+    path.write_bytes(b'')
+    monkeypatch.setitem(sys.modules, 'zstandard', None)
+    with pytest.raises(packload.PackError, match='zstandard'):
+        get_db(str(path))
+
+def test_pack_unexpected_file(data_directory, tmp_path):
+    path = tmp_path / 'data.zip'
+    _pack(data_directory, path, '.')
+    with zipfile.ZipFile(str(path), 'a') as pack:
+        pack.writestr('series/notes.txt', 'unexpected')
+    with pytest.raises(ValueError, match='Unexpected file'):
+        get_db(str(path))
+
+def test_pack_without_meta(tmp_path):
+    path = tmp_path / 'data.zip'
+    with zipfile.ZipFile(str(path), 'w') as pack:
+        pack.writestr('cities/x/city.yaml', 'name: X')
+    with pytest.raises(ValueError, match='meta.yaml'):
+        get_db(str(path))
+
+def test_pack_unsafe_path(tmp_path):
+    path = tmp_path / 'data.zip'
+    with zipfile.ZipFile(str(path), 'w') as pack:
+        pack.writestr('../meta.yaml', '{}')
+    with pytest.raises(packload.PackError, match='Unsafe'):
+        get_db(str(path))
+
+@pytest.fixture
+def overlay(tmp_path, data_directory):
+    """An overlay directory that changes one event and adds another"""
+    path = tmp_path / 'overlay'
+    events = path / 'series/ostrava-pyvo/events'
+    events.mkdir(parents=True)
+    with open(os.path.join(data_directory, 'series/ostrava-pyvo/events',
+                           '2014-08-07.yaml'), encoding='utf-8') as f:
+        content = f.read()
+    (events / '2014-08-07.yaml').write_text(
+        content.replace('KinoPyvo', 'KinoPyvo (draft)'), encoding='utf-8')
+    (events / '2014-09-04.yaml').write_text(
+        content.replace('2014-08-07', '2014-09-04'), encoding='utf-8')
+    (path / '.hidden').mkdir()
+    (path / '.hidden' / 'junk.txt').write_text('ignored')
+    return str(path)
+
+def test_load_overlay(db, data_directory, overlay):
+    overlay_db = get_db([data_directory, overlay])
+    events = './series/ostrava-pyvo/events/'
+    roots = {e._source: e._root for e in overlay_db.query(Event)}
+    assert len(roots) == db.query(Event).count() + 1
+    assert roots[events + '2014-08-07.yaml'] == overlay
+    assert roots[events + '2014-09-04.yaml'] == overlay
+    assert roots[events + '2013-11-07-prvni.yaml'] == data_directory
+    assert {c._root for c in overlay_db.query(City)} == {data_directory}
+
+    [event] = overlay_db.query(Event).filter(
+        Event.date == datetime.date(2014, 8, 7))
+    assert event.name == 'Ostravské KinoPyvo (draft)'
+
+    # Files that are not overridden give the same rows and hashes
+    old_hashes = _content_hashes(db)
+    new_hashes = _content_hashes(overlay_db)
+    assert {k for k in old_hashes if old_hashes[k] != new_hashes[k]} == {
+        ('event', events + '2014-08-07.yaml'), ('city', 'ostrava'),
+        ('series', 'ostrava-pyvo')}
+    assert all(e._root is None for e in db.query(Event))
+
+def test_load_overlay_precedence(db, data_directory, overlay):
+    # The base directory, listed last, wins
+    overlay_db = get_db([overlay, data_directory])
+    [event] = overlay_db.query(Event).filter(
+        Event.date == datetime.date(2014, 8, 7))
+    assert event.name == 'Ostravské KinoPyvo'
+    assert event._root == data_directory
+    assert overlay_db.query(Event).count() == db.query(Event).count() + 1
+
+def test_load_overlay_single(db, data_directory):
+    single_db = get_db([data_directory])
+    assert _event_dicts(single_db) == _event_dicts(db)
+    assert _content_hashes(single_db) == _content_hashes(db)
+
+def test_load_overlay_without_meta(tmp_path, overlay):
+    with pytest.raises(Exception, match='meta.yaml'):
+        get_db([overlay, str(tmp_path / 'overlay')])
+
+def test_load_overlay_options(data_directory, overlay, tmp_path):
+    with pytest.raises(ValueError):
+        get_db([data_directory, overlay], rev='HEAD')
+    with pytest.raises(ValueError):
+        get_db([data_directory, overlay],
+               archive=str(tmp_path / 'archive.sqlite'))
+    with pytest.raises(ValueError):
+        get_db([])
+
+def test_load_overlay_pack(data_directory, overlay, tmp_path):
+    path = _pack(data_directory, tmp_path / 'data.tar.gz', '.')
+    with pytest.raises(ValueError, match='Only data directories'):
+        get_db([path, overlay])
+
+def test_load_from_git(db, git_data):
+    cache = gitload.BlobCache()
+    git_db = get_db(str(git_data), rev='HEAD', blob_cache=cache)
+    assert _event_dicts(git_db) == _event_dicts(db)
+    assert git_db.query(City).count() == db.query(City).count()
+
+def test_load_from_git_revisions(git_data, git):
+    event_file = git_data / 'series/ostrava-pyvo/events/2014-08-07.yaml'
+    event_file.write_text(event_file.read_text().replace(
+        'KinoPyvo', 'KinoPyvo (changed)'))
+    new_file = git_data / 'series/ostrava-pyvo/events/2014-09-04.yaml'
+    new_file.write_text(event_file.read_text().replace(
+        '2014-08-07', '2014-09-04'))
+    git(git_data, 'commit', '-q', '-a', '-m', 'Change')
+    git(git_data, 'add', '.')
+    git(git_data, 'commit', '-q', '-m', 'Add')
+    # Uncommitted changes are not loaded
+    event_file.write_text('invalid: [')
+
+    cache = gitload.BlobCache()
+    old_db = get_db(str(git_data), rev='HEAD~2', blob_cache=cache)
+    assert old_db.query(Event).count() == 15
+    assert not old_db.query(Event).filter(Event.name.like('%changed%')).all()
+
+    profile = LoadProfile()
+    new_db = get_db(str(git_data), rev='HEAD', blob_cache=cache,
+                    profile=profile)
+    assert new_db.query(Event).count() == 16
+    assert new_db.query(Event).filter(Event.name.like('%changed%')).count() == 2
+    # Only the changed and the added file were parsed
+    assert profile.phases['parse'].count == 2
+
+def test_load_from_git_not_cached_by_default(git_data):
+    get_db(str(git_data), rev='HEAD')
+    profile = LoadProfile()
+    get_db(str(git_data), rev='HEAD', profile=profile)
+    # All 32 files were parsed again
+    assert profile.phases['parse'].count == 32
+
+def test_load_from_git_bad_rev(git_data):
+    with pytest.raises(gitload.GitError):
+        get_db(str(git_data), rev='no-such-rev')
+
+def _ids(db):
+    return {
+        **{('event', e._source): e.id for e in db.query(Event)},
+        **{('venue', v.city_slug, v.slug): v.id for v in db.query(Venue)},
+        **{('talk', t.event._source, t.index): t.id for t in db.query(Talk)},
+    }
+
+def test_stable_ids(db):
+    for event in db.query(Event):
+        assert event.id == tables.stable_id('event', event.series_slug,
+                                            event.date)
+        for talk in event.talks:
+            assert talk.id == tables.stable_id('talk', event.id, talk.index)
+    for venue in db.query(Venue):
+        assert venue.id == tables.stable_id('venue', venue.city_slug,
+                                            venue.slug)
+
+def test_ids_survive_unrelated_additions(db, data_directory, tmp_path):
+    datadir = tmp_path / 'data'
+    shutil.copytree(data_directory, str(datadir))
+    venues = datadir / 'cities/brno/venues'
+    (venues / 'a-new-venue.yaml').write_text(
+        (venues / 'u-drevaka.yaml').read_text(encoding='utf-8'),
+        encoding='utf-8')
+    events = datadir / 'series/brno-pyvo/events'
+    (events / '2010-01-01.yaml').write_text(
+        (events / '2013-05-30-gui.yaml').read_text(encoding='utf-8')
+        .replace('2013-05-30', '2010-01-01'),
+        encoding='utf-8')
+
+    old_ids = _ids(db)
+    new_ids = _ids(get_db(str(datadir)))
+    assert len(new_ids) > len(old_ids)
+    assert {k: new_ids[k] for k in old_ids} == old_ids
+
+def test_events_on_same_day(data_directory, tmp_path):
+    datadir = tmp_path / 'data'
+    shutil.copytree(data_directory, str(datadir))
+    events = datadir / 'series/brno-pyvo/events'
+    (events / 'another.yaml').write_text(
+        (events / '2013-05-30-gui.yaml').read_text(encoding='utf-8')
+        .replace('19:00', '10:00'),
+        encoding='utf-8')
+    with pytest.raises(ValueError) as excinfo:
+        get_db(str(datadir))
+    assert 'same day in the same series' in str(excinfo.value)
+
+def test_id_collision(data_directory, monkeypatch):
+    monkeypatch.setattr(tables, 'stable_id', lambda kind, *key: 1)
+    with pytest.raises(ValueError) as excinfo:
+        get_db(data_directory)
+    assert 'ID collision' in str(excinfo.value)
@@ -0,0 +1,128 @@
+import re
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from pyvodb import metrics, gitload, tables
+from pyvodb.load import get_db, LoadProfile
+
+
+@pytest.fixture
+def enabled_metrics():
+    metrics.reset()
+    metrics.enable()
+    try:
+        yield metrics
+    finally:
+        metrics.disable()
+        metrics.reset()
+
+
+def test_disabled_by_default(data_directory):
+    assert not metrics.enabled
+    metrics.reset()
+    get_db(data_directory)
+    assert metrics.LOADS.get() == 0
+    assert all(not m['samples'] for m in metrics.as_dict().values())
+
+
+def test_load_metrics(enabled_metrics, data_directory):
+    profile = LoadProfile()
+    db = get_db(data_directory, profile=profile)
+    num_events = db.query(tables.Event).count()
+
+    assert metrics.LOADS.get() == 1
+    assert metrics.LOAD_SECONDS.get()[0] == 1
+    assert metrics.ROWS_INSERTED.get(table='events') == num_events
+    assert (metrics.YAML_FILES_PARSED.get() ==
+            profile.phases['parse'].count == 32)
+    assert (metrics.LOAD_PHASE_SECONDS.get(phase='insert') ==
+            pytest.approx(profile.phases['insert'].seconds))
+    assert metrics.DB_GENERATION.get() == 1
+
+    get_db(data_directory)
+    assert metrics.LOADS.get() == 2
+    assert metrics.DB_GENERATION.get() == 2
+    assert metrics.ROWS_INSERTED.get(table='events') == 2 * num_events
+
+
+def test_query_metrics(enabled_metrics, data_directory):
+    db = get_db(data_directory)
+    selects = metrics.QUERIES.get(statement='SELECT')
+    db.query(tables.Event).all()
+    db.query(tables.City).all()
+    assert metrics.QUERIES.get(statement='SELECT') == selects + 2
+    count, seconds = metrics.QUERY_SECONDS.get(statement='SELECT')
+    assert count == selects + 2
+    assert seconds > 0
+
+    metrics.disable()
+    db.query(tables.City).all()
+    assert metrics.QUERIES.get(statement='SELECT') == selects + 2
+    # Nothing is recorded for statements run while disabled
+    assert not db.connection().info.get('pyvodb_metrics_start')
+
+
+def test_failed_query_metrics(enabled_metrics, data_directory):
+    db = get_db(data_directory)
+    selects = metrics.QUERIES.get(statement='SELECT')
+    with pytest.raises(OperationalError):
+        db.execute('SELECT * FROM no_such_table')
+    db.rollback()
+    assert metrics.QUERIES.get(statement='SELECT') == selects + 1
+    assert not db.connection().info.get('pyvodb_metrics_start')
+
+
+def test_cache_metrics(enabled_metrics, git_data):
+    cache = gitload.BlobCache()
+    get_db(str(git_data), rev='HEAD', blob_cache=cache)
+    misses = metrics.CACHE_LOOKUPS.get(cache='blob', result='miss')
+    hits = metrics.CACHE_LOOKUPS.get(cache='blob', result='hit')
+    assert misses > 0
+    # The second load finds everything in the cache
+    get_db(str(git_data), rev='HEAD', blob_cache=cache)
+    assert metrics.CACHE_LOOKUPS.get(cache='blob', result='miss') == misses
+    assert (metrics.CACHE_LOOKUPS.get(cache='blob', result='hit') ==
+            2 * hits + misses)
+
+
+def test_as_dict(enabled_metrics, data_directory):
+    get_db(data_directory)
+    result = metrics.as_dict()
+    assert result['pyvodb_loads_total']['type'] == 'counter'
+    assert result['pyvodb_loads_total']['samples'] == [
+        {'labels': {}, 'value': 1}]
+    [load] = result['pyvodb_load_seconds']['samples']
+    assert load['count'] == 1
+    assert load['buckets'][-1] == [float('inf'), 1]
+    [age] = result['pyvodb_db_age_seconds']['samples']
+    assert 0 <= age['value'] < 60
+
+
+def test_format_prometheus(enabled_metrics, data_directory):
+    db = get_db(data_directory)
+    num_events = db.query(tables.Event).count()
+    text = metrics.format_prometheus()
+    assert text.endswith('\n')
+    lines = text.splitlines()
+    assert '# TYPE pyvodb_loads_total counter' in lines
+    assert 'pyvodb_loads_total 1' in lines
+    assert 'pyvodb_rows_inserted_total{{table="events"}} {}'.format(
+        num_events) in lines
+    assert 'pyvodb_load_seconds_bucket{le="+Inf"} 1' in lines
+    assert 'pyvodb_load_seconds_count 1' in lines
+    sample_re = re.compile(r'^[a-z_]+(\{[a-z]+="[^"]*"(,[a-z]+="[^"]*")*\})? '
+                           r'[-+0-9.e]+(Inf)?$')
+    for line in lines:
+        assert line.startswith('# ') or sample_re.match(line), line
+
+
+def test_label_escaping(enabled_metrics):
+    metrics.CACHE_LOOKUPS.inc(cache='a"b\\c\nd', result='hit')
+    assert ('pyvodb_cache_lookups_total{cache="a\\"b\\\\c\\nd",result="hit"} 1'
+            in metrics.format_prometheus().splitlines())
+
+
+def test_missing_labels(enabled_metrics):
+    with pytest.raises(ValueError):
+        metrics.ROWS_INSERTED.inc()
@@ -0,0 +1,58 @@
+import pytest
+
+from pyvodb import prefix
+from pyvodb.load import get_db
+
+
+@pytest.fixture
+def index():
+    return prefix.PrefixIndex([
+        ('brno', 'Brno'),
+        ('brno-venkov', 'Brno-venkov'),
+        ('praha', 'Praha'),
+        ('ostrava', 'Ostrava'),
+        ('ova', 'Zlín'),
+        ('kladno', 'Praha-západ'),
+    ])
+
+
+@pytest.mark.parametrize(['text', 'status', 'slugs'], [
+    ['p', prefix.UNIQUE, ['praha']],
+    ['PRA', prefix.UNIQUE, ['praha']],
+    ['praha-', prefix.UNIQUE, ['kladno']],
+    ['brno-', prefix.UNIQUE, ['brno-venkov']],
+    ['brno', prefix.UNIQUE, ['brno']],
+    ['br', prefix.AMBIGUOUS, ['brno', 'brno-venkov']],
+    ['o', prefix.AMBIGUOUS, ['ostrava', 'ova']],
+    ['zl', prefix.UNIQUE, ['ova']],
+    ['x', prefix.NONE, []],
+    ['', prefix.AMBIGUOUS, ['brno', 'brno-venkov', 'kladno', 'ostrava',
+                            'ova', 'praha']],
+])
+def test_lookup(index, text, status, slugs):
+    assert index.lookup(text) == (status, slugs)
+
+
+def test_len(index):
+    assert len(index) == 6
+
+
+def test_complete(index):
+    # Completion offers slugs and names, unlike lookup
+    assert index.complete('p') == ['kladno', 'praha']
+
+
+def test_loaded_indexes(db):
+    assert prefix.get_index(db, 'city').complete('') == [
+        'brno', 'ostrava', 'praha']
+    assert prefix.get_index(db, 'series').lookup('praha').slugs == [
+        'praha-pyvo']
+    assert prefix.get_index(db, 'speaker').complete('petr') == [
+        'Petr Viktorin']
+
+
+def test_index_built_on_demand(db):
+    # A session that was not populated by the loader
+    other_db = get_db(None, engine=db.get_bind())
+    assert 'prefix_indexes' not in other_db.info
+    assert prefix.get_index(other_db, 'city').complete('os') == ['ostrava']
@@ -0,0 +1,75 @@
+import datetime
+
+import pytest
+
+from pyvodb import queries, tables, prefix
+
+
+def _query_events(db, *conditions):
+    return db.query(tables.Event).filter(*conditions).order_by(
+        tables.Event.date, tables.Event.start_time, tables.Event.id).all()
+
+
+def test_events_by_city_date(db):
+    date = datetime.date(2013, 5, 30)
+    events = queries.events_by_city_date(db, 'brno', date)
+    assert [e.title for e in events] == ['Brněnské PyVo + BRUG – GUI']
+    assert queries.events_by_city_date(db, 'praha', date) == []
+
+
+@pytest.mark.parametrize('filters', [
+    {}, {'city_slug': 'brno'}, {'series_slugs': ['brno-pyvo']},
+    {'series_slugs': []}])
+def test_events_in_range(db, filters):
+    start = datetime.date(2013, 1, 1)
+    end = datetime.date(2014, 1, 1)
+    conditions = [tables.Event.date >= start, tables.Event.date < end]
+    if 'city_slug' in filters:
+        conditions.append(tables.Event.city_slug == filters['city_slug'])
+    if 'series_slugs' in filters:
+        conditions.append(tables.Event.series_slug.in_(
+            filters['series_slugs']))
+    expected = _query_events(db, *conditions)
+    assert queries.events_in_range(db, start, end, **filters) == expected
+    if filters.get('series_slugs') != []:
+        assert expected
+
+
+def test_events_in_range_city_and_series(db):
+    with pytest.raises(ValueError):
+        queries.events_in_range(db, datetime.date(2013, 1, 1),
+                                datetime.date(2014, 1, 1),
+                                city_slug='brno', series_slugs=['brno-pyvo'])
+
+
+def test_latest_event(db):
+    expected = _query_events(db, tables.Event.series_slug == 'brno-pyvo')[-1]
+    assert queries.latest_event(db, 'brno-pyvo') is expected
+    assert queries.latest_event(db, 'nonexistent') is None
+
+
+@pytest.mark.parametrize(['text', 'status', 'city_slug'], [
+    ('brno', prefix.UNIQUE, 'brno'),
+    ('br', prefix.UNIQUE, 'brno'),
+    ('nonexistent', prefix.NONE, None),
+])
+def test_city_by_prefix(db, text, status, city_slug):
+    match, city = queries.city_by_prefix(db, text)
+    assert match.status == status
+    if city_slug is None:
+        assert city is None
+    else:
+        assert city.slug == city_slug
+
+
+def test_talks_by_speaker(db):
+    [speaker_slug] = db.query(tables.TalkSpeaker.speaker_slug).filter(
+        tables.TalkSpeaker.talk_id == db.query(tables.Talk.id).limit(1)
+        .scalar_subquery()).limit(1).one()
+    talks = queries.talks_by_speaker(db, speaker_slug)
+    assert talks
+    assert all(speaker_slug in [s.slug for s in talk.speakers]
+               for talk in talks)
+    dates = [talk.event.date for talk in talks]
+    assert dates == sorted(dates, reverse=True)
+    assert queries.talks_by_speaker(db, 'nonexistent') == []
@@ -0,0 +1,52 @@
+import pytest
+
+from pyvodb.load import get_db
+from pyvodb import search
+
+
+@pytest.fixture(scope='module')
+def fulltext_db(data_directory):
+    return get_db(data_directory, fulltext=True)
+
+
+def test_index_optional():
+    assert not search.has_index(get_db(None))
+
+
+def test_index_built(fulltext_db):
+    assert search.has_index(fulltext_db)
+
+
+def test_search_talk(fulltext_db):
+    [result] = search.search(fulltext_db, 'autoscaling')
+    assert result.talk.title == 'Docker & Autoscaling'
+    assert result.event.topic == 'Zase Docker'
+    assert result.snippet == 'Docker & [Autoscaling]'
+
+
+def test_search_ranking(fulltext_db):
+    results = search.search(fulltext_db, 'docker')
+    # Title matches rank above description matches
+    assert results[0].talk is None
+    assert results[0].event.topic == 'Zase Docker'
+    assert [r.rank for r in results] == sorted(r.rank for r in results)
+
+
+def test_search_speaker(fulltext_db):
+    results = search.search(fulltext_db, 'Viktorin')
+    assert results
+    assert all('Petr Viktorin' in [s.name for s in r.talk.speakers]
+               for r in results)
+
+
+def test_search_diacritics(fulltext_db):
+    assert search.search(fulltext_db, 'prazske')
+
+
+def test_search_punctuation(fulltext_db):
+    assert search.search(fulltext_db, 'docker-') == search.search(
+        fulltext_db, 'docker')
+
+
+def test_search_limit(fulltext_db):
+    assert len(search.search(fulltext_db, 'pyvo', limit=2)) == 2
@@ -0,0 +1,99 @@
+import os
+import datetime
+
+import pytest
+from sqlalchemy.orm.exc import NoResultFound
+
+from pyvodb import snapshot, tables
+from pyvodb.load import load_yaml_file, dict_from_directory
+
+
+@pytest.fixture(scope='module')
+def snap(db):
+    return snapshot.from_db(db)
+
+
+def test_as_dict_matches_orm(db, snap):
+    orm_events = db.query(tables.Event).all()
+    assert len(snap.events) == len(orm_events)
+    for event in orm_events:
+        [snap_event] = [e for e in snap.events if e.id == event.id]
+        assert snap_event.as_dict() == event.as_dict()
+        assert snap_event.title == event.title
+        assert snap_event.start == event.start
+        assert snap_event.slug == event.slug
+        assert snap_event.year == event.year
+
+
+def test_events_chronological(snap):
+    dates = [e.date for e in snap.events]
+    assert dates == sorted(dates)
+
+
+def test_relationships(db, snap):
+    city = snap.cities['brno']
+    orm_city = db.query(tables.City).get('brno')
+    assert [e.id for e in city.events] == [e.id for e in orm_city.events]
+    assert {v.slug for v in city.venues} == {v.slug for v in orm_city.venues}
+    assert all(v.city is city for v in city.venues)
+    for event in city.events:
+        assert event.city is city
+        assert event in event.series.events
+        for talk in event.talks:
+            assert talk.event is event
+            for speaker in talk.speakers:
+                assert talk in speaker.talks
+            for link in talk.links:
+                assert link.talk is talk
+
+
+def test_venue(snap):
+    [venue] = [v for v in snap.venues.values() if v.slug == 'u-drevaka']
+    assert venue.short_address == 'Dřevařská 22, 602 00'
+    assert venue.events
+    assert all(e.venue is venue for e in venue.events)
+
+
+def test_next_occurrences(db, snap):
+    since = datetime.date(2014, 1, 1)
+    for series in db.query(tables.Series):
+        snap_series = snap.series[series.slug]
+        assert (list(snap_series.next_occurrences(n=3, since=since)) ==
+                list(series.next_occurrences(n=3, since=since)))
+
+
+def test_read_only(snap):
+    event = snap.events[0]
+    with pytest.raises(AttributeError):
+        event.name = 'Changed'
+    with pytest.raises(AttributeError):
+        del event.city
+    with pytest.raises(AttributeError):
+        event.new_attribute = 1
+    with pytest.raises(TypeError):
+        snap.cities['new'] = None
+    assert not hasattr(event, '__dict__')
+
+
+def test_from_dict(data_directory, snap):
+    metadata = load_yaml_file(os.path.join(data_directory, 'meta.yaml'))
+    data = dict_from_directory('.', data_directory,
+                               ignored_files=metadata['ignored_files'])
+    from_dict = snapshot.from_dict(data, metadata)
+    assert ([e.as_dict() for e in from_dict.events] ==
+            [e.as_dict() for e in snap.events])
+
+
+def test_next_occurrences_without_events(data_directory):
+    metadata = load_yaml_file(os.path.join(data_directory, 'meta.yaml'))
+    data = dict_from_directory('.', data_directory,
+                               ignored_files=metadata['ignored_files'])
+    data['series']['brno-pyvo-rruletest']['events'] = {}
+    series = snapshot.from_dict(data, metadata).series['brno-pyvo-rruletest']
+    assert series.events == ()
+    occurrences = series.next_occurrences(
+        n=2, since=datetime.date(2014, 1, 1))
+    assert [o.date() for o in occurrences] == [
+        datetime.date(2014, 1, 30), datetime.date(2014, 2, 27)]
+    with pytest.raises(NoResultFound):
+        series.next_occurrences(n=2)
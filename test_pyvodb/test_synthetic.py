@@ -0,0 +1,37 @@
+import os
+
+from pyvodb import synthetic, tables
+from pyvodb.load import get_db
+
+PARAMS = dict(cities=2, venues_per_city=2, series_per_city=2,
+              events_per_series=5, talks_per_event=2, speakers=10,
+              links_per_talk=3)
+
+
+def read_tree(directory):
+    result = {}
+    for dirpath, dirnames, filenames in os.walk(directory):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            with open(path) as f:
+                result[os.path.relpath(path, directory)] = f.read()
+    return result
+
+
+def test_generate_and_load(tmpdir):
+    counts = synthetic.generate(str(tmpdir), **PARAMS)
+    db = get_db(str(tmpdir))
+    for table in tables.metadata.sorted_tables:
+        if table.name in counts:
+            assert db.query(table).count() == counts[table.name], table.name
+    assert counts['events'] == 20
+    assert counts['talk_links'] == 20 * 2 * 3
+
+
+def test_deterministic(tmpdir):
+    synthetic.generate(str(tmpdir.join('a')), **PARAMS)
+    synthetic.generate(str(tmpdir.join('b')), **PARAMS)
+    synthetic.generate(str(tmpdir.join('c')), seed=1, **PARAMS)
+    a = read_tree(str(tmpdir.join('a')))
+    assert a == read_tree(str(tmpdir.join('b')))
+    assert a != read_tree(str(tmpdir.join('c')))
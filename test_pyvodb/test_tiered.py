@@ -0,0 +1,180 @@
+import shutil
+import tarfile
+import datetime
+
+import pytest
+from sqlalchemy.exc import SQLAlchemyError
+
+from pyvodb import tiered, tables, search, prefix
+from pyvodb.load import get_db, LoadProfile
+from pyvodb.calendar import get_calendar
+from pyvodb.cli import cliutil
+
+CUTOFF = datetime.date(2014, 1, 1)
+
+
+@pytest.fixture(scope='module')
+def archive(tmp_path_factory, data_directory):
+    filename = str(tmp_path_factory.mktemp('archive') / 'archive.sqlite')
+    db = get_db(data_directory)
+    assert tiered.build_archive(db, data_directory, filename, CUTOFF) == 6
+    return filename
+
+
+@pytest.fixture(scope='module')
+def tiered_db(data_directory, archive):
+    return get_db(data_directory, archive=archive)
+
+
+def _event_dicts(db):
+    return sorted((e._source, e.as_dict()) for e in db.query(tables.Event))
+
+
+def test_union(db, tiered_db):
+    assert tiered.is_tiered(tiered_db)
+    assert _event_dicts(tiered_db) == _event_dicts(db)
+    # Archived rows have the same IDs as loaded ones
+    for orm_class in tables.Event, tables.Talk, tables.Venue:
+        assert (sorted(o.id for o in tiered_db.query(orm_class)) ==
+                sorted(o.id for o in db.query(orm_class)))
+
+
+def test_content_hashes(db, tiered_db):
+    for orm_class, key in ((tables.Event, '_source'), (tables.City, 'slug'),
+                           (tables.Series, 'slug')):
+        assert (
+            sorted((getattr(o, key), o.content_hash)
+                   for o in tiered_db.query(orm_class)) ==
+            sorted((getattr(o, key), o.content_hash)
+                   for o in db.query(orm_class)))
+
+
+def test_listing_columns(db, tiered_db):
+    def columns(db):
+        return sorted(
+            (e._source, e.city_name, e.venue_name or '', e.talk_count,
+             e.has_video)
+            for e in db.query(tables.Event))
+    assert columns(tiered_db) == columns(db)
+
+
+def test_archive_info(archive):
+    files, archived, cutoff = tiered.read_archive_info(archive)
+    assert cutoff == CUTOFF
+    assert len(archived) == 6
+    assert all(path.startswith('./series/') for path in archived)
+    # Cities and venues of archived events are recorded, but not archived
+    assert sorted(files.keys() - archived) == [
+        './cities/brno/city.yaml',
+        './cities/brno/venues/u-drevaka.yaml',
+        './cities/ostrava/city.yaml',
+        './cities/ostrava/venues/ires-sc.yaml',
+        './cities/ostrava/venues/sport-club.yaml',
+        './cities/praha/city.yaml',
+        './cities/praha/venues/konvikt.yaml',
+    ]
+
+
+def test_archived_files_not_parsed(data_directory, archive):
+    profile = LoadProfile()
+    get_db(data_directory, archive=archive, profile=profile)
+    # 32 files in total, 6 of them archived
+    assert profile.phases['parse'].count == 26
+
+
+def test_relationships(tiered_db):
+    [event] = tiered_db.query(tables.Event).filter(
+        tables.Event.date == datetime.date(2013, 5, 30))
+    assert event.id == tables.stable_id('event', 'brno-pyvo', event.date)
+    assert event.venue.slug == 'u-drevaka'
+    assert event.city.slug == 'brno'
+    assert [t.title for t in event.talks] == [
+        'Python a GTK, Getting Things GNOME!', 'PySide & Qt']
+    speaker = event.talks[0].speakers[0]
+    assert speaker.name == 'Izidor Matušov'
+    assert event.talks[0] in speaker.talks
+    assert event in event.series.events
+
+
+def test_get_event(tiered_db):
+    today = datetime.date(2014, 8, 1)
+    event = cliutil.get_event(tiered_db, 'brno', '2013-05-30', today)
+    assert event.topic == 'GUI'
+    event = cliutil.get_event(tiered_db, 'brno', 'p3', today)
+    assert event.date == datetime.date(2013, 5, 30)
+    event = cliutil.get_event(tiered_db, 'brno', 'p1', today)
+    assert event.date == datetime.date(2014, 7, 31)
+
+
+def test_calendar(db, tiered_db):
+    def events(db):
+        calendar = get_calendar(db, 2013, 11, num_months=3)
+        return sorted(e._source for month in calendar.values()
+                      for week in month for day in week
+                      for e in day['events'])
+
+    assert events(tiered_db) == events(db)
+    assert len(events(tiered_db)) == 3
+
+
+def test_prefix_index_includes_archived_speakers(tiered_db):
+    index = prefix.get_index(tiered_db, 'speaker')
+    assert index.lookup('Izidor').slugs == ['Izidor Matušov']
+
+
+def test_fulltext(data_directory, archive):
+    db = get_db(data_directory, archive=archive, fulltext=True)
+    [result] = search.search(db, 'GTK')
+    assert result.talk.title == 'Python a GTK, Getting Things GNOME!'
+
+
+def test_read_only(tiered_db):
+    with pytest.raises(SQLAlchemyError):
+        tiered_db.execute("DELETE FROM events")
+    tiered_db.rollback()
+
+
+def test_no_archive_of_tiered_db(tiered_db, data_directory, tmp_path):
+    with pytest.raises(ValueError):
+        tiered.build_archive(tiered_db, data_directory,
+                             str(tmp_path / 'x.sqlite'), CUTOFF)
+
+
+def test_no_archive_from_other_sources(data_directory, git_data, tmp_path):
+    pack = str(tmp_path / 'data.tar.gz')
+    with tarfile.open(pack, 'w:gz') as f:
+        f.add(data_directory, '.')
+    for db in (get_db(str(git_data), rev='HEAD'),
+               get_db(pack),
+               get_db([data_directory, str(git_data)])):
+        with pytest.raises(ValueError, match='Cannot build an archive'):
+            tiered.build_archive(db, data_directory,
+                                 str(tmp_path / 'x.sqlite'), CUTOFF)
+
+
+def test_stale_archive(data_directory, archive, tmp_path):
+    directory = tmp_path / 'data'
+    shutil.copytree(data_directory, str(directory))
+    event_file = directory / 'series/brno-pyvo/events/2013-05-30-gui.yaml'
+    event_file.write_text(event_file.read_text().replace('GUI', 'UI'))
+    with pytest.raises(tiered.StaleArchiveError):
+        get_db(str(directory), archive=archive)
+    event_file.unlink()
+    with pytest.raises(tiered.StaleArchiveError):
+        get_db(str(directory), archive=archive)
+
+
+@pytest.mark.parametrize(['path', 'old', 'new'], [
+    ['cities/brno/venues/u-drevaka.yaml', 'U Dřeváka', 'Nový Dřevák'],
+    ['cities/brno/city.yaml', 'name: Brno', 'name: Brünn'],
+])
+def test_stale_archive_after_venue_or_city_change(data_directory, archive,
+                                                  tmp_path, path, old, new):
+    # Archived events have copies of venue and city names
+    # (and hashes covering the venue), which would be outdated
+    directory = tmp_path / 'data'
+    shutil.copytree(data_directory, str(directory))
+    changed_file = directory / path
+    changed_file.write_text(changed_file.read_text().replace(old, new))
+    with pytest.raises(tiered.StaleArchiveError, match=path):
+        get_db(str(directory), archive=archive)